@@ -0,0 +1,445 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple, Union
+from urllib.parse import quote, urlencode, urlparse
+
+from gspread.utils import rowcol_to_a1
+from oauthlib.oauth1 import Client as OAuth1Client
+
+try:
+    import aiohttp
+except ImportError:  # 任意の依存関係。--process-async を使う場合のみ必要
+    aiohttp = None
+
+from .config import Config
+from .utils.logging_utils import get_logger
+from .spreadsheet_manager import SpreadsheetManager, candidate_has_media
+from .twitter_client import TwitterClient, RateLimitError, DUPLICATE_TWEET_API_CODE
+from .rate_limit_tracker import RateLimitTracker, endpoint_for_request
+from .post_ledger import PostLedger
+from .circuit_breaker import CircuitBreaker, ERROR_AUTH, ERROR_DUPLICATE, ERROR_MEDIA
+from .discord_notifier import DiscordNotifier
+from .notification_digest import ERROR_RATE_LIMIT, ERROR_OTHER
+from .utils.google_drive import GoogleDriveResolver, GoogleDriveError, is_drive_url
+from .utils.http_session import get_shared_session
+from .utils.image_processor import ImageNormalizer
+from .utils.media_sniffer import looks_like_html
+
+logger = get_logger(__name__)
+
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+MEDIA_UPLOAD_URL = "https://upload.twitter.com/1.1/media/upload.json"
+CREATE_TWEET_URL = "https://api.twitter.com/2/tweets"
+
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 10
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+# GETのみ、接続エラーと5xxを再試行する (POSTは二重投稿を避けるため再試行しない)
+MAX_GET_ATTEMPTS = 3
+BACKOFF_SECONDS = 0.5
+CONNECT_TIMEOUT_SECONDS = 10
+READ_TIMEOUT_SECONDS = 60
+DEFAULT_PROCESSING_CHECK_SECONDS = 5
+
+
+class AsyncEngineUnavailableError(RuntimeError):
+    """aiohttp がインストールされていないなど、非同期エンジンを使用できない場合の例外"""
+
+
+class AsyncHTTPError(Exception):
+    def __init__(self, status: int, body: str, url: str):
+        super().__init__(f"HTTP {status} ({url}): {body[:300]}")
+        self.status = status
+        self.body = body
+        self.url = url
+
+
+def oauth1_authorization(method: str, url: str, credentials: Dict[str, str], form: Optional[Dict[str, str]] = None) -> str:
+    """
+    OAuth 1.0a (ユーザーコンテキスト) の Authorization ヘッダーを作る。
+    フォーム形式のボディのみ署名に含め、JSON・multipart のボディは含めない (Twitter APIの仕様)。
+    """
+    client = OAuth1Client(
+        credentials["consumer_key"],
+        client_secret=credentials["consumer_secret"],
+        resource_owner_key=credentials["access_token"],
+        resource_owner_secret=credentials["access_token_secret"],
+    )
+    body, headers = None, {}
+    if form:
+        body = urlencode(form)
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    _, signed_headers, _ = client.sign(url, http_method=method, body=body, headers=headers)
+    return signed_headers["Authorization"]
+
+
+def records_from_values(values: List[List[Any]]) -> List[Dict[str, Any]]:
+    """Sheets API の values (1行目がヘッダー) を gspread の get_all_records と同じ形式のレコードに変換する。"""
+    if not values:
+        return []
+    headers = [str(h) for h in values[0]]
+    return [dict(zip(headers, list(row) + [""] * (len(headers) - len(row)))) for row in values[1:]]
+
+
+def sheet_range(worksheet_name: str, a1: Optional[str] = None) -> str:
+    """ワークシート名をA1表記の範囲に変換する ('シート名'!A1)。"""
+    quoted = "'" + worksheet_name.replace("'", "''") + "'"
+    return f"{quoted}!{a1}" if a1 else quoted
+
+
+def classify_http_error(error: AsyncHTTPError) -> Optional[str]:
+    """投稿時のHTTPエラーを、サーキットブレーカーのエラー種別に分類する。"""
+    if error.status == 403 and (str(DUPLICATE_TWEET_API_CODE) in error.body or "duplicate" in error.body.lower()):
+        return ERROR_DUPLICATE
+    if error.status in (401, 403):
+        return ERROR_AUTH
+    return None
+
+
+def classify_outcome_error(error: BaseException) -> str:
+    """アカウントの投稿処理で発生した例外を、まとめ通知とすぐに通知するかの判断に使う分類に変換する。"""
+    if isinstance(error, RateLimitError) or (isinstance(error, AsyncHTTPError) and error.status == 429):
+        return ERROR_RATE_LIMIT
+    if isinstance(error, AsyncHTTPError):
+        return classify_http_error(error) or ERROR_OTHER
+    return ERROR_OTHER
+
+
+class HostLimiter:
+    """ホストごとの同時リクエスト数を制限するセマフォの集合。"""
+    def __init__(self, default_limit: int, overrides: Optional[Dict[str, int]] = None):
+        self.default_limit = default_limit
+        self.overrides = overrides or {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def for_url(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).hostname or "unknown"
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.overrides.get(host, self.default_limit))
+        return self._semaphores[host]
+
+
+class AsyncPostingEngine:
+    """
+    1つのイベントループで多数のアカウントの投稿処理 (シート読み込み・メディアのダウンロード/アップロード・投稿・シート更新・Discord通知) を
+    並行して行う非同期エンジン。ネットワークI/Oは aiohttp で行い、同時接続数はホストごとに制限する。
+    投稿候補の選択は SpreadsheetManager、メディアの種類判定と加工は TwitterClient のロジックをそのまま使う。
+    """
+    def __init__(self, config: Config, spreadsheet_manager: SpreadsheetManager,
+                 rate_limit_tracker: Optional[RateLimitTracker] = None,
+                 post_ledger: Optional[PostLedger] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 image_normalizer: Optional[ImageNormalizer] = None,
+                 notifier: Optional[DiscordNotifier] = None,
+                 drive_resolver: Optional[GoogleDriveResolver] = None,
+                 max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+                 host_limits: Optional[Dict[str, int]] = None):
+        if aiohttp is None:
+            raise AsyncEngineUnavailableError("非同期エンジンには aiohttp が必要です (pip install aiohttp)。")
+        self.config = config
+        self.spreadsheet_manager = spreadsheet_manager
+        self.rate_limit_tracker = rate_limit_tracker
+        self.post_ledger = post_ledger
+        self.circuit_breaker = circuit_breaker
+        self.image_normalizer = image_normalizer
+        # 通知は DiscordNotifier に任せる (アウトボックス・レート制限・複数Webhookへの振り分けを同期版と共通にする)
+        self.notifier = notifier
+        self.max_connections_per_host = max_connections_per_host
+        self.host_limits = host_limits or {}
+        # Google Driveリンクの解決 (確認ページの処理) は同期版と同じリゾルバをスレッドで使う。結果はキャッシュされる
+        self.drive_resolver = drive_resolver or GoogleDriveResolver(session=get_shared_session())
+        self._google_credentials = self._find_google_credentials()
+        self._session = None
+        self._limiter: Optional[HostLimiter] = None
+        self._token_lock: Optional[asyncio.Lock] = None
+
+    def _find_google_credentials(self):
+        gc = self.spreadsheet_manager.gspread_client
+        http_client = getattr(gc, "http_client", None)
+        credentials = (getattr(http_client, "auth", None)
+                       or getattr(getattr(http_client, "session", None), "credentials", None)
+                       or getattr(gc, "auth", None))
+        if credentials is None:
+            raise AsyncEngineUnavailableError("gspread クライアントから Google の認証情報を取得できませんでした。")
+        return credentials
+
+    def run(self, accounts: List[Dict[str, Any]]) -> Dict[str, Union[str, None, BaseException]]:
+        """
+        アカウントの投稿処理を並行して実行し、アカウントIDごとの結果を返す。
+        結果は Tweet ID (成功)、None (投稿対象なし)、または発生した例外。
+        """
+        return asyncio.run(self._run(accounts))
+
+    async def _run(self, accounts: List[Dict[str, Any]]) -> Dict[str, Union[str, None, BaseException]]:
+        self._limiter = HostLimiter(self.max_connections_per_host, self.host_limits)
+        self._token_lock = asyncio.Lock()
+        timeout = aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT_SECONDS, sock_read=READ_TIMEOUT_SECONDS)
+        # 同時接続数は HostLimiter で制御するため、コネクター側の上限は設けない
+        async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=0)) as session:
+            self._session = session
+            logger.info(f"非同期エンジンで {len(accounts)} アカウントの投稿処理を開始します。")
+            outcomes = await asyncio.gather(*(self._post_account(account) for account in accounts), return_exceptions=True)
+            results = {}
+            for account, outcome in zip(accounts, outcomes):
+                if isinstance(outcome, BaseException):
+                    logger.error(f"アカウント '{account['account_id']}' の非同期投稿処理でエラーが発生しました: {outcome}", exc_info=outcome)
+                results[account["account_id"]] = outcome
+            await self._notify_summary(results)
+            self._session = None
+        return results
+
+    async def _request(self, method: str, url: str, account_id: Optional[str] = None, **kwargs) -> Tuple[Any, bytes]:
+        """ホストごとの同時接続数の制限内でリクエストを送り、(レスポンスヘッダー, ボディ) を返す。4xx/5xx は AsyncHTTPError。"""
+        attempts = MAX_GET_ATTEMPTS if method == "GET" else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                async with self._limiter.for_url(url):
+                    async with self._session.request(method, url, **kwargs) as response:
+                        body = await response.read()
+                        if account_id and self.rate_limit_tracker and 'x-rate-limit-remaining' in response.headers:
+                            # 記録はファイル書き込みを伴うため、イベントループを止めないよう別スレッドで行う
+                            await asyncio.to_thread(self.rate_limit_tracker.record, account_id,
+                                                    endpoint_for_request(method, url), response.headers)
+                        if response.status >= 500 and attempt < attempts:
+                            logger.warning(f"HTTP {response.status} のため再試行します ({attempt}/{attempts}): {url}")
+                        elif response.status >= 400:
+                            raise AsyncHTTPError(response.status, body.decode("utf-8", "replace"), url)
+                        else:
+                            return response.headers, body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= attempts:
+                    raise
+                logger.warning(f"接続エラーのため再試行します ({attempt}/{attempts}): {url} - {e}")
+            await asyncio.sleep(BACKOFF_SECONDS * (2 ** (attempt - 1)))
+
+    # --- Google Sheets ---
+
+    async def _google_headers(self) -> Dict[str, str]:
+        async with self._token_lock:
+            if not self._google_credentials.valid:
+                from google.auth.transport.requests import Request as GoogleAuthRequest
+                await asyncio.to_thread(self._google_credentials.refresh, GoogleAuthRequest())
+        return {"Authorization": f"Bearer {self._google_credentials.token}"}
+
+    async def read_records(self, worksheet_name: str) -> List[Dict[str, Any]]:
+        spreadsheet_id = self.spreadsheet_manager.spreadsheet_id
+        url = f"{SHEETS_API_URL}/{spreadsheet_id}/values/{quote(sheet_range(worksheet_name), safe='')}"
+        _, body = await self._request("GET", url, headers=await self._google_headers())
+        return records_from_values(json.loads(body).get("values", []))
+
+    async def batch_update_cells(self, updates: List[Tuple[str, Any]]):
+        """(ワークシート名, gspread.Cell) のリストを1回の values:batchUpdate でまとめて書き込む。"""
+        if not updates:
+            return
+        data = [{"range": sheet_range(worksheet_name, rowcol_to_a1(cell.row, cell.col)), "values": [[cell.value]]}
+                for worksheet_name, cell in updates]
+        url = f"{SHEETS_API_URL}/{self.spreadsheet_manager.spreadsheet_id}/values:batchUpdate"
+        await self._request("POST", url, headers=await self._google_headers(),
+                            json={"valueInputOption": "USER_ENTERED", "data": data})
+
+    # --- メディア ---
+
+    async def _download(self, media_url: str) -> Tuple[bytes, str]:
+        download_url = media_url
+        if is_drive_url(media_url):
+            download_url = await asyncio.to_thread(self.drive_resolver.resolve, media_url)
+        headers, body = await self._request("GET", download_url)
+        return body, headers.get("content-type", "").lower()
+
+    async def _post_form(self, url: str, form: Dict[str, str], credentials: Dict[str, str], account_id: str) -> Dict[str, Any]:
+        headers = {"Authorization": oauth1_authorization("POST", url, credentials, form=form),
+                   "Content-Type": "application/x-www-form-urlencoded"}
+        _, body = await self._request("POST", url, account_id=account_id, headers=headers, data=urlencode(form))
+        return json.loads(body) if body else {}
+
+    async def _post_multipart(self, fields: Dict[str, str], payload: bytes, file_name: str, mime_type: str,
+                              credentials: Dict[str, str], account_id: str) -> Dict[str, Any]:
+        form = aiohttp.FormData()
+        for name, value in fields.items():
+            form.add_field(name, value)
+        form.add_field("media", payload, filename=file_name, content_type=mime_type)
+        headers = {"Authorization": oauth1_authorization("POST", MEDIA_UPLOAD_URL, credentials)}
+        _, body = await self._request("POST", MEDIA_UPLOAD_URL, account_id=account_id, headers=headers, data=form)
+        return json.loads(body) if body else {}
+
+    async def upload_file(self, path: str, media_type, credentials: Dict[str, str], account_id: str) -> str:
+        """加工済みのファイルをアップロードし、メディアIDを返す。動画はチャンクアップロード (INIT/APPEND/FINALIZE/STATUS)。"""
+        file_name = os.path.basename(path)
+        if not media_type.is_video:
+            payload = await asyncio.to_thread(_read_file, path)
+            result = await self._post_multipart({"media_category": media_type.media_category}, payload, file_name,
+                                                media_type.mime_type, credentials, account_id)
+            return result["media_id_string"]
+
+        init = await self._post_form(MEDIA_UPLOAD_URL, {
+            "command": "INIT",
+            "total_bytes": str(os.path.getsize(path)),
+            "media_type": media_type.mime_type,
+            "media_category": media_type.media_category,
+        }, credentials, account_id)
+        media_id = init["media_id_string"]
+
+        with open(path, "rb") as f:
+            segment_index = 0
+            while True:
+                chunk = await asyncio.to_thread(f.read, UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await self._post_multipart({"command": "APPEND", "media_id": media_id, "segment_index": str(segment_index)},
+                                           chunk, file_name, "application/octet-stream", credentials, account_id)
+                segment_index += 1
+
+        finalize = await self._post_form(MEDIA_UPLOAD_URL, {"command": "FINALIZE", "media_id": media_id}, credentials, account_id)
+        processing_info = finalize.get("processing_info")
+        while processing_info and processing_info.get("state") in ("pending", "in_progress"):
+            await asyncio.sleep(processing_info.get("check_after_secs", DEFAULT_PROCESSING_CHECK_SECONDS))
+            status_url = f"{MEDIA_UPLOAD_URL}?{urlencode({'command': 'STATUS', 'media_id': media_id})}"
+            _, body = await self._request("GET", status_url, account_id=account_id,
+                                          headers={"Authorization": oauth1_authorization("GET", status_url, credentials)})
+            processing_info = json.loads(body).get("processing_info")
+        if processing_info and processing_info.get("state") == "failed":
+            raise AsyncHTTPError(400, json.dumps(processing_info, ensure_ascii=False), MEDIA_UPLOAD_URL)
+        return media_id
+
+    async def upload_media(self, client: TwitterClient, credentials: Dict[str, str], account_id: str, media_url: str) -> Optional[str]:
+        """メディアURLからダウンロード・加工・アップロードを行い、メディアIDを返す。失敗した場合は None。"""
+        try:
+            content, content_type = await self._download(media_url)
+            if looks_like_html(content):
+                logger.error(f"メディアURLからHTMLが返されました。共有設定やURLを確認してください: {media_url}")
+                return None
+            # 種類の判定・動画のメタデータ変更・画像の正規化は同期版と同じ処理をスレッドで行う
+            path, media_type, temp_paths = await asyncio.to_thread(client.prepare_upload_file, content, content_type, media_url)
+            try:
+                media_id = await self.upload_file(path, media_type, credentials, account_id)
+                logger.info(f"アカウント '{account_id}' のメディアのアップロード成功。Media ID: {media_id}")
+                return media_id
+            finally:
+                client.remove_temp_files(temp_paths)
+        except (AsyncHTTPError, aiohttp.ClientError, asyncio.TimeoutError, GoogleDriveError, OSError, KeyError, ValueError) as e:
+            logger.error(f"アカウント '{account_id}' のメディア処理に失敗しました: {media_url}, Error: {e}", exc_info=True)
+            return None
+
+    # --- 投稿 ---
+
+    async def create_tweet(self, credentials: Dict[str, str], account_id: str, text: str,
+                           media_ids: Optional[List[str]] = None, in_reply_to_tweet_id: Optional[str] = None) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"text": text}
+        if media_ids:
+            payload["media"] = {"media_ids": media_ids}
+        if in_reply_to_tweet_id:
+            payload["reply"] = {"in_reply_to_tweet_id": in_reply_to_tweet_id}
+        headers = {"Authorization": oauth1_authorization("POST", CREATE_TWEET_URL, credentials)}
+        _, body = await self._request("POST", CREATE_TWEET_URL, account_id=account_id, headers=headers, json=payload)
+        return json.loads(body)["data"]
+
+    async def _post_account(self, account: Dict[str, Any]) -> Optional[str]:
+        account_id = account["account_id"]
+        credentials = self.config.get_active_twitter_account_details(account_id)
+        if not credentials:
+            raise ValueError(f"アカウント '{account_id}' の設定情報（APIキーなど）が見つからないか、無効です。")
+        worksheet_name = credentials.get("spreadsheet_worksheet")
+        if not worksheet_name:
+            raise ValueError(f"アカウント '{account_id}' にワークシート名が設定されていません。")
+
+        records = await self.read_records(worksheet_name)
+        # 候補選択は重複インデックスのファイルを読むため、別スレッドで行う
+        # メディアの回路が開いている間は、アカウント全体ではなくメディア付きの行だけを見送る
+        exclude_media = bool(self.circuit_breaker) and not await asyncio.to_thread(self.circuit_breaker.allows_media, account_id)
+        candidate = await asyncio.to_thread(self.spreadsheet_manager.select_candidate, records, worksheet_name,
+                                            account_id=account_id, exclude_media=exclude_media)
+        if not candidate:
+            logger.warning(f"アカウント '{account_id}' のワークシート '{worksheet_name}' に投稿可能な記事がありませんでした。")
+            return None
+
+        # tweepy のクライアントは作られない (遅延初期化) ため、メディア加工のためだけに使っても軽量
+        client = TwitterClient(
+            consumer_key=credentials["consumer_key"],
+            consumer_secret=credentials["consumer_secret"],
+            access_token=credentials["access_token"],
+            access_token_secret=credentials["access_token_secret"],
+            image_normalizer=self.image_normalizer,
+        )
+        parts = [{"text": candidate["text"], "media_path": candidate.get("media_path")}] + candidate.get("thread", [])
+        error_classes = set()
+        # メディアのない行ではメディアを試していないため、メディアの回路はそのままにする
+        skipped_classes = () if candidate_has_media(candidate) else (ERROR_MEDIA,)
+
+        async def upload_part(part: Dict[str, Any]) -> Optional[List[str]]:
+            if not part.get("media_path"):
+                return None
+            media_id = await self.upload_media(client, credentials, account_id, part["media_path"])
+            if not media_id:
+                error_classes.add(ERROR_MEDIA)
+                logger.warning(f"アカウント '{account_id}' のメディアのアップロードに失敗したため、メディアなしで投稿します。")
+                return None
+            return [media_id]
+
+        media_ids = await asyncio.gather(*(upload_part(part) for part in parts))
+
+        posted: List[Dict[str, Any]] = []
+        try:
+            for part, part_media_ids in zip(parts, media_ids):
+                posted.append(await self.create_tweet(credentials, account_id, part["text"], part_media_ids,
+                                                      in_reply_to_tweet_id=posted[-1]["id"] if posted else None))
+        except AsyncHTTPError as e:
+            error_class = classify_http_error(e)
+            if error_class:
+                error_classes.add(error_class)
+            if not posted:
+                if self.circuit_breaker:
+                    await asyncio.to_thread(self.circuit_breaker.record_result, account_id, error_classes, skipped_classes)
+                raise
+            logger.error(f"アカウント '{account_id}' のスレッドの {len(posted) + 1}/{len(parts)} 件目の投稿に失敗しました: {e}")
+
+        tweet_id = posted[0]["id"]
+        logger.info(f"アカウント '{account_id}' の投稿が成功しました。Tweet ID: {tweet_id}")
+        await asyncio.to_thread(self._record_posted, account_id, worksheet_name, candidate,
+                                parts[:len(posted)], posted, error_classes, skipped_classes)
+
+        cells = self.spreadsheet_manager.build_post_status_cells(records, candidate["row_index"], datetime.now(timezone.utc))
+        if cells:
+            await self.batch_update_cells([(worksheet_name, cell) for cell in cells])
+        return tweet_id
+
+    def _record_posted(self, account_id: str, worksheet_name: str, candidate: Dict[str, Any],
+                       parts: List[Dict[str, Any]], posted: List[Dict[str, Any]], error_classes: set,
+                       skipped_classes: Tuple[str, ...] = ()):
+        """投稿後の記録 (サーキットブレーカー・投稿台帳・重複インデックス) をまとめて書き込む。ファイル I/O を伴うため別スレッドから呼ぶ。"""
+        if self.circuit_breaker:
+            self.circuit_breaker.record_result(account_id, error_classes, skipped_classes)
+        if self.post_ledger:
+            for tweet in posted:
+                self.post_ledger.record(account_id, tweet["id"], worksheet_name=worksheet_name, row_id=candidate.get("id"))
+        if self.spreadsheet_manager.duplicate_index:
+            for part in parts:
+                self.spreadsheet_manager.duplicate_index.record(account_id, part["text"])
+
+    # --- Discord ---
+
+    async def _notify_summary(self, results: Dict[str, Union[str, None, BaseException]]):
+        """全アカウントの結果を1件のメッセージにまとめてDiscordに通知する。"""
+        if not self.notifier or not results:
+            return
+        lines = []
+        for account_id, outcome in sorted(results.items()):
+            if isinstance(outcome, BaseException):
+                lines.append(f"⚠️ `{account_id}`: 失敗 ({type(outcome).__name__})")
+            elif outcome:
+                lines.append(f"✅ `{account_id}`: Tweet ID `{outcome}`")
+            else:
+                lines.append(f"🤔 `{account_id}`: 投稿対象なし")
+        failed = sum(1 for outcome in results.values() if isinstance(outcome, BaseException))
+        # DiscordNotifier は同期APIのため、レート制限の待機でイベントループを止めないようスレッドで送る
+        await asyncio.to_thread(
+            self.notifier.send_simple_notification,
+            title=f"🚀 非同期投稿完了 ({len(results) - failed}/{len(results)} 件成功)",
+            description="\n".join(lines)[:4000],
+            color=0xE74C3C if failed else 0x2ECC71,
+        )
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
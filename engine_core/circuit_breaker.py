@@ -0,0 +1,114 @@
+import threading
+import time
+import logging
+from typing import Dict, Any, Optional, Iterable, Tuple
+from .utils.json_store import read_json_file, write_json_file_atomic
+
+logger = logging.getLogger(__name__)
+
+# 回路を分けるエラーの種類
+ERROR_AUTH = "auth"            # 401/403 (凍結・トークン失効・権限不足)
+ERROR_DUPLICATE = "duplicate"  # 重複投稿として拒否された
+ERROR_MEDIA = "media"          # メディアのダウンロード・アップロードに失敗した
+ERROR_CLASSES = (ERROR_AUTH, ERROR_DUPLICATE, ERROR_MEDIA)
+# 開くとアカウント全体を投稿対象から外す種類。メディアの回路はメディア付きの行だけを対象から外す (テキストのみの行は投稿を続ける)
+ACCOUNT_ERROR_CLASSES = (ERROR_AUTH, ERROR_DUPLICATE)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 2
+DEFAULT_BASE_OPEN_SECONDS = 30 * 60
+DEFAULT_MAX_OPEN_SECONDS = 24 * 60 * 60
+
+
+class CircuitBreaker:
+    """
+    アカウントとエラーの種類ごとのサーキットブレーカー。状態はJSONファイルに永続化し、司令塔とワーカーで共有する。
+    同じ種類の失敗が failure_threshold 回続くと回路を開き (open)、そのアカウントを投稿対象から外す。
+    ただしメディアの回路が開いている間は、メディア付きの行だけを候補から外し、テキストのみの行の投稿は続ける。
+    開いている時間は開くたびに2倍 (上限 max_open_seconds) になり、経過後は1回だけ試行 (half_open) を許可する。
+    試行が成功すれば閉じ (closed)、失敗すれば再び開く。
+    """
+    def __init__(self, store_path: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 base_open_seconds: int = DEFAULT_BASE_OPEN_SECONDS, max_open_seconds: int = DEFAULT_MAX_OPEN_SECONDS):
+        self.store_path = store_path
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = base_open_seconds
+        self.max_open_seconds = max_open_seconds
+        self._lock = threading.Lock()
+
+    def _read_store(self) -> Optional[Dict[str, Dict[str, Dict[str, Any]]]]:
+        return read_json_file(self.store_path, "サーキットブレーカー状態ファイル")
+
+    def _write_store(self, store: Dict[str, Dict[str, Dict[str, Any]]]):
+        write_json_file_atomic(self.store_path, store, "サーキットブレーカー状態ファイル")
+
+    @staticmethod
+    def _entry_state(entry: Dict[str, Any], now: float) -> str:
+        if not entry.get("open_until"):
+            return STATE_CLOSED
+        return STATE_OPEN if now < entry["open_until"] else STATE_HALF_OPEN
+
+    def get_state(self, account_id: str, error_classes: Iterable[str] = ERROR_CLASSES) -> Tuple[str, Optional[str], Optional[float]]:
+        """
+        アカウントの状態を (状態, 原因のエラー種別, 開いている期限のUNIX時刻) で返す。error_classes に含まれる回路だけを見る。
+        複数の回路がある場合は open > half_open > closed の順に優先する。
+        """
+        now = time.time()
+        result = (STATE_CLOSED, None, None)
+        for error_class, entry in (self._read_store() or {}).get(account_id, {}).items():
+            if error_class not in error_classes:
+                continue
+            state = self._entry_state(entry, now)
+            if state == STATE_OPEN:
+                if result[0] != STATE_OPEN or entry["open_until"] > result[2]:
+                    result = (STATE_OPEN, error_class, entry["open_until"])
+            elif state == STATE_HALF_OPEN and result[0] == STATE_CLOSED:
+                result = (STATE_HALF_OPEN, error_class, entry["open_until"])
+        return result
+
+    def allows(self, account_id: str) -> bool:
+        """投稿を試行してよいか (メディアの回路は見ない)。half_open の場合は試行 (プローブ) を許可する。"""
+        return self.get_state(account_id, ACCOUNT_ERROR_CLASSES)[0] != STATE_OPEN
+
+    def allows_media(self, account_id: str) -> bool:
+        """メディア付きの行を投稿してよいか。開いている間はメディア付きの行を候補から外す。"""
+        return self.get_state(account_id, (ERROR_MEDIA,))[0] != STATE_OPEN
+
+    def record_result(self, account_id: str, failed_classes: Iterable[str] = (), skipped_classes: Iterable[str] = ()):
+        """
+        1回の投稿処理の結果を記録する。failed_classes に含まれる種類は失敗として数え、
+        含まれない種類は成功としてリセットする。skipped_classes の種類 (メディアのない行を投稿した場合のメディアなど) は
+        今回は試していないため、失敗回数も開いている期限もそのまま残す。
+        """
+        failed = set(failed_classes)
+        skipped = set(skipped_classes) - failed
+        now = time.time()
+        with self._lock:
+            store = self._read_store()
+            if store is None:
+                return
+            account_entries = store.setdefault(account_id, {})
+            for error_class in failed:
+                entry = account_entries.setdefault(error_class, {"failures": 0, "open_count": 0, "open_until": None})
+                was_half_open = self._entry_state(entry, now) == STATE_HALF_OPEN
+                entry["failures"] += 1
+                entry["last_failure_at"] = int(now)
+                if was_half_open or entry["failures"] >= self.failure_threshold:
+                    open_seconds = min(self.max_open_seconds, self.base_open_seconds * (2 ** entry["open_count"]))
+                    entry["open_count"] += 1
+                    entry["open_until"] = int(now + open_seconds)
+                    logger.warning(
+                        f"アカウント '{account_id}' の回路 '{error_class}' を開きました "
+                        f"({entry['failures']}回連続の失敗。{open_seconds // 60}分間投稿対象から外します)。"
+                    )
+            for error_class in list(account_entries):
+                if error_class not in failed and error_class not in skipped:
+                    if account_entries[error_class].get("open_until"):
+                        logger.info(f"アカウント '{account_id}' の回路 '{error_class}' を閉じました。")
+                    del account_entries[error_class]
+            if not account_entries:
+                del store[account_id]
+            self._write_store(store)
@@ -1,19 +1,155 @@
 import os
 import json
 import logging
-from typing import Dict, Any, List, Optional
-from functools import lru_cache
+import threading
+from types import MappingProxyType
+from typing import Callable, Dict, Any, List, Optional, Mapping, NamedTuple, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
 # DEFAULT_CONFIG は廃止
 
+DEFAULT_SPREADSHEET_COLUMNS = {
+    "id": "ID",
+    "text": "本文",
+    "char_count": "文字数",
+    "media_url": "画像/動画URL",
+    "postable": "投稿可能",
+    "posted_count": "投稿済み回数",
+    "last_posted_at": "最終投稿日時",
+    "thread_parent": "スレッド親ID",
+    "target_group": "投稿先グループ",
+    "fanout_result": "投稿結果"
+}
+REQUIRED_TWITTER_KEYS = ("consumer_key", "consumer_secret", "access_token", "access_token_secret")
+_MISSING = object()
+
+
+class CompiledConfig(NamedTuple):
+    """
+    読み込んだ設定を検証・整形した、読み取り専用の構造。
+    アカウントや列定義は参照のたびに組み立て直さず、読み込み時に1回だけ作る。
+    """
+    data: Dict[str, Any]
+    accounts: Tuple[Mapping[str, Any], ...]                        # 全アカウント (enabled の既定値を補ったもの)
+    active_accounts: Tuple[Mapping[str, Any], ...]                 # enabled: true のアカウント
+    active_account_index: Mapping[str, Optional[Mapping[str, Any]]]  # 小文字の account_id -> 詳細 (APIキー不足は None)
+    columns: Mapping[str, str]
+    schedule: Optional[Mapping[str, Any]]
+    lookup_cache: Dict[str, Any]                                   # ドット区切りのキー -> 値 (get の結果)
+
+
+class ConfigChanges(NamedTuple):
+    """設定の再読み込みで追加・削除・変更されたアカウントID。"""
+    added: Tuple[str, ...]
+    removed: Tuple[str, ...]
+    changed: Tuple[str, ...]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+def diff_accounts(old: CompiledConfig, new: CompiledConfig) -> ConfigChanges:
+    """2つの設定のアカウントを比べ、追加・削除・変更 (有効/無効の切り替えやAPIキーの差し替えを含む) されたものを返す。"""
+    old_accounts = {acc["account_id"]: dict(acc) for acc in old.accounts}
+    new_accounts = {acc["account_id"]: dict(acc) for acc in new.accounts}
+    return ConfigChanges(
+        added=tuple(account_id for account_id in new_accounts if account_id not in old_accounts),
+        removed=tuple(account_id for account_id in old_accounts if account_id not in new_accounts),
+        changed=tuple(account_id for account_id, acc in new_accounts.items()
+                      if account_id in old_accounts and old_accounts[account_id] != acc),
+    )
+
+
+def _lookup(data: Dict[str, Any], key: str) -> Any:
+    value = data
+    for k in key.split('.'):
+        if not isinstance(value, dict) or k not in value:
+            return _MISSING
+        value = value[k]
+    return value
+
+
+def _compile_accounts(data: Dict[str, Any]) -> Tuple[Tuple[Mapping[str, Any], ...], Dict[str, Optional[Mapping[str, Any]]]]:
+    accounts_data = data.get("twitter_accounts", []) if isinstance(data, dict) else []
+    if not isinstance(accounts_data, list):
+        logger.critical(f"設定内の twitter_accounts がリスト形式ではありません。型: {type(accounts_data)}")
+        return (), {}
+
+    accounts = []
+    active_index: Dict[str, Optional[Mapping[str, Any]]] = {}
+    for acc_raw in accounts_data:
+        if not isinstance(acc_raw, dict):
+            logger.warning(f"twitter_accounts 内に辞書でない要素が含まれています: {acc_raw}")
+            continue
+        acc = dict(acc_raw)
+        acc.setdefault('enabled', True)
+        account_id = acc.get("account_id")
+        if not account_id:
+            logger.warning(f"twitter_accounts 内のアカウント設定に account_id がありません: {acc}")
+            continue
+
+        if acc.get("enabled", False):
+            if isinstance(acc.get("google_sheets_source"), dict):
+                ws_name = acc["google_sheets_source"].get("worksheet_name")
+                if ws_name and isinstance(ws_name, str):
+                    acc["spreadsheet_worksheet"] = ws_name
+                else:
+                    logger.warning(f"アカウント {account_id} の google_sheets_source.worksheet_name が未設定または不正です。")
+            else:
+                logger.warning(f"アカウント {account_id} の設定に google_sheets_source (ワークシート名含む) がありません。")
+
+        frozen = MappingProxyType(acc)
+        accounts.append(frozen)
+        if acc.get("enabled", False) and str(account_id).lower() not in active_index:
+            missing_keys = [key for key in REQUIRED_TWITTER_KEYS if not acc.get(key) or not isinstance(acc.get(key), str)]
+            if missing_keys:
+                logger.critical(f"アカウント {account_id} の設定に必須のTwitter APIキーが不足または不正です: {missing_keys}")
+            active_index[str(account_id).lower()] = None if missing_keys else frozen
+
+    if not accounts: # 有効無効に関わらず、リストが空なら警告
+        logger.warning("設定ファイルに twitter_accounts が見つからないか、有効なアカウント設定がありません。")
+    return tuple(accounts), active_index
+
+
+def _compile_columns(data: Dict[str, Any]) -> Mapping[str, str]:
+    columns = dict(DEFAULT_SPREADSHEET_COLUMNS)
+    config_columns = _lookup(data, "auto_post_bot.spreadsheet_columns")
+    if isinstance(config_columns, dict):
+        columns.update(config_columns)
+        logger.info(f"設定ファイルから読み込んだ列定義でデフォルトを更新しました。")
+    else:
+        logger.info("設定ファイルに 'auto_post_bot.spreadsheet_columns' のカスタム定義が見つからないか、形式が不正です。デフォルトの列定義を使用します。")
+    logger.info(f"確定したスプレッドシート列定義: {columns}")
+    return MappingProxyType(columns)
+
+
+def compile_config(data: Dict[str, Any]) -> CompiledConfig:
+    """読み込んだ設定 (JSON) を検証し、参照用の読み取り専用の構造に変換する。"""
+    accounts, active_index = _compile_accounts(data)
+    schedule = _lookup(data, "auto_post_bot.schedule_settings")
+    return CompiledConfig(
+        data=data,
+        accounts=accounts,
+        active_accounts=tuple(acc for acc in accounts if acc.get("enabled", False)),
+        active_account_index=MappingProxyType(active_index),
+        columns=_compile_columns(data),
+        schedule=MappingProxyType(dict(schedule)) if isinstance(schedule, dict) and schedule else None,
+        lookup_cache={},
+    )
+
+
 class Config:
     def __init__(self, config_path: Optional[str] = None):
         self._config_data: Dict[str, Any] = {}
         self.config_path = config_path # 引数で渡されたパスを保存
         # config.py が engine_core の中にある前提でプロジェクトルートを推定
         self._project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # 設定を読み込んだファイルとその更新時刻 (環境変数から読み込んだ場合は None で、再読み込みの対象外)
+        self._source_path: Optional[str] = None
+        self._source_stamp: Optional[Tuple[int, int]] = None
+        self._reload_lock = threading.Lock()
+        self._watch_stop: Optional[threading.Event] = None
         self._load_settings()
 
     # _deep_update は DEFAULT_CONFIG とのマージがなくなったため不要。削除。
@@ -28,6 +164,7 @@ class Config:
                 with open(self.config_path, 'r', encoding='utf-8') as f:
                     config_json_str = f.read()
                 loaded_config_source = f"指定された設定ファイル ({self.config_path})"
+                self._source_path = self.config_path
             except Exception as e:
                 logger.critical(f"{self.config_path} の読み込み中にエラー: {e}")
                 config_json_str = None
@@ -49,6 +186,7 @@ class Config:
                     with open(dev_config_file_path, 'r', encoding='utf-8') as f:
                         config_json_str = f.read()
                     loaded_config_source = f"開発用設定ファイル ({dev_config_file_path})"
+                    self._source_path = dev_config_file_path
                 except Exception as e:
                     logger.critical(f"{dev_config_file_path} の読み込み中にエラー: {e}")
                     config_json_str = None 
@@ -73,20 +211,86 @@ class Config:
             )
             self._config_data = {}
 
+        if self._source_path:
+            self._source_stamp = self._stat_source()
+        self._compiled = compile_config(self._config_data)
+
+    def _stat_source(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._source_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self) -> Optional[ConfigChanges]:
+        """
+        設定ファイルの更新時刻・サイズが変わっていれば読み込み直し、検証できた場合のみ新しい設定に差し替える。
+        差し替えは1回の代入で行うため、参照中の処理は差し替え前後どちらかの設定を一貫して使う。
+        差し替えた場合は追加・削除・変更されたアカウントを返し、変更がない場合や読み込みに失敗した場合は None を返す。
+        """
+        if not self._source_path:
+            return None
+        with self._reload_lock:
+            stamp = self._stat_source()
+            if stamp is None or stamp == self._source_stamp:
+                return None
+            try:
+                with open(self._source_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                # 書き込み途中の場合もあるため、次回の確認で読み込み直す
+                logger.error(f"設定ファイル {self._source_path} の再読み込みに失敗しました。現在の設定を使い続けます: {e}")
+                return None
+            if not isinstance(data, dict) or not isinstance(data.get("twitter_accounts", []), list):
+                logger.error(f"設定ファイル {self._source_path} の形式が不正なため、現在の設定を使い続けます。")
+                self._source_stamp = stamp
+                return None
+
+            compiled = compile_config(data)
+            changes = diff_accounts(self._compiled, compiled)
+            self._config_data = data
+            self._compiled = compiled
+            self._source_stamp = stamp
+        logger.info(f"設定ファイル {self._source_path} を再読み込みしました。追加: {list(changes.added)}, 削除: {list(changes.removed)}, 変更: {list(changes.changed)}")
+        return changes
+
+    def start_watching(self, on_change: Callable[[ConfigChanges], None], interval_seconds: float = 5):
+        """
+        バックグラウンドのスレッドで interval_seconds ごとに設定ファイルの更新を確認し、差し替えた場合は on_change を呼ぶ。
+        常駐する処理でアカウントの追加・無効化を再起動なしに反映するために使う。
+        """
+        if not self._source_path:
+            logger.info("設定を環境変数から読み込んでいるため、設定ファイルの監視は行いません。")
+            return
+        if self._watch_stop:
+            return
+        self._watch_stop = threading.Event()
+        stop = self._watch_stop
+
+        def watch():
+            while not stop.wait(interval_seconds):
+                try:
+                    changes = self.reload_if_changed()
+                    if changes is not None:
+                        on_change(changes)
+                except Exception as e:
+                    logger.error(f"設定の再読み込みの処理中に予期せぬエラー: {e}", exc_info=True)
+
+        threading.Thread(target=watch, name="config-watcher", daemon=True).start()
+        logger.info(f"設定ファイル {self._source_path} の監視を開始しました ({interval_seconds}秒間隔)。")
+
+    def stop_watching(self):
+        if self._watch_stop:
+            self._watch_stop.set()
+            self._watch_stop = None
+
     def get(self, key: str, default: Any = None) -> Any:
-        keys = key.split('.')
-        value = self._config_data
+        cache = self._compiled.lookup_cache
         try:
-            for k in keys:
-                if isinstance(value, dict):
-                    value = value[k]
-                else:
-                    return default
-            return value
+            value = cache[key]
         except KeyError:
-            return default
-        except TypeError: 
-            return default
+            value = cache[key] = _lookup(self._compiled.data, key)
+        return default if value is _MISSING else value
 
     def get_log_level(self) -> Optional[str]:
         level = self.get("common.log_level")
@@ -102,6 +306,83 @@ class Config:
             return None
         return path
 
+    def get_logging_settings(self) -> Dict[str, Any]:
+        """
+        ログ出力の設定 (common.logging) を取得する。未設定の項目は既定値で補う。
+        rotation: "size" (max_bytes ごと) または "time" (when ごと)、format: "text" または "json" (JSON Lines)。
+        module_levels はモジュール名 -> ログレベル、rate_limit は同じログを window_seconds ごとに max_repeats 件までに抑える設定 (null で無効)。
+        """
+        cfg = self.get("common.logging") or {}
+        if not isinstance(cfg, dict):
+            logger.error(f"ログ設定 (common.logging) が辞書形式ではありません。型: {type(cfg)}。既定値を使用します。")
+            cfg = {}
+
+        settings = {
+            "file_name": cfg.get("file_name", "inbound_engine.log"),
+            "rotation": cfg.get("rotation", "size"),
+            "max_bytes": cfg.get("max_bytes", 10 * 1024 * 1024),
+            "when": cfg.get("when", "midnight"),
+            "backup_count": cfg.get("backup_count", 5),
+            "format": cfg.get("format", "text"),
+            "module_levels": {},
+            "rate_limit": None,
+        }
+        for key, allowed in (("rotation", ("size", "time")), ("format", ("text", "json"))):
+            if settings[key] not in allowed:
+                logger.error(f"ログ設定 ({key}: {settings[key]}) が不正です。'{allowed[0]}' を使用します。")
+                settings[key] = allowed[0]
+        for key, default in (("max_bytes", 10 * 1024 * 1024), ("backup_count", 5)):
+            value = settings[key]
+            if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+                logger.error(f"ログ設定 ({key}: {value}) が不正です。既定値 {default} を使用します。")
+                settings[key] = default
+
+        module_levels = cfg.get("module_levels") or {}
+        if isinstance(module_levels, dict):
+            for module_name, level in module_levels.items():
+                if isinstance(level, str) and level.upper() in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
+                    settings["module_levels"][module_name] = level.upper()
+                else:
+                    logger.error(f"モジュール '{module_name}' のログレベル ({level}) が不正なため無視します。")
+        else:
+            logger.error(f"モジュールごとのログレベル (common.logging.module_levels) が辞書形式ではありません。型: {type(module_levels)}")
+
+        rate_limit = cfg.get("rate_limit", {"window_seconds": 60, "max_repeats": 5})
+        if isinstance(rate_limit, dict):
+            window_seconds = rate_limit.get("window_seconds", 60)
+            max_repeats = rate_limit.get("max_repeats", 5)
+            if isinstance(window_seconds, (int, float)) and not isinstance(window_seconds, bool) and window_seconds > 0 \
+                    and isinstance(max_repeats, int) and not isinstance(max_repeats, bool) and max_repeats > 0:
+                settings["rate_limit"] = {"window_seconds": window_seconds, "max_repeats": max_repeats}
+            else:
+                logger.error(f"ログの抑制設定 (common.logging.rate_limit: {rate_limit}) が不正です。同じログの抑制は行いません。")
+        elif rate_limit is not None:
+            logger.error(f"ログの抑制設定 (common.logging.rate_limit) が辞書形式ではありません。型: {type(rate_limit)}")
+        return settings
+
+    def get_metrics_settings(self) -> Optional[Dict[str, Any]]:
+        """
+        メトリクスの設定 (common.metrics) を取得する。enabled: false の場合は None を返す。未設定の項目は既定値で補う。
+        http_port を指定した場合は、常駐モード (--serve) の間 /metrics でも公開する。
+        """
+        cfg = self.get("common.metrics") or {}
+        if not isinstance(cfg, dict):
+            logger.error(f"メトリクス設定 (common.metrics) が辞書形式ではありません。型: {type(cfg)}。既定値を使用します。")
+            cfg = {}
+        if not cfg.get("enabled", True):
+            return None
+
+        http_port = cfg.get("http_port")
+        if http_port is not None and (not isinstance(http_port, int) or isinstance(http_port, bool) or not 0 < http_port < 65536):
+            logger.error(f"メトリクス設定 (http_port: {http_port}) が不正です。HTTP エンドポイントは起動しません。")
+            http_port = None
+        return {
+            "store_file": cfg.get("store_file", "metrics.json"),
+            "textfile": cfg.get("textfile", "metrics.prom"),
+            "http_port": http_port,
+            "http_host": cfg.get("http_host", "127.0.0.1"),
+        }
+
     def get_gspread_service_account_dict(self) -> Optional[Dict[str, Any]]:
         # キー名を変更し、直接辞書を取得するようにする
         creds_dict = self.get("google_sheets.service_account_credentials") 
@@ -130,62 +411,19 @@ class Config:
             # Noneを返すか、あるいはここでプログラムを終了させるべきか検討の余地あり
         return sid 
 
-    def get_twitter_accounts(self) -> List[Dict[str, Any]]:
-        accounts_data = self.get("twitter_accounts", []) # 見つからなければ空リスト
-        processed_accounts = []
-        if not isinstance(accounts_data, list):
-            logger.critical(f"設定内の twitter_accounts がリスト形式ではありません。型: {type(accounts_data)}")
-            return []
-        
-        for acc_raw in accounts_data:
-            if not isinstance(acc_raw, dict):
-                logger.warning(f"twitter_accounts 内に辞書でない要素が含まれています: {acc_raw}")
-                continue
-            
-            acc = dict(acc_raw)
-            if 'enabled' not in acc:
-                acc['enabled'] = True
+    def get_twitter_accounts(self) -> Sequence[Mapping[str, Any]]:
+        """全アカウントの設定 (読み込み時に検証済み・読み取り専用) を返す。"""
+        return self._compiled.accounts
 
-            if not acc.get("account_id"):
-                logger.warning(f"twitter_accounts 内のアカウント設定に account_id がありません: {acc}")
-                continue
-            processed_accounts.append(acc)
-        
-        if not processed_accounts: # 有効無効に関わらず、リストが空なら警告
-            logger.warning("設定ファイルに twitter_accounts が見つからないか、有効なアカウント設定がありません。")
-        return processed_accounts
-
-    def get_active_twitter_accounts(self) -> List[Dict[str, Any]]:
-        all_accounts = self.get_twitter_accounts()
-        active_accounts = []
-        for acc in all_accounts:
-            if acc.get("enabled", False):
-                active_accounts.append(acc)
+    def get_active_twitter_accounts(self) -> Sequence[Mapping[str, Any]]:
+        active_accounts = self._compiled.active_accounts
         if not active_accounts:
             logger.warning("有効化 (enabled: true) されたTwitterアカウントが設定に一つも見つかりません。")
         return active_accounts
 
-    def get_active_twitter_account_details(self, account_id: str) -> Optional[Dict[str, Any]]:
-        accounts = self.get_active_twitter_accounts()
-        for acc in accounts:
-            # 比較前に両方を小文字に変換
-            if acc.get("account_id", "").lower() == account_id.lower():
-                required_keys = ["consumer_key", "consumer_secret", "access_token", "access_token_secret"]
-                missing_keys = [key for key in required_keys if not acc.get(key) or not isinstance(acc.get(key), str)]
-                if missing_keys:
-                    logger.critical(f"アカウント {account_id} の設定に必須のTwitter APIキーが不足または不正です: {missing_keys}")
-                    return None
-                
-                if isinstance(acc.get("google_sheets_source"), dict):
-                    ws_name = acc["google_sheets_source"].get("worksheet_name")
-                    if ws_name and isinstance(ws_name, str):
-                         acc["spreadsheet_worksheet"] = ws_name
-                    else:
-                        logger.warning(f"アカウント {account_id} の google_sheets_source.worksheet_name が未設定または不正です。")
-                else: 
-                    logger.warning(f"アカウント {account_id} の設定に google_sheets_source (ワークシート名含む) がありません。")
-                return acc
-        return None
+    def get_active_twitter_account_details(self, account_id: str) -> Optional[Mapping[str, Any]]:
+        """有効なアカウントの設定を account_id (大文字・小文字を区別しない) で引く。APIキーが不足している場合は None。"""
+        return self._compiled.active_account_index.get(account_id.lower())
 
     def get_discord_webhook_url(self) -> Optional[str]:
         url = self.get("discord_webhook_url")
@@ -196,38 +434,30 @@ class Config:
             logger.info("Discord Webhook URL (discord_webhook_url) が未設定です。Discord通知は行われません。")
         return url
 
-    @lru_cache(maxsize=None)
-    def get_spreadsheet_columns(self) -> Dict[str, str]:
+    def get_discord_webhook_urls(self) -> List[str]:
         """
-        スプレッドシートの列名設定を辞書として取得する。
-        設定ファイルの内容をデフォルト値にマージして返す。
+        通知に使うDiscord Webhook URLのリストを取得する。
+        discord_webhook_urls (リスト) が設定されていればそれを使い、レート制限を分散する。なければ discord_webhook_url の1件。
         """
-        default_columns = {
-            "id": "ID",
-            "text": "本文",
-            "char_count": "文字数",
-            "media_url": "画像/動画URL",
-            "postable": "投稿可能",
-            "posted_count": "投稿済み回数",
-            "last_posted_at": "最終投稿日時"
-        }
-        
-        config_columns = self.get("auto_post_bot.spreadsheet_columns")
-        
-        if isinstance(config_columns, dict):
-            default_columns.update(config_columns)
-            logger.info(f"設定ファイルから読み込んだ列定義でデフォルトを更新しました。")
-        else:
-            logger.info("設定ファイルに 'auto_post_bot.spreadsheet_columns' のカスタム定義が見つからないか、形式が不正です。デフォルトの列定義を使用します。")
+        urls = self.get("discord_webhook_urls")
+        if urls is not None:
+            if isinstance(urls, list) and urls and all(isinstance(u, str) and u for u in urls):
+                return urls
+            logger.warning(f"Discord Webhook URLリスト (discord_webhook_urls) の形式が不正です。discord_webhook_url を使用します。")
+        url = self.get_discord_webhook_url()
+        return [url] if url else []
 
-        logger.info(f"確定したスプレッドシート列定義: {default_columns}")
-        return default_columns
+    def get_spreadsheet_columns(self) -> Mapping[str, str]:
+        """
+        スプレッドシートの列名設定を取得する。
+        設定ファイルの内容をデフォルト値にマージしたもの (読み込み時に確定) を返す。
+        """
+        return self._compiled.columns
 
-    def get_schedule_config(self) -> Optional[Dict[str, Any]]:
-        cfg = self.get("auto_post_bot.schedule_settings")
-        if not cfg or not isinstance(cfg, dict):
+    def get_schedule_config(self) -> Optional[Mapping[str, Any]]:
+        cfg = self._compiled.schedule
+        if cfg is None:
             logger.critical("スケジュール設定 (auto_post_bot.schedule_settings) が未設定または辞書形式ではありません。")
-            return None
         return cfg
 
     def get_post_interval_hours(self) -> Optional[int]:
@@ -241,10 +471,262 @@ class Config:
         logger.error(f"投稿間隔 (post_interval_hours: {interval}) の設定が不正です。正の整数である必要があります。")
         return None
 
+    def get_config_watch_interval_seconds(self) -> Optional[float]:
+        """常駐モード (--serve) で設定ファイルの更新を確認する間隔 (秒) を取得する。未設定の場合は監視しない。"""
+        interval = self.get("common.config_watch_interval_seconds")
+        if interval is None:
+            return None
+        if isinstance(interval, (int, float)) and not isinstance(interval, bool) and interval > 0:
+            return interval
+        logger.error(f"設定ファイルの監視間隔 (config_watch_interval_seconds: {interval}) の設定が不正です。正の数である必要があります。")
+        return None
+
+    def get_serve_interval_seconds(self) -> float:
+        """常駐モード (--serve) で司令塔の処理を繰り返す間隔 (秒) を取得する。未設定・不正な場合は60秒。"""
+        interval = self.get("common.serve_interval_seconds", 60)
+        if isinstance(interval, (int, float)) and not isinstance(interval, bool) and interval > 0:
+            return interval
+        logger.error(f"常駐モードの実行間隔 (serve_interval_seconds: {interval}) の設定が不正です。既定値の60秒を使用します。")
+        return 60
+
+    def get_media_prepare_lead_minutes(self) -> Optional[int]:
+        """投稿予定時刻の何分前からメディアの事前準備を行うかを取得する。未設定の場合は事前準備を行わない。"""
+        lead = self.get("auto_post_bot.schedule_settings.media_prepare_lead_minutes")
+        if lead is None:
+            return None
+        if isinstance(lead, int) and not isinstance(lead, bool) and lead > 0:
+            return lead
+        logger.error(f"メディア事前準備のリードタイム (media_prepare_lead_minutes: {lead}) の設定が不正です。正の整数である必要があります。")
+        return None
+
+    def get_credential_check_ttl_minutes(self) -> Optional[int]:
+        """認証情報の事前確認結果を何分間有効とするかを取得する。未設定の場合は事前確認を行わない。"""
+        ttl = self.get("auto_post_bot.schedule_settings.credential_check_ttl_minutes")
+        if ttl is None:
+            return None
+        if isinstance(ttl, int) and not isinstance(ttl, bool) and ttl > 0:
+            return ttl
+        logger.error(f"認証確認結果の有効期間 (credential_check_ttl_minutes: {ttl}) の設定が不正です。正の整数である必要があります。")
+        return None
+
+    def get_duplicate_window_hours(self) -> Optional[int]:
+        """同じ本文の再投稿を避ける期間 (時間) を取得する。未設定の場合は重複判定を行わない。"""
+        hours = self.get("auto_post_bot.schedule_settings.duplicate_window_hours")
+        if hours is None:
+            return None
+        if isinstance(hours, int) and not isinstance(hours, bool) and hours > 0:
+            return hours
+        logger.error(f"重複判定の期間 (duplicate_window_hours: {hours}) の設定が不正です。正の整数である必要があります。")
+        return None
+
+    def get_image_processing_settings(self) -> Optional[Dict[str, Any]]:
+        """
+        画像の正規化設定 (auto_post_bot.media_processing.image) を取得する。
+        未設定または enabled: false の場合は None を返し、画像はダウンロードしたまま投稿される。
+        """
+        cfg = self.get("auto_post_bot.media_processing.image")
+        if cfg is None:
+            return None
+        if not isinstance(cfg, dict):
+            logger.error(f"画像処理設定 (auto_post_bot.media_processing.image) が辞書形式ではありません。型: {type(cfg)}")
+            return None
+        if not cfg.get("enabled", True):
+            return None
+
+        settings = {
+            "max_edge": cfg.get("max_edge", 4096),
+            "target_bytes": cfg.get("target_bytes", 5 * 1024 * 1024),
+            "cache_directory": cfg.get("cache_directory") or os.path.join(self.get("common.logs_directory", "logs"), "image_cache"),
+        }
+        for key in ("max_edge", "target_bytes"):
+            value = settings[key]
+            if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+                logger.error(f"画像処理設定 ({key}: {value}) が不正です。正の整数である必要があります。画像処理は無効になります。")
+                return None
+        return settings
+
+    def get_google_drive_settings(self) -> Dict[str, Any]:
+        """
+        Google Driveリンクの解決設定 (auto_post_bot.media_processing.google_drive) を取得する。
+        解決結果のキャッシュは実行をまたいで使うため、既定では common.logs_directory 内のファイルに保存する。
+        """
+        cfg = self.get("auto_post_bot.media_processing.google_drive") or {}
+        if not isinstance(cfg, dict):
+            logger.error(f"Google Drive設定 (auto_post_bot.media_processing.google_drive) が辞書形式ではありません。型: {type(cfg)}。既定値を使用します。")
+            cfg = {}
+        ttl = cfg.get("cache_ttl_seconds", 3600)
+        if not isinstance(ttl, int) or isinstance(ttl, bool) or ttl <= 0:
+            logger.error(f"Google Drive設定 (cache_ttl_seconds: {ttl}) が不正です。既定値の 3600 秒を使用します。")
+            ttl = 3600
+        return {
+            "cache_file": os.path.join(self.get("common.logs_directory", "logs"), cfg.get("cache_file", "drive_resolve_cache.json")),
+            "cache_ttl_seconds": ttl,
+        }
+
+    def get_circuit_breaker_settings(self) -> Optional[Dict[str, Any]]:
+        """
+        サーキットブレーカーの設定 (auto_post_bot.circuit_breaker) を取得する。
+        enabled: false の場合は None を返す。未設定の項目は既定値で補う。
+        """
+        cfg = self.get("auto_post_bot.circuit_breaker") or {}
+        if not isinstance(cfg, dict):
+            logger.error(f"サーキットブレーカー設定 (auto_post_bot.circuit_breaker) が辞書形式ではありません。型: {type(cfg)}。既定値を使用します。")
+            cfg = {}
+        if not cfg.get("enabled", True):
+            return None
+
+        settings = {
+            "failure_threshold": cfg.get("failure_threshold", 2),
+            "base_open_minutes": cfg.get("base_open_minutes", 30),
+            "max_open_minutes": cfg.get("max_open_minutes", 1440),
+            "state_file": cfg.get("state_file", "circuit_breakers.json"),
+        }
+        for key, default in (("failure_threshold", 2), ("base_open_minutes", 30), ("max_open_minutes", 1440)):
+            value = settings[key]
+            if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+                logger.error(f"サーキットブレーカー設定 ({key}: {value}) が不正です。既定値 {default} を使用します。")
+                settings[key] = default
+        return settings
+
+    def get_purge_settings(self) -> Dict[str, Any]:
+        """
+        一括削除 (--purge) の設定 (auto_post_bot.purge_settings) を取得する。
+        未設定の項目は既定値 (DELETE /2/tweets/:id の 15分50回 に合わせた18秒間隔など) で補う。
+        """
+        cfg = self.get("auto_post_bot.purge_settings") or {}
+        if not isinstance(cfg, dict):
+            logger.error(f"一括削除設定 (auto_post_bot.purge_settings) が辞書形式ではありません。型: {type(cfg)}。既定値を使用します。")
+            cfg = {}
+
+        settings = {
+            "delete_interval_seconds": cfg.get("delete_interval_seconds", 18),
+            "max_concurrent_accounts": cfg.get("max_concurrent_accounts", 4),
+            "progress_file": cfg.get("progress_file", "purge_progress.json"),
+        }
+        for key, default, minimum in (("delete_interval_seconds", 18, 0), ("max_concurrent_accounts", 4, 1)):
+            value = settings[key]
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value < minimum:
+                logger.error(f"一括削除設定 ({key}: {value}) が不正です。既定値 {default} を使用します。")
+                settings[key] = default
+        return settings
+
+    def get_account_groups(self) -> Dict[str, List[str]]:
+        """
+        アカウントグループ (auto_post_bot.account_groups) を {グループ名: [アカウントID, ...]} として取得する。
+        シートの投稿先グループ列にグループ名が入っている行は、--fanout でグループ内の全アカウントに投稿される。
+        """
+        cfg = self.get("auto_post_bot.account_groups") or {}
+        if not isinstance(cfg, dict):
+            logger.error(f"アカウントグループ設定 (auto_post_bot.account_groups) が辞書形式ではありません。型: {type(cfg)}")
+            return {}
+        groups = {}
+        for group_name, account_ids in cfg.items():
+            if not isinstance(account_ids, list) or not all(isinstance(a, str) for a in account_ids):
+                logger.error(f"アカウントグループ '{group_name}' の設定が不正です。アカウントIDのリストである必要があります。無視します。")
+                continue
+            groups[group_name] = account_ids
+        return groups
+
+    def get_fanout_max_concurrent_accounts(self) -> int:
+        """グループ投稿 (--fanout) で同時にアップロード・投稿するアカウント数の上限を取得する。"""
+        value = self.get("auto_post_bot.fanout_settings.max_concurrent_accounts", 4)
+        if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+            logger.error(f"グループ投稿設定 (max_concurrent_accounts: {value}) が不正です。既定値 4 を使用します。")
+            return 4
+        return value
+
+    def get_async_engine_settings(self) -> Dict[str, Any]:
+        """
+        非同期エンジン (--process-async) の設定 (auto_post_bot.async_engine) を取得する。
+        host_limits はホスト名ごとの同時接続数の上限で、未指定のホストには max_connections_per_host を使う。
+        """
+        cfg = self.get("auto_post_bot.async_engine") or {}
+        if not isinstance(cfg, dict):
+            logger.error(f"非同期エンジン設定 (auto_post_bot.async_engine) が辞書形式ではありません。型: {type(cfg)}。既定値を使用します。")
+            cfg = {}
+
+        max_per_host = cfg.get("max_connections_per_host", 10)
+        if not isinstance(max_per_host, int) or isinstance(max_per_host, bool) or max_per_host <= 0:
+            logger.error(f"非同期エンジン設定 (max_connections_per_host: {max_per_host}) が不正です。既定値 10 を使用します。")
+            max_per_host = 10
+        host_limits = {}
+        for host, limit in (cfg.get("host_limits") or {}).items():
+            if isinstance(limit, int) and not isinstance(limit, bool) and limit > 0:
+                host_limits[host] = limit
+            else:
+                logger.error(f"非同期エンジン設定 (host_limits.{host}: {limit}) が不正です。正の整数である必要があります。無視します。")
+        return {"max_connections_per_host": max_per_host, "host_limits": host_limits}
+
     def get_posts_per_account_schedule(self) -> Optional[Dict[str, int]]:
         # ... (このメソッドは古いロジックの名残であり、現在は使用されていません)
         return None
 
+    def should_write_back_char_count(self) -> bool:
+        """シート読み込み時に計算した重み付き文字数を、文字数列に書き戻すかどうか。"""
+        val = self.get("auto_post_bot.posting_settings.write_back_char_count", False)
+        if not isinstance(val, bool):
+            logger.warning(f"文字数の書き戻し設定 (write_back_char_count: {val}) がブール値ではありません。書き戻しは行いません。")
+            return False
+        return val
+
+    def get_discord_outbox_settings(self) -> Optional[Dict[str, Any]]:
+        """
+        Discord通知のアウトボックス設定 (auto_post_bot.discord_notification) を取得する。
+        outbox_enabled: false の場合は None を返し、通知はその場で同期的に送信される。
+        """
+        cfg = self.get("auto_post_bot.discord_notification") or {}
+        if not isinstance(cfg, dict):
+            logger.error(f"Discord通知設定 (auto_post_bot.discord_notification) が辞書形式ではありません。型: {type(cfg)}。既定値を使用します。")
+            cfg = {}
+        if not cfg.get("outbox_enabled", True):
+            return None
+        drain_timeout = cfg.get("drain_timeout_seconds", 10)
+        if not isinstance(drain_timeout, (int, float)) or isinstance(drain_timeout, bool) or drain_timeout < 0:
+            logger.error(f"Discord通知設定 (drain_timeout_seconds: {drain_timeout}) が不正です。既定値 10 を使用します。")
+            drain_timeout = 10
+        return {
+            "directory": cfg.get("outbox_directory", "discord_outbox"),
+            "drain_timeout_seconds": drain_timeout,
+        }
+
+    def get_status_table_mode(self) -> str:
+        """
+        ステータス表の通知方法 (auto_post_bot.discord_notification.status_table_mode) を取得する。
+        "full" は全アカウント、"diff" は前回の通知から状態が変わったアカウントのみを送る。
+        """
+        mode = self.get("auto_post_bot.discord_notification.status_table_mode", "full")
+        if mode not in ("full", "diff"):
+            logger.warning(f"ステータス表の通知方法 (status_table_mode: {mode}) が不正です。'full' を使用します。")
+            return "full"
+        return mode
+
+    def get_notification_digest_settings(self) -> Optional[Dict[str, Any]]:
+        """
+        投稿結果のまとめ通知の設定 (auto_post_bot.discord_notification.digest) を取得する。
+        enabled: true の場合のみ設定を返し (既定は無効で、投稿ごとに通知する)、未設定の項目は既定値で補う。
+        immediate_error_classes に含まれる分類の失敗 (auth / duplicate / media / rate_limit / other) は、まとめずにすぐに通知する。
+        """
+        cfg = self.get("auto_post_bot.discord_notification.digest") or {}
+        if not isinstance(cfg, dict):
+            logger.error(f"まとめ通知設定 (auto_post_bot.discord_notification.digest) が辞書形式ではありません。型: {type(cfg)}。まとめ通知は無効にします。")
+            return None
+        if not cfg.get("enabled", False):
+            return None
+
+        window_minutes = cfg.get("window_minutes", 60)
+        if not isinstance(window_minutes, (int, float)) or isinstance(window_minutes, bool) or window_minutes <= 0:
+            logger.error(f"まとめ通知設定 (window_minutes: {window_minutes}) が不正です。既定値 60 を使用します。")
+            window_minutes = 60
+        immediate = cfg.get("immediate_error_classes", ["auth"])
+        if not isinstance(immediate, list) or not all(isinstance(c, str) for c in immediate):
+            logger.error(f"まとめ通知設定 (immediate_error_classes: {immediate}) が文字列のリストではありません。既定値 ['auth'] を使用します。")
+            immediate = ["auth"]
+        return {
+            "window_seconds": int(window_minutes * 60),
+            "immediate_error_classes": set(immediate),
+            "state_file": cfg.get("state_file", "notification_digest.jsonl"),
+        }
+
     def should_notify_daily_schedule_summary(self) -> Optional[bool]:
         val = self.get("auto_post_bot.discord_notification.notify_daily_schedule_summary")
         if val is None:
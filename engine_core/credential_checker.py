@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable
+
+from .twitter_client import TwitterClient
+from .utils.json_store import read_json_file, write_json_file_atomic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PARALLEL_CHECKS = 8
+
+
+def credential_fingerprint(account: Dict[str, Any]) -> str:
+    """APIキーの組み合わせを識別するハッシュ。キーを差し替えた場合はキャッシュ済みの結果を使わないようにする。"""
+    raw = "|".join(str(account.get(key, "")) for key in ("consumer_key", "consumer_secret", "access_token", "access_token_secret"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class CredentialChecker:
+    """
+    アカウントの認証情報を事前に (並列で) 確認し、結果をTTL付きでJSONファイルに記録するクラス。
+    無効 (401/403) と判定されたアカウントはTTLの間隔離され、シートの読み込みやメディアのダウンロードを行う前に除外される。
+    """
+    def __init__(self, store_path: str, ttl_seconds: int, max_workers: int = DEFAULT_MAX_PARALLEL_CHECKS):
+        self.store_path = store_path
+        self.ttl_seconds = ttl_seconds
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+
+    def _read_store(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        return read_json_file(self.store_path, "認証確認結果ファイル")
+
+    def _write_store(self, store: Dict[str, Dict[str, Any]]):
+        write_json_file_atomic(self.store_path, store, "認証確認結果ファイル")
+
+    def get_cached(self, account: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """TTL内で、かつ現在のAPIキーに対する確認結果があれば返す。"""
+        entry = (self._read_store() or {}).get(account["account_id"])
+        if not entry or entry.get("fingerprint") != credential_fingerprint(account):
+            return None
+        if entry.get("checked_at", 0) + self.ttl_seconds <= time.time():
+            return None
+        return entry
+
+    def is_quarantined(self, account: Dict[str, Any]) -> bool:
+        entry = self.get_cached(account)
+        return bool(entry) and entry.get("valid") is False
+
+    def check_accounts(self, accounts: List[Dict[str, Any]],
+                       client_factory: Callable[[str], TwitterClient]) -> Dict[str, Optional[bool]]:
+        """
+        キャッシュが切れているアカウントの認証情報を並列に確認し、アカウントIDごとの結果を返す。
+        一時的なエラーで確認できなかったアカウントは None とし、記録・隔離しない。
+        """
+        results: Dict[str, Optional[bool]] = {}
+        to_check = []
+        for account in accounts:
+            cached = self.get_cached(account)
+            if cached:
+                results[account["account_id"]] = cached["valid"]
+            else:
+                to_check.append(account)
+        if not to_check:
+            return results
+
+        def verify(account: Dict[str, Any]):
+            try:
+                return client_factory(account["account_id"]).verify_credentials()
+            except Exception as e:
+                return None, f"{type(e).__name__}: {e}"
+
+        logger.info(f"{len(to_check)} アカウントの認証情報を確認します。")
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(to_check)))) as pool:
+            checked = list(zip(to_check, pool.map(verify, to_check)))
+
+        with self._lock:
+            # 記録ファイルが壊れている場合も今回の確認結果は返し、ファイルへの保存だけを見送る
+            store = self._read_store()
+            for account, (valid, error) in checked:
+                account_id = account["account_id"]
+                results[account_id] = valid
+                if valid is None:
+                    logger.warning(f"アカウント '{account_id}' の認証情報を確認できませんでした (一時的なエラーの可能性があります): {error}")
+                    continue
+                if not valid:
+                    logger.error(f"アカウント '{account_id}' の認証情報が無効です。{self.ttl_seconds // 60}分間処理対象から除外します: {error}")
+                store[account_id] = {
+                    "valid": valid,
+                    "error": error,
+                    "checked_at": int(time.time()),
+                    "fingerprint": credential_fingerprint(account),
+                }
+            self._write_store(store)
+        return results
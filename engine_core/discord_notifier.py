@@ -1,7 +1,14 @@
 import requests
 import logging
+import threading
+import time
 from datetime import datetime, timezone, timedelta # datetimeクラスを直接インポート
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Union
+
+from .utils.http_session import get_shared_session
+from .notification_outbox import NotificationOutbox
+from . import metrics
+from .utils.status_table import render_table_pages
 
 # このモジュールがengine_coreパッケージ内にあることを想定してConfigをインポート
 # ただし、DiscordNotifier自体はConfigに直接依存せず、Webhook URLは外部から渡される想定
@@ -9,18 +16,190 @@ from typing import Optional, Dict, Any, List
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_DRAIN_TIMEOUT_SECONDS = 10
+# 通知は投稿処理より優先度が低いため、共有セッションの既定値より短いタイムアウトで打ち切る (接続, 読み込み)
+POST_TIMEOUT = (5, 15)
+# Discordの1メッセージあたりの上限
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_TOTAL_CHARS = 6000
+# 429 を受けた場合の再送回数と、待つ時間の上限 (これより長い場合は送信を諦めて後で再送する)
+MAX_RATE_LIMIT_RETRIES = 3
+MAX_RATE_LIMIT_WAIT_SECONDS = 60
+
+
+def embed_size(embed: Dict[str, Any]) -> int:
+    """Discordの文字数制限 (1メッセージの埋め込み合計6000文字) の対象となる文字数を返す。"""
+    size = len(str(embed.get("title") or "")) + len(str(embed.get("description") or ""))
+    size += len(str((embed.get("footer") or {}).get("text") or "")) + len(str((embed.get("author") or {}).get("name") or ""))
+    for field in embed.get("fields") or []:
+        size += len(str(field.get("name") or "")) + len(str(field.get("value") or ""))
+    return size
+
+
+def coalesce_payloads(payloads: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], int]]:
+    """
+    送信待ちのペイロードを、順序を保ったまま上限 (埋め込み10件・合計6000文字) の範囲でなるべく少ないメッセージにまとめる。
+    埋め込みのみで表示名が同じペイロード同士をまとめる。(メッセージ, まとめた元のペイロード数) のリストを返す。
+    """
+    messages: List[Tuple[Dict[str, Any], int]] = []
+    current: Optional[Dict[str, Any]] = None
+    current_count = current_size = 0
+    for payload in payloads:
+        embeds = payload.get("embeds") or []
+        mergeable = bool(embeds) and set(payload) <= {"embeds", "username"}
+        size = sum(embed_size(embed) for embed in embeds)
+        if (mergeable and current is not None and current.get("username") == payload.get("username")
+                and len(current["embeds"]) + len(embeds) <= MAX_EMBEDS_PER_MESSAGE
+                and current_size + size <= MAX_EMBED_TOTAL_CHARS):
+            current["embeds"].extend(embeds)
+            current_count += 1
+            current_size += size
+            continue
+        if current is not None:
+            messages.append((current, current_count))
+        if mergeable:
+            current = dict(payload, embeds=list(embeds))
+            current_count, current_size = 1, size
+        else:
+            messages.append((payload, 1))
+            current, current_count, current_size = None, 0, 0
+    if current is not None:
+        messages.append((current, current_count))
+    return messages
+
+
 class DiscordNotifier:
-    def __init__(self, webhook_url: str):
-        if not webhook_url:
+    def __init__(self, webhook_url: Union[str, List[str]], session: Optional[requests.Session] = None,
+                 outbox_dir: Optional[str] = None, drain_timeout_seconds: float = DEFAULT_DRAIN_TIMEOUT_SECONDS):
+        webhook_urls = [webhook_url] if isinstance(webhook_url, str) else [url for url in (webhook_url or []) if url]
+        if not webhook_urls or not all(webhook_urls):
             msg = "Discord Webhook URLが設定されていません。"
             logger.error(msg)
             raise ValueError(msg)
-        self.webhook_url = webhook_url
+        # 複数のWebhookが指定された場合は、レート制限に掛かっていないものを順番に使って負荷を分散する
+        self.webhook_urls = webhook_urls
+        self.webhook_url = webhook_urls[0]
+        self._webhook_lock = threading.Lock()
+        self._blocked_until: Dict[str, float] = {url: 0.0 for url in webhook_urls}
+        self._next_webhook_index = 0
+        # 既定のタイムアウトと再試行を備えた共有セッション
+        self.session = session or get_shared_session()
+        # outbox_dir が指定された場合、通知はアウトボックスに積んでバックグラウンドで送信する (投稿処理を待たせない)
+        self.drain_timeout_seconds = drain_timeout_seconds
+        self.outbox: Optional[NotificationOutbox] = None
+        if outbox_dir:
+            self.outbox = NotificationOutbox(directory=outbox_dir, sender=self._send_batch)
+            self.outbox.start()
+
+    def close(self):
+        """アウトボックスの送信待ちの通知を、最大 drain_timeout_seconds 秒で送り切る。残りは次回の実行で送信する。"""
+        if self.outbox:
+            self.outbox.close(self.drain_timeout_seconds)
+            self.outbox = None
+
+    def _deliver(self, payload: Dict[str, Any]) -> bool:
+        """アウトボックスがあればキューに積んで True を返し、なければその場で送信する。"""
+        if self.outbox:
+            self.outbox.put(payload)
+            return True
+        return self._send_batch([payload]) == 1
+
+    def _send_batch(self, payloads: List[Dict[str, Any]]) -> int:
+        """
+        ペイロードをなるべく少ないメッセージにまとめて送信し、先頭から何件送信できたかを返す。
+        途中で失敗した場合、それ以降のペイロードは送信しない (呼び出し側で再送する)。
+        """
+        delivered = 0
+        messages = coalesce_payloads(payloads)
+        if len(messages) < len(payloads):
+            logger.info(f"Discord通知 {len(payloads)} 件を {len(messages)} 件のメッセージにまとめて送信します。")
+        for message, count in messages:
+            if not self._post_payload(message):
+                break
+            delivered += count
+        return delivered
+
+    def _pick_webhook(self) -> Tuple[str, float]:
+        """次に使うWebhookと、そのレート制限が解除されるまでの待ち時間 (秒) を返す。"""
+        with self._webhook_lock:
+            now = time.monotonic()
+            for offset in range(len(self.webhook_urls)):
+                index = (self._next_webhook_index + offset) % len(self.webhook_urls)
+                url = self.webhook_urls[index]
+                if self._blocked_until[url] <= now:
+                    self._next_webhook_index = (index + 1) % len(self.webhook_urls)
+                    return url, 0.0
+            url = min(self.webhook_urls, key=lambda u: self._blocked_until[u])
+            return url, self._blocked_until[url] - now
+
+    def _record_rate_limit(self, url: str, response: requests.Response):
+        """レスポンスの retry_after / X-RateLimit-* から、Webhookを使えない期間を記録する。"""
+        wait_seconds = None
+        if response.status_code == 429:
+            try:
+                wait_seconds = float(response.json().get("retry_after"))
+            except (ValueError, TypeError, AttributeError):
+                wait_seconds = None
+            if wait_seconds is None:
+                try:
+                    wait_seconds = float(response.headers.get("Retry-After", 1))
+                except (TypeError, ValueError):
+                    wait_seconds = 1.0
+        elif response.headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                wait_seconds = float(response.headers.get("X-RateLimit-Reset-After", 0))
+            except (TypeError, ValueError):
+                wait_seconds = None
+        if not wait_seconds:
+            return
+        blocked_until = time.monotonic() + wait_seconds
+        is_global = str(response.headers.get("X-RateLimit-Global", "")).lower() == "true"
+        with self._webhook_lock:
+            for target in (self.webhook_urls if is_global else [url]):
+                self._blocked_until[target] = max(self._blocked_until[target], blocked_until)
+
+    def _post_payload(self, payload: Dict[str, Any]) -> bool:
+        """Webhookにペイロードを送信する。429 の場合は retry_after だけ待って (別のWebhookがあればそちらで) 再送する。"""
+        sent = self._post_payload_with_retries(payload)
+        metrics.inc("discord_messages_total", result="sent" if sent else "failed")
+        return sent
+
+    def _post_payload_with_retries(self, payload: Dict[str, Any]) -> bool:
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            url, wait_seconds = self._pick_webhook()
+            if wait_seconds > MAX_RATE_LIMIT_WAIT_SECONDS:
+                logger.warning(f"Discord Webhookのレート制限の解除まで {wait_seconds:.0f} 秒かかるため、送信を見送ります。")
+                return False
+            if wait_seconds > 0:
+                logger.info(f"Discord Webhookのレート制限が解除されるまで {wait_seconds:.1f} 秒待機します。")
+                time.sleep(wait_seconds)
+            try:
+                response = self.session.post(url, json=payload, timeout=POST_TIMEOUT)
+                self._record_rate_limit(url, response)
+                if response.status_code == 429:
+                    metrics.inc("discord_rate_limit_hits_total")
+                    logger.warning(f"Discord Webhookのレート制限 (429) に達しました ({attempt + 1}/{MAX_RATE_LIMIT_RETRIES + 1})。")
+                    continue
+                response.raise_for_status()  # 2xx 以外のステータスコードで例外を発生
+                logger.info(f"Discord通知成功。ステータスコード: {response.status_code}")
+                return True
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Discord通知失敗: {e}", exc_info=True)
+                # 特に4xx, 5xx系のエラー詳細もログに出力される
+                if e.response is not None:
+                    logger.error(f"Discord APIエラーレスポンス: {e.response.text}")
+                return False
+            except Exception as e:
+                logger.error(f"Discord通知中の予期せぬエラー: {e}", exc_info=True)
+                return False
+        logger.error("Discord Webhookのレート制限が続いたため、通知を送信できませんでした。")
+        return False
 
     def send_message(self, message: Optional[str] = None, embeds: Optional[List[Dict[str, Any]]] = None, username: Optional[str] = None) -> bool:
         """
         Discordにメッセージまたは埋め込みコンテンツを送信する。
         両方指定された場合は、両方送信しようとします (Discordの仕様によります)。
+        アウトボックスを使う場合は、キューに積めた時点で True を返す。
         """
         if not message and not embeds:
             logger.warning("送信するメッセージも埋め込みコンテンツもありません。")
@@ -34,29 +213,15 @@ class DiscordNotifier:
         if username:
             payload['username'] = username # ボットの表示名を一時的に変更
         
-        try:
-            log_message_parts = [
-                f"Discord通知送信開始: Webhook={self.webhook_url[:30]}...",
-                f"Content='{str(message)[:30]}...'",
-                f"Embeds?={'Yes' if embeds else 'No'}"
-            ]
-            if embeds and isinstance(embeds, list) and len(embeds) > 0 and isinstance(embeds[0], dict) and 'description' in embeds[0]:
-                log_message_parts.append(f", FirstEmbedDesc='{str(embeds[0]['description'])[:50]}...'" )
-            logger.info(" ".join(log_message_parts))
-
-            response = requests.post(self.webhook_url, json=payload)
-            response.raise_for_status()  # 2xx 以外のステータスコードで例外を発生
-            logger.info(f"Discord通知成功。ステータスコード: {response.status_code}")
-            return True
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Discord通知失敗: {e}", exc_info=True)
-            # 特に4xx, 5xx系のエラー詳細もログに出力される
-            if e.response is not None:
-                logger.error(f"Discord APIエラーレスポンス: {e.response.text}")
-            return False
-        except Exception as e:
-            logger.error(f"Discord通知中の予期せぬエラー: {e}", exc_info=True)
-            return False
+        log_message_parts = [
+            f"Discord通知送信開始: Webhook={self.webhook_url[:30]}...",
+            f"Content='{str(message)[:30]}...'",
+            f"Embeds?={'Yes' if embeds else 'No'}"
+        ]
+        if embeds and isinstance(embeds, list) and len(embeds) > 0 and isinstance(embeds[0], dict) and 'description' in embeds[0]:
+            log_message_parts.append(f", FirstEmbedDesc='{str(embeds[0]['description'])[:50]}...'" )
+        logger.info(" ".join(log_message_parts))
+        return self._deliver(payload)
 
     def send_simple_notification(self, title: str, description: str, color: int = 0x00ff00, error: bool = False) -> bool:
         """簡易的な通知用埋め込みメッセージを送信する。"""
@@ -130,54 +295,37 @@ class DiscordNotifier:
         
         return self.send_message(embeds=[embed], username=bot_username)
 
-    def send_status_table(self, title: str, headers: List[str], data: List[List[str]], color: int = 0x000000):
+    def send_status_table(self, title: str, headers: List[str], data: List[List[str]], color: int = 0x000000) -> bool:
         """
-        ステータス情報をテーブル形式で送信する。
+        ステータス情報をテーブル形式で送信し、全ページを送信できた (アウトボックスに積めた) 場合に True を返す。
+        表は列幅を揃えた等幅のコードブロックにし、行数が多い場合は複数の埋め込み (ページ) に分割する。
+        ページは埋め込みの上限の範囲でなるべく少ないメッセージにまとめて送信し、失敗した時点で残りは送らない。
         :param title: Embedのタイトル
         :param headers: テーブルのヘッダー (可変長)
         :param data: テーブルのデータ (各行の要素数はヘッダーと一致させる)
         :param color: Embedの左側の色
         """
-        if not self.webhook_url:
-            logger.warning("Discord Webhook URLが設定されていないため、通知をスキップしました。")
-            return
-
         num_columns = len(headers)
         if num_columns == 0 or any(len(row) != num_columns for row in data):
             logger.error(f"テーブル通知のヘッダーまたはデータの形式が不正です。各行の列数はヘッダー({num_columns}列)と一致する必要があります。")
-            return
-
-        embed = {
-            "title": title,
-            "color": color,
-            "fields": [],
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-
-        # ヘッダーをフィールドとして追加 (インラインで並べる)
-        for header in headers:
-            embed["fields"].append({"name": f"**{header}**", "value": "\u200b", "inline": True})
-
-        # 各行のデータをフィールドとして追加 (インラインで並べる)
-        for row in data:
-            for i, cell in enumerate(row):
-                # 空のセルでも高さを揃えるためにゼロ幅スペースを入れる
-                value = str(cell) if cell is not None and str(cell).strip() != "" else "\u200b"
-                embed["fields"].append({"name": "\u200b", "value": value, "inline": True})
-        
-        # 3列や4列の場合、最後の要素の後に空のインラインフィールドを追加すると改行が揃うことがある
-        # ただし、Discordのクライアントや表示幅によって挙動が変わるため、常にうまくいくとは限らない
-        # if num_columns % 3 != 0:
-        #    embed["fields"].append({"name": "\u200b", "value": "\u200b", "inline": True})
+            return False
 
-        payload = {"embeds": [embed]}
-        
-        try:
-            response = requests.post(self.webhook_url, json=payload)
-            response.raise_for_status()
-            logger.info(f"Discord通知成功（テーブル形式）。ステータスコード: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Discord通知（テーブル形式）の送信中にエラーが発生しました: {e}")
+        pages = render_table_pages(headers, data)
+        timestamp = datetime.now(timezone.utc).isoformat()
+        payloads = []
+        for i, page in enumerate(pages, start=1):
+            embed = {
+                "title": title if len(pages) == 1 else f"{title} ({i}/{len(pages)})",
+                "description": page,
+                "color": color,
+                "timestamp": timestamp
+            }
+            payloads.append({"embeds": [embed]})
+        logger.info(f"Discordにテーブル形式で {len(data)} 行を {len(pages)} ページに分けて送信します。")
+        for message, _ in coalesce_payloads(payloads):
+            if not self._deliver(message):
+                return False
+        return True
 
 if __name__ == '__main__':
     import os # if __name__ 内でのみ使用
@@ -0,0 +1,59 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+import logging
+from typing import Dict, Optional, Set
+from .utils.json_store import read_json_file, write_json_file_atomic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_HOURS = 24
+
+
+def normalize_text(text: str) -> str:
+    """重複判定用に本文を正規化する (NFKC・空白の連続を1つに・前後の空白を除去)。"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text or '')).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()[:16]
+
+
+class DuplicateContentIndex:
+    """
+    アカウントごとに、直近 window_hours 時間に投稿した本文のハッシュと投稿時刻をJSONファイルに記録する索引。
+    Twitterは同一内容の連続投稿を拒否するため、候補選択の時点で重複する行を除外するために使う。
+    """
+    def __init__(self, store_path: str, window_hours: int = DEFAULT_WINDOW_HOURS):
+        self.store_path = store_path
+        self.window_seconds = window_hours * 3600
+        self._lock = threading.Lock()
+
+    def _read_store(self) -> Optional[Dict[str, Dict[str, int]]]:
+        return read_json_file(self.store_path, "重複判定用の索引ファイル")
+
+    def _write_store(self, store: Dict[str, Dict[str, int]]):
+        write_json_file_atomic(self.store_path, store, "重複判定用の索引ファイル")
+
+    def recent_hashes(self, account_id: str, now: Optional[float] = None) -> Set[str]:
+        """直近 window_hours 時間に投稿した本文のハッシュの集合を返す。"""
+        cutoff = (now or time.time()) - self.window_seconds
+        return {h for h, posted_at in (self._read_store() or {}).get(account_id, {}).items() if posted_at > cutoff}
+
+    def is_recent_duplicate(self, account_id: str, text: str) -> bool:
+        return text_hash(text) in self.recent_hashes(account_id)
+
+    def record(self, account_id: str, text: str, posted_at: Optional[float] = None):
+        """投稿した本文を記録する。期間を過ぎたエントリは記録時に削除する。"""
+        now = posted_at or time.time()
+        cutoff = now - self.window_seconds
+        with self._lock:
+            store = self._read_store()
+            if store is None:
+                return
+            entries = {h: t for h, t in store.get(account_id, {}).items() if t > cutoff}
+            entries[text_hash(text)] = int(now)
+            store[account_id] = entries
+            self._write_store(store)
@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows ではファイルロックを使わない (司令塔とワーカーが同時に書き出すことはまれ)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "inbound_engine_"
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# メトリクスの説明 (Prometheus の HELP 行)
+METRIC_HELP = {
+    "posts_total": "ワーカーの投稿結果 (outcome: posted / skipped / failed / rate_limited)",
+    "post_phase_seconds": "投稿の工程ごとの所要時間 (秒)",
+    "twitter_rate_limit_hits_total": "Twitter API のレート制限 (429) に掛かった回数",
+    "sheets_api_calls_total": "Google Sheets API の呼び出し回数 (operation: read / write)",
+    "media_download_bytes_total": "ダウンロードしたメディアのバイト数",
+    "ffmpeg_seconds": "ffmpeg による動画メタデータ変更の所要時間 (秒)",
+    "discord_messages_total": "Discord Webhook への送信結果 (result: sent / failed)",
+    "discord_rate_limit_hits_total": "Discord Webhook のレート制限 (429) に掛かった回数",
+    "http_requests_total": "HTTP リクエスト数 (ホスト別)",
+    "runs_total": "main.py の実行回数 (mode 別)",
+}
+
+
+def _series_key(name: str, labels: Dict[str, str]) -> str:
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = sorted(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(str(v))}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """
+    実行中に各コンポーネントが加算するカウンターとヒストグラムを保持する。
+    値はこの実行分のみで、実行の終わりに MetricsStore に加算して書き出す。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[str, Dict[str, Any]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        labels = {k: str(v) for k, v in labels.items()}
+        key = _series_key(name, labels)
+        with self._lock:
+            series = self._series.setdefault(key, {"type": "counter", "name": name, "labels": labels, "value": 0})
+            series["value"] += value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels: str):
+        labels = {k: str(v) for k, v in labels.items()}
+        key = _series_key(name, labels)
+        with self._lock:
+            series = self._series.setdefault(key, {
+                "type": "histogram", "name": name, "labels": labels,
+                "buckets": list(buckets), "bucket_counts": [0] * len(buckets), "sum": 0.0, "count": 0,
+            })
+            for i, bound in enumerate(series["buckets"]):
+                if value <= bound:
+                    series["bucket_counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return json.loads(json.dumps(self._series))
+
+    def take(self) -> Dict[str, Dict[str, Any]]:
+        """現在の値を取り出してゼロに戻す (同じ値を二重に加算しないため)。"""
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+
+def merge_series(total: Dict[str, Dict[str, Any]], delta: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """累積値 total にこの実行分 delta を加算した新しい辞書を返す。ヒストグラムの区切りが変わった系列は delta で置き換える。"""
+    merged = json.loads(json.dumps(total))
+    for key, series in delta.items():
+        current = merged.get(key)
+        if current is None or current.get("type") != series["type"] or current.get("buckets") != series.get("buckets"):
+            merged[key] = json.loads(json.dumps(series))
+        elif series["type"] == "counter":
+            current["value"] += series["value"]
+        else:
+            current["bucket_counts"] = [a + b for a, b in zip(current["bucket_counts"], series["bucket_counts"])]
+            current["sum"] += series["sum"]
+            current["count"] += series["count"]
+    return merged
+
+
+def render_prometheus(series_by_key: Dict[str, Dict[str, Any]]) -> str:
+    """系列を Prometheus のテキスト形式に変換する。"""
+    by_name: Dict[str, list] = {}
+    for series in series_by_key.values():
+        by_name.setdefault(series["name"], []).append(series)
+
+    lines = []
+    for name in sorted(by_name):
+        full_name = METRIC_PREFIX + name
+        metric_type = by_name[name][0]["type"]
+        if name in METRIC_HELP:
+            lines.append(f"# HELP {full_name} {METRIC_HELP[name]}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+        for series in sorted(by_name[name], key=lambda s: sorted(s["labels"].items())):
+            labels = series["labels"]
+            if metric_type == "counter":
+                lines.append(f"{full_name}{_format_labels(labels)} {series['value']:g}")
+                continue
+            for bound, count in zip(series["buckets"], series["bucket_counts"]):
+                lines.append(f"{full_name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {count}")
+            lines.append(f"{full_name}_bucket{_format_labels(labels, ('le', '+Inf'))} {series['count']}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {series['sum']:g}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {series['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsStore:
+    """
+    実行をまたいだ累積値を JSON ファイルに保存する (GitHub Actions のような使い捨ての実行環境でも推移を残すため)。
+    司令塔とワーカーが同時に加算しても失われないよう、読み書きはファイルロックの中で行う。
+    """
+    def __init__(self, path: str, textfile_path: Optional[str] = None):
+        self.path = path
+        self.textfile_path = textfile_path
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            return json.loads(content) if content else {}
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"メトリクスの記録ファイル '{self.path}' の読み込みに失敗しました: {e}", exc_info=True)
+            return {}
+
+    def _write_atomic(self, path: str, content: str):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def add(self, delta: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """この実行分を累積値に加算して保存し、Prometheus のテキストファイルも書き出す。加算後の累積値を返す。"""
+        lock_file = None
+        try:
+            if fcntl:
+                lock_file = open(f"{self.path}.lock", 'w')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            total = merge_series(self.load(), delta)
+            self._write_atomic(self.path, json.dumps(total, indent=2, ensure_ascii=False, sort_keys=True))
+            if self.textfile_path:
+                self._write_atomic(self.textfile_path, render_prometheus(total))
+            return total
+        except IOError as e:
+            logger.error(f"メトリクスの書き出しに失敗しました ({self.path}): {e}", exc_info=True)
+            return {}
+        finally:
+            if lock_file:
+                lock_file.close()
+
+
+# プロセス内で共有するレジストリ。各コンポーネントはここに加算する
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    return _registry
+
+
+def inc(name: str, value: float = 1, **labels: str):
+    _registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels: str):
+    _registry.observe(name, value, **labels)
+
+
+def flush_to_store(store: MetricsStore, registry: Optional[MetricsRegistry] = None) -> Dict[str, Dict[str, Any]]:
+    """レジストリのこの実行分を取り出して累積値に加算する。"""
+    return store.add((registry or _registry).take())
+
+
+def start_metrics_server(store: MetricsStore, port: int, host: str = "127.0.0.1",
+                         registry: Optional[MetricsRegistry] = None) -> ThreadingHTTPServer:
+    """
+    常駐する場合に、累積値とまだ書き出していない現在の値を合わせて /metrics で返す HTTP サーバーをバックグラウンドで起動する。
+    """
+    registry = registry or _registry
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus(merge_series(store.load(), registry.snapshot())).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"/metrics: {format % args}")
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"メトリクスの HTTP エンドポイントを起動しました: http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OUTCOME_POSTED = "posted"
+OUTCOME_SKIPPED = "skipped"
+OUTCOME_FAILED = "failed"
+OUTCOME_RATE_LIMITED = "rate_limited"
+OUTCOMES = (OUTCOME_POSTED, OUTCOME_SKIPPED, OUTCOME_FAILED, OUTCOME_RATE_LIMITED)
+
+# 失敗の分類 (circuit_breaker の auth / duplicate / media に加えて、レート制限と分類できない失敗)
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_OTHER = "other"
+
+OUTCOME_LABELS = {
+    OUTCOME_POSTED: "✅ 投稿",
+    OUTCOME_SKIPPED: "🤔 スキップ",
+    OUTCOME_FAILED: "⚠️ 失敗",
+    OUTCOME_RATE_LIMITED: "⏳ レート制限",
+}
+
+
+def _percentile(values: List[float], ratio: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def summarize_entries(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """記録した投稿結果を、結果ごとの件数・失敗の分類ごとの件数・工程ごとの所要時間 (p50 / p95 / 最大) に集計する。"""
+    counts = {outcome: 0 for outcome in OUTCOMES}
+    error_counts: Dict[str, int] = {}
+    failed_accounts: Dict[str, int] = {}
+    phase_values: Dict[str, List[float]] = {}
+    for entry in entries:
+        outcome = entry.get("outcome")
+        if outcome not in counts:
+            continue
+        counts[outcome] += 1
+        if outcome in (OUTCOME_FAILED, OUTCOME_RATE_LIMITED):
+            error_class = entry.get("error_class") or ERROR_OTHER
+            error_counts[error_class] = error_counts.get(error_class, 0) + 1
+            failed_accounts[entry.get("account_id")] = failed_accounts.get(entry.get("account_id"), 0) + 1
+        for phase, seconds in (entry.get("phase_seconds") or {}).items():
+            phase_values.setdefault(phase, []).append(float(seconds))
+
+    timestamps = [entry["recorded_at"] for entry in entries if "recorded_at" in entry]
+    return {
+        "counts": counts,
+        "error_counts": error_counts,
+        "failed_accounts": failed_accounts,
+        "phase_seconds": {
+            phase: {"p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95), "max": max(values)}
+            for phase, values in phase_values.items()
+        },
+        "started_at": min(timestamps) if timestamps else None,
+        "ended_at": max(timestamps) if timestamps else None,
+    }
+
+
+def format_digest(summary: Dict[str, Any]) -> Tuple[str, str]:
+    """集計結果をDiscord通知のタイトルと本文に整形する。"""
+    counts = summary["counts"]
+    title = f"📊 投稿サマリー ({sum(counts.values())}件)"
+    lines = [" / ".join(f"{OUTCOME_LABELS[outcome]}: {counts[outcome]}" for outcome in OUTCOMES)]
+    if summary["error_counts"]:
+        lines.append("失敗の内訳: " + ", ".join(f"{error_class} {count}" for error_class, count in sorted(summary["error_counts"].items())))
+    if summary["failed_accounts"]:
+        lines.append("失敗したアカウント: " + ", ".join(f"`{account_id}` ({count})" for account_id, count in sorted(summary["failed_accounts"].items())))
+    for phase, stats in sorted(summary["phase_seconds"].items()):
+        lines.append(f"{phase}: p50 {stats['p50']:.1f}秒 / p95 {stats['p95']:.1f}秒 / 最大 {stats['max']:.1f}秒")
+    return title, "\n".join(lines)
+
+
+class NotificationDigest:
+    """
+    投稿ごとの結果を JSON Lines のファイルに記録し、一定時間 (window_seconds) ごとに1件のサマリーにまとめる。
+    ワーカーは別プロセスのため、結果はファイルに追記して司令塔・ワーカーの間で共有する。
+    まとめる際はファイルを '<path>.<pid>' に改名して確保し、同じ記録を二重に集計しないようにする。
+    """
+    def __init__(self, path: str, window_seconds: int):
+        self.path = path
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+
+    def record(self, account_id: str, outcome: str, error_class: Optional[str] = None,
+               phase_seconds: Optional[Dict[str, float]] = None):
+        entry = {
+            "account_id": account_id,
+            "outcome": outcome,
+            "error_class": error_class,
+            "phase_seconds": {phase: round(seconds, 3) for phase, seconds in (phase_seconds or {}).items()},
+            "recorded_at": int(time.time()),
+        }
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except IOError as e:
+            logger.error(f"投稿結果の記録ファイル '{self.path}' への書き込みに失敗しました: {e}", exc_info=True)
+
+    def _oldest_recorded_at(self) -> Optional[int]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        return json.loads(line).get("recorded_at")
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"投稿結果の記録ファイル '{self.path}' の先頭行を読み込めません: {e}")
+            return 0
+        return None
+
+    def is_due(self, now: Optional[float] = None) -> bool:
+        """最も古い記録から window_seconds 以上経っているかを返す (記録がなければ False)。"""
+        oldest = self._oldest_recorded_at()
+        return oldest is not None and (now if now is not None else time.time()) - oldest >= self.window_seconds
+
+    def take_if_due(self, now: Optional[float] = None, force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        最も古い記録から window_seconds 以上経っていれば (force の場合は常に)、記録を取り出して集計結果を返す。
+        まだ期間内の場合や、他のプロセスが先に取り出した場合は None を返す。
+        """
+        if not (self.is_due(now) or (force and self._oldest_recorded_at() is not None)):
+            return None
+
+        claimed_path = f"{self.path}.{os.getpid()}"
+        try:
+            os.rename(self.path, claimed_path)
+        except OSError:
+            return None
+
+        entries = []
+        try:
+            with open(claimed_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logger.warning(f"投稿結果の記録ファイル '{claimed_path}' に不正な行があるためスキップします。")
+        finally:
+            os.remove(claimed_path)
+        return summarize_entries(entries) if entries else None
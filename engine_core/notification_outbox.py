@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_INTERVAL_SECONDS = 5
+DEFAULT_MAX_ATTEMPTS = 10
+# 1回の送信でまとめて渡す通知の最大件数 (送信側でメッセージにまとめる)
+DEFAULT_MAX_BATCH = 50
+PENDING_SUFFIX = ".json"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class NotificationOutbox:
+    """
+    通知を送信待ちキューに積み、バックグラウンドのスレッドで送信するアウトボックス。
+    通知は1件ずつ directory にファイルとして保存し、送信できたものから削除する。
+    終了時は期限付きで送信待ちの通知を送り切り、送れなかった通知は次回の実行時に送信する。
+
+    sender は溜まっている通知のリストを受け取り、先頭から何件送信できたかを返す (まとめて送信できるようにするため)。
+
+    司令塔とワーカーが同じディレクトリを使っても二重に送信しないように、
+    処理中のファイルは '<名前>.json.<pid>' に改名して自プロセスのものとして確保する。
+    """
+    def __init__(self, directory: str, sender: Callable[[List[Dict[str, Any]]], int],
+                 retry_interval_seconds: float = DEFAULT_RETRY_INTERVAL_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, max_batch: int = DEFAULT_MAX_BATCH):
+        self.directory = directory
+        self.sender = sender
+        self.retry_interval_seconds = retry_interval_seconds
+        self.max_attempts = max_attempts
+        self.max_batch = max_batch
+        self._queue: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._stopping = False
+        self._sequence = 0
+        self._thread: Optional[threading.Thread] = None
+        self._suffix = f"{PENDING_SUFFIX}.{os.getpid()}"
+
+    def start(self):
+        """前回の実行で送れなかった通知を確保してキューに戻し、送信スレッドを起動する。"""
+        os.makedirs(self.directory, exist_ok=True)
+        restored = 0
+        for name in sorted(os.listdir(self.directory)):
+            claimed_path = self._claim(name)
+            if not claimed_path:
+                continue
+            entry = self._read_entry(claimed_path)
+            if entry is None:
+                continue
+            self._queue.append((claimed_path, entry))
+            restored += 1
+        if restored:
+            logger.info(f"前回送信できなかった通知 {restored} 件を送信キューに戻しました。")
+        self._thread = threading.Thread(target=self._run, name="notification-outbox", daemon=True)
+        self._thread.start()
+
+    def _claim(self, name: str) -> Optional[str]:
+        """未送信のファイル、または終了したプロセスが確保したままのファイルを自プロセスのものとして確保する。"""
+        path = os.path.join(self.directory, name)
+        if name.endswith(PENDING_SUFFIX):
+            base = name
+        else:
+            base, _, owner = name.rpartition(".")
+            if not base.endswith(PENDING_SUFFIX) or not owner.isdigit() or _pid_alive(int(owner)):
+                return None
+        claimed_path = os.path.join(self.directory, base + self._suffix[len(PENDING_SUFFIX):])
+        try:
+            os.rename(path, claimed_path)
+        except OSError:
+            # 他のプロセスが先に確保した
+            return None
+        return claimed_path
+
+    def _read_entry(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"送信待ちの通知ファイル '{path}' を読み込めないため破棄します: {e}")
+            self._remove(path)
+            return None
+
+    def _write_entry(self, path: str, entry: Dict[str, Any]):
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+        except IOError as e:
+            logger.error(f"送信待ちの通知ファイル '{path}' の書き込みに失敗しました: {e}", exc_info=True)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"送信済みの通知ファイル '{path}' の削除に失敗しました: {e}")
+
+    def put(self, payload: Dict[str, Any]):
+        """通知をキューに積む (ディスクに保存してからすぐに戻る)。"""
+        with self._condition:
+            self._sequence += 1
+            name = f"{time.time_ns()}_{os.getpid()}_{self._sequence:06d}{self._suffix}"
+            path = os.path.join(self.directory, name)
+            entry = {"payload": payload, "attempts": 0, "created_at": int(time.time())}
+            self._write_entry(path, entry)
+            self._queue.append((path, entry))
+            self._condition.notify()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._queue) + self._in_flight
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                self._in_flight += len(batch)
+
+            try:
+                delivered = self._send([entry["payload"] for _, entry in batch])
+            finally:
+                with self._condition:
+                    self._in_flight -= len(batch)
+
+            for path, _ in batch[:delivered]:
+                self._remove(path)
+            remaining = batch[delivered:]
+            if remaining:
+                # 送信に失敗した通知の試行回数を数え、上限に達したものは破棄する
+                path, entry = remaining[0]
+                entry["attempts"] += 1
+                if entry["attempts"] >= self.max_attempts:
+                    logger.error(f"通知の送信に {entry['attempts']} 回失敗したため破棄します: {path}")
+                    self._remove(path)
+                    remaining = remaining[1:]
+                else:
+                    self._write_entry(path, entry)
+                with self._condition:
+                    self._queue.extendleft(reversed(remaining))
+                    # 停止要求があればすぐに起きる (残りは次回の実行で送信する)
+                    self._condition.wait(self.retry_interval_seconds)
+            with self._condition:
+                self._condition.notify_all()
+
+    def _send(self, payloads: List[Dict[str, Any]]) -> int:
+        try:
+            return max(0, min(len(payloads), int(self.sender(payloads))))
+        except Exception as e:
+            logger.error(f"通知の送信中に予期せぬエラー: {e}", exc_info=True)
+            return 0
+
+    def close(self, timeout_seconds: float) -> int:
+        """
+        最大 timeout_seconds 秒、送信待ちの通知を送り切るのを待ってから送信スレッドを止める。
+        送れなかった通知はファイルに残して確保を解除し、次回の実行で送信する。残った件数を返す。
+        """
+        deadline = time.monotonic() + timeout_seconds
+        with self._condition:
+            while (self._queue or self._in_flight) and self._thread and self._thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            self._stopping = True
+            self._queue.clear()
+            self._condition.notify_all()
+
+        if self._thread:
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+        # 送信中のまま期限を過ぎた通知も含めて、自プロセスが確保しているファイルを未送信に戻す
+        released = 0
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            if name.endswith(self._suffix):
+                try:
+                    os.rename(os.path.join(self.directory, name), os.path.join(self.directory, name[:-len(self._suffix)] + PENDING_SUFFIX))
+                    released += 1
+                except OSError:
+                    pass
+        if released:
+            logger.warning(f"送信できなかった通知 {released} 件を次回の実行で送信します。")
+        return released
@@ -0,0 +1,46 @@
+import json
+import os
+import threading
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PostLedger:
+    """
+    投稿したツイートIDを1行1件のJSON (JSON Lines) で記録する台帳。
+    一括削除 (--purge) の対象抽出に使用する。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, account_id: str, tweet_id: str, worksheet_name: Optional[str] = None,
+               row_id: Optional[str] = None, posted_at: Optional[datetime] = None):
+        entry = {
+            "account_id": account_id,
+            "tweet_id": str(tweet_id),
+            "posted_at": (posted_at or datetime.now(timezone.utc)).isoformat(),
+            "worksheet_name": worksheet_name,
+            "row_id": row_id,
+        }
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except IOError as e:
+            logger.error(f"投稿台帳 '{self.path}' への書き込みに失敗しました: {e}", exc_info=True)
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"投稿台帳 '{self.path}' の {line_number} 行目が不正なためスキップします。")
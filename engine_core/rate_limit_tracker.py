@@ -0,0 +1,93 @@
+import re
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Mapping
+from urllib.parse import urlparse
+from .utils.json_store import read_json_file, write_json_file_atomic
+
+logger = logging.getLogger(__name__)
+
+# エンドポイントの識別子 (メソッド, パスの正規表現)
+ENDPOINT_PATTERNS = (
+    ("create_tweet", "POST", re.compile(r"^/2/tweets/?$")),
+    ("delete_tweet", "DELETE", re.compile(r"^/2/tweets/[^/]+/?$")),
+    ("media_upload", None, re.compile(r"^/1\.1/media/upload\.json$")),
+)
+
+
+def endpoint_for_request(method: str, url: str) -> str:
+    """リクエストのメソッドとURLから、レート制限を記録するエンドポイント名を決める。"""
+    path = urlparse(url).path
+    for name, expected_method, pattern in ENDPOINT_PATTERNS:
+        if (expected_method is None or expected_method == method.upper()) and pattern.match(path):
+            return name
+    return f"{method.upper()} {path}"
+
+
+class RateLimitTracker:
+    """
+    成功・失敗を問わず、全てのレスポンスの x-rate-limit-* ヘッダーからアカウント・エンドポイント別の
+    残り回数を記録し、JSONファイルに永続化するクラス。
+    429を受け取る前に、残り回数が尽きているアカウントの処理を見送るために使う。
+    """
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self._lock = threading.Lock()
+
+    def _read_store(self) -> Optional[Dict[str, Dict[str, Dict[str, Any]]]]:
+        """記録を読み込む。ファイルが壊れている場合は None を返す (書き戻すと全アカウントの記録が消えるため、更新は見送る)。"""
+        return read_json_file(self.store_path, "レート制限記録ファイル")
+
+    def _write_store(self, store: Dict[str, Dict[str, Dict[str, Any]]]):
+        write_json_file_atomic(self.store_path, store, "レート制限記録ファイル")
+
+    def record(self, account_id: str, endpoint: str, headers: Mapping[str, str]):
+        """レスポンスヘッダーからレート制限情報を記録する。ヘッダーがない場合は何もしない。"""
+        limit = headers.get('x-rate-limit-limit')
+        remaining = headers.get('x-rate-limit-remaining')
+        reset = headers.get('x-rate-limit-reset')
+        if remaining is None or reset is None:
+            return
+        try:
+            entry = {
+                "limit": int(limit) if limit is not None else None,
+                "remaining": int(remaining),
+                "reset_at": int(reset),
+                "recorded_at": int(time.time()),
+            }
+        except ValueError:
+            logger.warning(f"レート制限ヘッダーの値が不正です: limit={limit}, remaining={remaining}, reset={reset}")
+            return
+
+        with self._lock:
+            store = self._read_store()
+            if store is None:
+                return
+            store.setdefault(account_id, {})[endpoint] = entry
+            self._write_store(store)
+        logger.debug(f"レート制限を記録しました: account={account_id}, endpoint={endpoint}, remaining={entry['remaining']}/{entry['limit']}")
+
+    def get_budget(self, account_id: str, endpoint: str) -> Optional[Dict[str, Any]]:
+        """記録済みのレート制限情報を返す。リセット時刻を過ぎている場合は None。"""
+        entry = (self._read_store() or {}).get(account_id, {}).get(endpoint)
+        if not entry or entry.get("reset_at", 0) <= time.time():
+            return None
+        return entry
+
+    def seconds_until_available(self, account_id: str, endpoint: str, reserve: int = 0) -> int:
+        """
+        残り回数が reserve 以下の場合、リセットまでの秒数を返す。呼び出し可能な場合は 0。
+        記録がない・リセット済みの場合も 0 を返す。
+        """
+        entry = self.get_budget(account_id, endpoint)
+        if not entry or entry["remaining"] > reserve:
+            return 0
+        return max(0, int(entry["reset_at"] - time.time()))
+
+    def reset_at(self, account_id: str, endpoint: str) -> Optional[datetime]:
+        entry = self.get_budget(account_id, endpoint)
+        if not entry:
+            return None
+        return datetime.fromtimestamp(entry["reset_at"], tz=timezone.utc)
@@ -0,0 +1,76 @@
+import json
+import os
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional
+
+from ..config import Config
+from ..notification_digest import NotificationDigest
+
+logger = logging.getLogger(__name__)
+
+# このモジュールは司令塔が「今回は何もしない」と判断するために、WorkflowManager より先に読み込まれる。
+# gspread・tweepy・requests などを読み込まないよう、ローカルの状態ファイルと設定だけを参照すること。
+
+
+def read_last_post_times(path: str) -> Dict[str, datetime]:
+    """最終投稿時刻を記録したJSONファイルを読み込む。"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+            if not content:
+                return {}
+            data = json.loads(content)
+
+        last_times: Dict[str, datetime] = {}
+        for acc_id, time_str in data.items():
+            try:
+                # ISO 8601形式の文字列をdatetimeオブジェクト（タイムゾーン情報付き）に変換
+                if isinstance(time_str, str):
+                    # オプション: 'Z'で終わる古い形式にも対応
+                    if time_str.endswith('Z'):
+                        time_str = time_str[:-1] + '+00:00'
+                    last_times[acc_id] = datetime.fromisoformat(time_str)
+                else:
+                    logger.warning(f"アカウント {acc_id} の最終投稿時刻 '{time_str}' の形式が不正です（文字列ではありません）。")
+            except (ValueError, TypeError) as e:
+                logger.warning(f"アカウント {acc_id} の最終投稿時刻 '{time_str}' のパースに失敗しました。スキップします。エラー: {e}")
+        return last_times
+    except (json.JSONDecodeError, IOError) as e:
+        logger.error(f"最終投稿時刻ファイル '{path}' の読み込みに失敗しました: {e}", exc_info=True)
+        return {} # エラー発生時は空の辞書を返す
+
+
+def has_pending_work(config: Config, now_utc: Optional[datetime] = None) -> bool:
+    """
+    司令塔が今回の実行で何かをする必要があるかを、ローカルの状態ファイルだけで判断する。
+    投稿間隔が経過したアカウント・メディアの事前準備の対象・期間が過ぎたまとめ通知・送信待ちのDiscord通知のいずれかがあれば True を返す。
+    回路の開閉や認証情報の隔離は考慮しない (除外される可能性があるアカウントも「対象あり」とし、判断は通常の経路に任せる)。
+    設定が不足している場合も True を返し、通常の経路でエラーを報告させる。
+    """
+    schedule_settings = config.get_schedule_config()
+    interval_hours = config.get_post_interval_hours()
+    if not schedule_settings or not schedule_settings.get("last_post_times_file") or not interval_hours:
+        return True
+
+    logs_dir = config.get("common.logs_directory", "logs")
+    now_utc = now_utc or datetime.now(timezone.utc)
+    last_post_times = read_last_post_times(os.path.join(logs_dir, schedule_settings["last_post_times_file"]))
+    lead = timedelta(minutes=config.get_media_prepare_lead_minutes() or 0)
+    for account in config.get_active_twitter_accounts():
+        last_post_time = last_post_times.get(account["account_id"])
+        if not last_post_time or now_utc + lead >= last_post_time + timedelta(hours=interval_hours):
+            return True
+
+    if config.get_discord_webhook_urls():
+        digest_settings = config.get_notification_digest_settings()
+        if digest_settings and NotificationDigest(os.path.join(logs_dir, digest_settings["state_file"]),
+                                                  digest_settings["window_seconds"]).is_due(now_utc.timestamp()):
+            return True
+        outbox_settings = config.get_discord_outbox_settings()
+        outbox_dir = os.path.join(logs_dir, outbox_settings["directory"]) if outbox_settings else None
+        if outbox_dir and os.path.isdir(outbox_dir) and os.listdir(outbox_dir):
+            return True
+    return False
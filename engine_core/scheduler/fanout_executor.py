@@ -0,0 +1,165 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple
+
+from ..utils.logging_utils import get_logger
+from ..spreadsheet_manager import candidate_has_media
+from ..twitter_client import TwitterClient, RateLimitError
+from ..circuit_breaker import ACCOUNT_ERROR_CLASSES, ERROR_MEDIA
+from ..utils.media_sniffer import MediaType
+from .scheduled_post_executor import ScheduledPostExecutor
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_CONCURRENT_ACCOUNTS = 4
+
+
+class FanoutPostExecutor:
+    """
+    1行の投稿をアカウントグループの全アカウントに投稿するクラス。
+    メディアのダウンロードと加工 (動画のメタデータ変更・画像の正規化) は1回だけ行い、
+    加工済みのファイルを各アカウントに並列でアップロードして投稿する。
+    アカウントごとの結果は、投稿後に1回のシート更新で投稿結果列に書き込む。
+    """
+    def __init__(self, post_executor: ScheduledPostExecutor, max_concurrent_accounts: int = DEFAULT_MAX_CONCURRENT_ACCOUNTS):
+        self.post_executor = post_executor
+        self.config = post_executor.config
+        self.spreadsheet_manager = post_executor.spreadsheet_manager
+        self.max_concurrent_accounts = max_concurrent_accounts
+
+    def _skip_reason(self, account_id: str, text: str, has_media: bool = False) -> Optional[str]:
+        """このアカウントへの投稿を見送る理由を返す。投稿してよい場合は None。"""
+        if not self.config.get_active_twitter_account_details(account_id):
+            return "無効なアカウント"
+        circuit_breaker = self.post_executor.circuit_breaker
+        if circuit_breaker and not circuit_breaker.allows(account_id):
+            return f"回路 '{circuit_breaker.get_state(account_id, ACCOUNT_ERROR_CLASSES)[1]}' が開いています"
+        if has_media and circuit_breaker and not circuit_breaker.allows_media(account_id):
+            return f"回路 '{ERROR_MEDIA}' が開いているため、メディア付きの行は投稿しません"
+        try:
+            self.post_executor.ensure_can_post(account_id)
+        except (RateLimitError, ValueError) as e:
+            return str(e)
+        duplicate_index = self.spreadsheet_manager.duplicate_index
+        if duplicate_index and duplicate_index.is_recent_duplicate(account_id, text):
+            return "直近に同じ本文を投稿済み"
+        return None
+
+    def execute_fanout(self, worksheet_name: str) -> Dict[str, Dict[str, Any]]:
+        """
+        ワークシートからグループ投稿用の行を1件選び、グループ内の全アカウントに投稿する。
+        {アカウントID: {"tweet_id": ..., "error": ..., ("skipped": True)}} を返す。投稿対象がない場合は空の辞書。
+        """
+        candidate = self.spreadsheet_manager.get_post_candidate(worksheet_name, fanout=True)
+        if not candidate:
+            logger.warning(f"ワークシート '{worksheet_name}' にグループ投稿可能な行がありませんでした。")
+            return {}
+
+        group_name = candidate["target_group"]
+        account_ids = self.config.get_account_groups().get(group_name)
+        if not account_ids:
+            logger.error(f"行 {candidate['row_index']} の投稿先グループ '{group_name}' が設定 (auto_post_bot.account_groups) に見つかりません。")
+            return {}
+
+        results: Dict[str, Dict[str, Any]] = {}
+        targets: List[Tuple[str, TwitterClient]] = []
+        for account_id in account_ids:
+            reason = self._skip_reason(account_id, candidate["text"], has_media=candidate_has_media(candidate))
+            if reason:
+                logger.warning(f"グループ '{group_name}' のアカウント '{account_id}' への投稿を見送ります: {reason}")
+                results[account_id] = {"tweet_id": None, "error": reason, "skipped": True}
+                continue
+            # クライアントはスレッドを起動する前にまとめて作る (get_twitter_client の辞書を並列に更新しないため)
+            targets.append((account_id, self.post_executor.get_twitter_client(account_id)))
+
+        if not targets:
+            logger.warning(f"グループ '{group_name}' に投稿可能なアカウントがありません。")
+            return results
+
+        logger.info(f"ワークシート '{worksheet_name}' 行 {candidate['row_index']} をグループ '{group_name}' の {len(targets)} アカウントに投稿します。")
+        parts = [{"text": candidate["text"], "media_path": candidate.get("media_path")}] + candidate.get("thread", [])
+
+        # メディアは最初のアカウントのクライアントで1回だけダウンロード・加工する (加工はアカウントに依存しない)
+        prepared: Dict[int, Tuple[str, MediaType]] = {}
+        temp_paths: List[str] = []
+        try:
+            for i, part in enumerate(parts):
+                if not part.get("media_path"):
+                    continue
+                result = targets[0][1].download_and_prepare(part["media_path"])
+                if result:
+                    upload_path, media_type, part_temp_paths = result
+                    prepared[i] = (upload_path, media_type)
+                    temp_paths.extend(part_temp_paths)
+                else:
+                    logger.warning(f"スレッドの {i + 1} 件目のメディアを準備できなかったため、メディアなしで投稿します。")
+
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrent_accounts, len(targets))) as pool:
+                futures = {account_id: pool.submit(self._post_for_account, account_id, client, worksheet_name, candidate, parts, prepared)
+                           for account_id, client in targets}
+                for account_id, future in futures.items():
+                    try:
+                        results[account_id] = {"tweet_id": future.result(), "error": None}
+                    except Exception as e:
+                        logger.error(f"グループ投稿でアカウント '{account_id}' の投稿に失敗しました: {e}", exc_info=True)
+                        results[account_id] = {"tweet_id": None, "error": str(e)}
+        finally:
+            TwitterClient.remove_temp_files(temp_paths)
+
+        results = {account_id: results[account_id] for account_id in account_ids if account_id in results}  # グループの定義順に並べる
+        succeeded = sum(1 for r in results.values() if r["tweet_id"])
+        if succeeded:
+            self.spreadsheet_manager.update_post_status(
+                worksheet_name=worksheet_name,
+                row_index=candidate["row_index"],
+                posted_at=datetime.now(timezone.utc),
+                increment=succeeded,
+                result_text=format_fanout_results(results)
+            )
+        logger.info(f"グループ '{group_name}' への投稿が完了しました ({succeeded}/{len(account_ids)} アカウントで成功)。")
+        return results
+
+    def _post_for_account(self, account_id: str, client: TwitterClient, worksheet_name: str, candidate: Dict[str, Any],
+                          parts: List[Dict[str, Any]], prepared: Dict[int, Tuple[str, MediaType]]) -> str:
+        """準備済みのメディアをこのアカウントにアップロードし、投稿 (続きの行があればスレッド) する。Tweet ID を返す。"""
+        client.error_classes.clear()
+        account_parts = []
+        for i, part in enumerate(parts):
+            media_ids = None
+            if i in prepared:
+                media_id = client.upload_prepared_file(*prepared[i])
+                if media_id:
+                    media_ids = [media_id]
+                else:
+                    client.error_classes.add(ERROR_MEDIA)
+                    logger.warning(f"アカウント '{account_id}' のメディアのアップロードに失敗したため、メディアなしで投稿します。")
+            # media_path は渡さない (post_thread 内で再度ダウンロードさせないため)
+            account_parts.append({"text": part["text"], "media_ids": media_ids})
+
+        posted = client.post_thread(account_parts)
+        if self.post_executor.circuit_breaker:
+            # メディアのない行ではメディアを試していないため、メディアの回路はそのままにする
+            skipped_classes = () if prepared else (ERROR_MEDIA,)
+            self.post_executor.circuit_breaker.record_result(account_id, client.error_classes, skipped_classes=skipped_classes)
+        if not posted:
+            raise Exception(f"アカウント '{account_id}' の投稿に失敗しました。")
+
+        if self.post_executor.post_ledger:
+            for tweet in posted:
+                self.post_executor.post_ledger.record(account_id, tweet['id'], worksheet_name=worksheet_name, row_id=candidate.get("id"))
+        if self.spreadsheet_manager.duplicate_index:
+            for part in parts[:len(posted)]:
+                self.spreadsheet_manager.duplicate_index.record(account_id, part["text"])
+        logger.info(f"アカウント '{account_id}' のグループ投稿が成功しました。Tweet ID: {posted[0]['id']}")
+        return posted[0]['id']
+
+
+def format_fanout_results(results: Dict[str, Dict[str, Any]]) -> str:
+    """投稿結果列に書き込む文字列 (例: 'acc1: 1234567890 / acc2: 失敗 / acc3: 見送り') を作る。"""
+    labels = []
+    for account_id, result in results.items():
+        if result["tweet_id"]:
+            labels.append(f"{account_id}: {result['tweet_id']}")
+        else:
+            labels.append(f"{account_id}: {'見送り' if result.get('skipped') else '失敗'}")
+    return " / ".join(labels)
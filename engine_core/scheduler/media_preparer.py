@@ -0,0 +1,110 @@
+import hashlib
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Optional, List
+
+from ..utils.logging_utils import get_logger
+from ..utils.json_store import read_json_file, write_json_file_atomic
+
+logger = get_logger(__name__)
+
+# Twitterのアップロード済みメディアIDは約24時間で失効するため、余裕を持たせた既定の有効期間
+DEFAULT_PREPARED_MEDIA_TTL_HOURS = 12
+
+
+def compute_row_fingerprint(post_content: Dict[str, Any]) -> str:
+    """投稿候補の行内容 (ID・本文・メディアURL) からフィンガープリントを計算する。行が変更されると値が変わる。"""
+    parts = [
+        str(post_content.get("id") or ""),
+        str(post_content.get("text") or ""),
+        str(post_content.get("media_path") or ""),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class MediaPreparer:
+    """
+    投稿予定時刻の前にメディアのダウンロード・加工・アップロードを済ませておくクラス。
+    準備結果 (media_id) はアカウントごとに行のフィンガープリントと共にJSONファイルへ保存し、
+    投稿時に行内容が一致した場合のみ再利用する。
+    """
+    def __init__(self, store_path: str, ttl_hours: int = DEFAULT_PREPARED_MEDIA_TTL_HOURS):
+        self.store_path = store_path
+        self.ttl = timedelta(hours=ttl_hours)
+
+    def _read_store(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        return read_json_file(self.store_path, "事前準備メディアファイル")
+
+    def _write_store(self, store: Dict[str, Dict[str, Any]]):
+        write_json_file_atomic(self.store_path, store, "事前準備メディアファイル")
+
+    def _is_valid(self, entry: Dict[str, Any], now_utc: datetime) -> bool:
+        try:
+            expires_at = datetime.fromisoformat(entry["expires_at"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        return now_utc < expires_at
+
+    def prepare(self, account_id: str, worksheet_name: str, spreadsheet_manager, twitter_client) -> bool:
+        """
+        指定アカウントの次回投稿候補を選び、メディアを事前にアップロードしておく。
+        既に同じ行の有効な準備結果がある場合は何もしない。準備を行った (または既に済んでいる) 場合は True。
+        """
+        post_content = spreadsheet_manager.get_post_candidate(worksheet_name, account_id=account_id)
+        if not post_content:
+            logger.info(f"アカウント '{account_id}' の事前準備: 投稿候補がないためスキップします。")
+            return False
+
+        media_url = post_content.get("media_path")
+        if not media_url:
+            logger.info(f"アカウント '{account_id}' の事前準備: 投稿候補にメディアがないため準備は不要です。")
+            return False
+
+        now_utc = datetime.now(timezone.utc)
+        fingerprint = compute_row_fingerprint(post_content)
+        store = self._read_store()
+        if store is None:
+            return False
+        existing = store.get(account_id)
+        if existing and existing.get("row_fingerprint") == fingerprint and self._is_valid(existing, now_utc):
+            logger.info(f"アカウント '{account_id}' の事前準備: 行 {post_content['row_index']} のメディアは準備済みです (Media ID: {existing['media_ids']})。")
+            return True
+
+        media_id = twitter_client.upload_media(media_url)
+        if not media_id:
+            logger.warning(f"アカウント '{account_id}' の事前準備: メディアのアップロードに失敗しました。投稿時に再試行されます。")
+            return False
+
+        store[account_id] = {
+            "worksheet_name": worksheet_name,
+            "row_index": post_content["row_index"],
+            "row_fingerprint": fingerprint,
+            "media_ids": [media_id],
+            "prepared_at": now_utc.isoformat(),
+            "expires_at": (now_utc + self.ttl).isoformat(),
+        }
+        self._write_store(store)
+        logger.info(f"アカウント '{account_id}' の事前準備が完了しました: 行 {post_content['row_index']}, Media ID: {media_id}")
+        return True
+
+    def take(self, account_id: str, post_content: Dict[str, Any]) -> Optional[List[str]]:
+        """
+        投稿時に呼び出し、準備済みのメディアIDを取り出す。
+        行内容が変わっている・有効期限切れの場合は準備結果を破棄して None を返す。
+        """
+        store = self._read_store()
+        if store is None:
+            return None
+        entry = store.pop(account_id, None)
+        if entry is None:
+            return None
+        # 取り出した準備結果は一度きりの利用とし、一致しない場合も含めて破棄する
+        self._write_store(store)
+
+        if entry.get("row_fingerprint") != compute_row_fingerprint(post_content):
+            logger.info(f"アカウント '{account_id}' の準備済みメディアは行内容の変更により無効化されました。")
+            return None
+        if not self._is_valid(entry, datetime.now(timezone.utc)):
+            logger.info(f"アカウント '{account_id}' の準備済みメディアは有効期限切れのため破棄しました。")
+            return None
+        logger.info(f"アカウント '{account_id}' の準備済みメディアを使用します: {entry['media_ids']}")
+        return entry["media_ids"]
@@ -2,10 +2,18 @@ import time
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 
-from ..config import Config
+from ..config import Config, ConfigChanges
 from ..utils.logging_utils import get_logger
-from ..spreadsheet_manager import SpreadsheetManager
-from ..twitter_client import TwitterClient
+from ..spreadsheet_manager import SpreadsheetManager, candidate_has_media
+from ..twitter_client import TwitterClient, RateLimitError
+from ..rate_limit_tracker import RateLimitTracker
+from ..post_ledger import PostLedger
+from ..credential_checker import CredentialChecker
+from ..circuit_breaker import CircuitBreaker, ERROR_MEDIA
+from ..utils.image_processor import ImageNormalizer
+from ..utils.google_drive import GoogleDriveResolver
+from ..utils.http_session import get_shared_session
+from .media_preparer import MediaPreparer
 
 logger = get_logger(__name__)
 
@@ -14,10 +22,108 @@ class ScheduledPostExecutor:
     1件の投稿処理（スプレッドシートからの記事取得、投稿、ステータス更新）を
     担当するクラス。
     """
-    def __init__(self, config: Config, spreadsheet_manager: SpreadsheetManager):
+    def __init__(self, config: Config, spreadsheet_manager: SpreadsheetManager,
+                 media_preparer: Optional[MediaPreparer] = None,
+                 rate_limit_tracker: Optional[RateLimitTracker] = None,
+                 rate_limit_reserve: int = 0,
+                 post_ledger: Optional[PostLedger] = None,
+                 credential_checker: Optional[CredentialChecker] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
         self.config = config
         self.spreadsheet_manager = spreadsheet_manager
+        self.media_preparer = media_preparer
+        self.rate_limit_tracker = rate_limit_tracker
+        self.rate_limit_reserve = rate_limit_reserve
+        self.post_ledger = post_ledger
+        self.credential_checker = credential_checker
+        self.circuit_breaker = circuit_breaker
         self.twitter_clients: Dict[str, TwitterClient] = {}
+        # 直近の execute_post の工程ごとの所要時間 (秒)。まとめ通知で集計する
+        self.last_phase_seconds: Dict[str, float] = {}
+
+        image_settings = self.config.get_image_processing_settings()
+        self.image_normalizer: Optional[ImageNormalizer] = None
+        if image_settings:
+            self.image_normalizer = ImageNormalizer(
+                cache_dir=image_settings["cache_directory"],
+                max_edge=image_settings["max_edge"],
+                target_bytes=image_settings["target_bytes"]
+            )
+
+        # Google Driveリンクの解決結果は全アカウントで共有し、実行をまたいでファイルにキャッシュする
+        drive_settings = self.config.get_google_drive_settings()
+        self.drive_resolver = GoogleDriveResolver(
+            session=get_shared_session(),
+            cache_path=drive_settings["cache_file"],
+            cache_ttl_seconds=drive_settings["cache_ttl_seconds"]
+        )
+
+    def get_twitter_client(self, account_id: str) -> TwitterClient:
+        """アカウントのTwitterクライアントを取得する（アカウントごとに初回のみ初期化）。"""
+        if account_id not in self.twitter_clients:
+            account_details = self.config.get_active_twitter_account_details(account_id)
+            if not account_details:
+                raise ValueError(f"アカウント '{account_id}' の設定情報（APIキーなど）が見つからないか、無効です。")
+
+            self.twitter_clients[account_id] = TwitterClient(
+                consumer_key=account_details["consumer_key"],
+                consumer_secret=account_details["consumer_secret"],
+                access_token=account_details["access_token"],
+                access_token_secret=account_details["access_token_secret"],
+                bearer_token=account_details.get("bearer_token"), # 任意
+                image_normalizer=self.image_normalizer,
+                drive_resolver=self.drive_resolver,
+                account_id=account_id,
+                rate_limit_tracker=self.rate_limit_tracker
+            )
+        return self.twitter_clients[account_id]
+
+    def apply_config_changes(self, changes: ConfigChanges):
+        """
+        設定の再読み込みで削除・変更されたアカウントのクライアントを破棄し、次回の投稿で新しい設定から作り直す。
+        実行中の投稿は取得済みのクライアントをそのまま使うため、途中で中断されることはない。
+        """
+        for account_id in changes.removed + changes.changed:
+            if self.twitter_clients.pop(account_id, None):
+                logger.info(f"アカウント '{account_id}' の設定が変わったため、Twitterクライアントを作り直します。")
+
+    def _check_credentials(self, account_id: str):
+        """事前確認で認証情報が無効と判定され、隔離中のアカウントであれば例外を送出する。"""
+        if not self.credential_checker:
+            return
+        account_details = self.config.get_active_twitter_account_details(account_id)
+        if account_details and self.credential_checker.is_quarantined(account_details):
+            raise ValueError(f"アカウント '{account_id}' は認証情報が無効と判定され隔離中のため、投稿を見送ります。APIキー/トークンを確認してください。")
+
+    def _check_rate_limit_budget(self, account_id: str):
+        """投稿に必要なエンドポイントの残り回数が尽きていれば RateLimitError を送出する。"""
+        if not self.rate_limit_tracker:
+            return
+        wait_seconds = self.rate_limit_tracker.seconds_until_available(account_id, "create_tweet", self.rate_limit_reserve)
+        if wait_seconds > 0:
+            raise RateLimitError(
+                message=f"アカウント '{account_id}' の create_tweet の残り回数が尽きているため、投稿を見送ります。",
+                reset_at_utc=self.rate_limit_tracker.reset_at(account_id, "create_tweet"),
+                remaining_seconds=wait_seconds
+            )
+
+    def ensure_can_post(self, account_id: str):
+        """
+        投稿の前提 (記録済みのレート制限の残り回数・認証情報の隔離) を確認する。
+        残り回数が尽きていれば RateLimitError、隔離中であれば ValueError を送出する。
+        """
+        self._check_rate_limit_budget(account_id)
+        self._check_credentials(account_id)
+
+    def prepare_post(self, account_id: str, worksheet_name: str) -> bool:
+        """投稿予定時刻の前に、次回投稿候補のメディアを事前にアップロードしておく。"""
+        if not self.media_preparer:
+            return False
+        if self.circuit_breaker and not self.circuit_breaker.allows_media(account_id):
+            logger.info(f"アカウント '{account_id}' の事前準備: メディアの回路が開いているためスキップします。")
+            return False
+        client = self.get_twitter_client(account_id)
+        return self.media_preparer.prepare(account_id, worksheet_name, self.spreadsheet_manager, client)
 
     def execute_post(self, scheduled_post: Dict[str, Any]) -> Optional[str]:
         """
@@ -29,41 +135,62 @@ class ScheduledPostExecutor:
         worksheet_name = scheduled_post["worksheet_name"]
         
         logger.info(f"投稿処理を開始します: アカウント='{account_id}', ワークシート='{worksheet_name}'")
+        self.last_phase_seconds = {}
 
         try:
-            # 1. 投稿内容をスプレッドシートから取得
-            post_content = self.spreadsheet_manager.get_post_candidate(worksheet_name)
-            logger.info(f"取得した投稿候補の内容: {post_content}")
+            # 0. 記録済みのレート制限の残りが尽きている場合は、シート読み込みやメディア処理の前に見送る
+            self.ensure_can_post(account_id)
+
+            # 1. Twitterクライアントを取得（tweepyのクライアントは最初のAPI呼び出し時に初期化されるため軽量）
+            #    APIキーの設定不備はシート読み込みの前に検出する
+            client = self.get_twitter_client(account_id)
+
+            # 2. 投稿内容をスプレッドシートから取得
+            phase_started = time.monotonic()
+            # メディアの回路が開いている間は、アカウント全体ではなくメディア付きの行だけを見送る
+            exclude_media = bool(self.circuit_breaker) and not self.circuit_breaker.allows_media(account_id)
+            post_content = self.spreadsheet_manager.get_post_candidate(worksheet_name, account_id=account_id,
+                                                                       exclude_media=exclude_media)
+            self.last_phase_seconds["sheet_read"] = time.monotonic() - phase_started
+            logger.debug(f"取得した投稿候補の内容: {post_content}")
 
             if not post_content:
                 logger.warning(f"アカウント '{account_id}' のワークシート '{worksheet_name}' に投稿可能な記事がありませんでした。処理をスキップします。")
                 return None
 
-            # 2. Twitterクライアントを初期化（アカウントごとに初回のみ）
-            if account_id not in self.twitter_clients:
-                account_details = self.config.get_active_twitter_account_details(account_id)
-                if not account_details:
-                    raise ValueError(f"アカウント '{account_id}' の設定情報（APIキーなど）が見つからないか、無効です。")
-
-                self.twitter_clients[account_id] = TwitterClient(
-                    consumer_key=account_details["consumer_key"],
-                    consumer_secret=account_details["consumer_secret"],
-                    access_token=account_details["access_token"],
-                    access_token_secret=account_details["access_token_secret"],
-                    bearer_token=account_details.get("bearer_token") # 任意
-                )
-            client = self.twitter_clients[account_id]
-
             # 3. 投稿を実行
             logger.info(f"アカウント'{account_id}' でツイートを投稿します...")
             logger.debug(f"投稿内容: Text='{post_content['text']}', Media='{post_content.get('media_path')}'")
+
+            # 事前準備でアップロード済みのメディアがあれば、投稿 (create_tweet) のみを行う
+            phase_started = time.monotonic()
+            prepared_media_ids = None
+            posted_thread = None
+            client.error_classes.clear()
+            if self.media_preparer and post_content.get("media_path"):
+                prepared_media_ids = self.media_preparer.take(account_id, post_content)
+
+            if post_content.get("thread"):
+                # 続きの行がある場合は、全パートのメディアを先にアップロードしてからスレッドとして投稿する
+                head_part = {"text": post_content["text"], "media_path": post_content.get("media_path"), "media_ids": prepared_media_ids}
+                posted_thread = client.post_thread([head_part] + post_content["thread"])
+                tweet_response = posted_thread[0] if posted_thread else None
+            elif prepared_media_ids:
+                tweet_response = client.post_tweet(post_content["text"], media_ids=prepared_media_ids)
+            else:
+                # post_tweet は media_path を受け取らないため、post_with_media_url を使用する
+                tweet_response = client.post_with_media_url(
+                    text=post_content["text"],
+                    media_url=post_content.get("media_path")
+                )
+            self.last_phase_seconds["post"] = time.monotonic() - phase_started
             
-            # post_tweet は media_path を受け取らないため、post_with_media_url を使用する
-            tweet_response = client.post_with_media_url(
-                text=post_content["text"],
-                media_url=post_content.get("media_path")
-            )
-            
+            # 認証・重複・メディアの失敗をアカウントごとのサーキットブレーカーに記録する (失敗がなければ閉じる)
+            # メディアのない行ではメディアを試していないため、メディアの回路はそのままにする
+            if self.circuit_breaker:
+                skipped_classes = () if candidate_has_media(post_content) else (ERROR_MEDIA,)
+                self.circuit_breaker.record_result(account_id, client.error_classes, skipped_classes=skipped_classes)
+
             if not tweet_response or 'id' not in tweet_response:
                 # 投稿失敗のケース。post_with_media_url 内でエラーログは出力されているはず。
                 raise Exception(f"アカウント '{account_id}' の投稿に失敗しました。レスポンス: {tweet_response}")
@@ -71,12 +198,25 @@ class ScheduledPostExecutor:
             tweet_id = tweet_response['id']
             logger.info(f"アカウント '{account_id}' の投稿が成功しました。Tweet ID: {tweet_id}")
 
+            # 一括削除 (--purge) の対象として投稿台帳に記録する (スレッドの場合は返信も含む)
+            if self.post_ledger:
+                for posted in (posted_thread or [tweet_response]):
+                    self.post_ledger.record(account_id, posted['id'], worksheet_name=worksheet_name, row_id=post_content.get("id"))
+
+            # 次回以降の候補選択で重複する行を除外できるように、投稿した本文を記録する
+            if self.spreadsheet_manager.duplicate_index:
+                posted_texts = [post_content["text"]] + [part["text"] for part in post_content.get("thread") or []]
+                for text in posted_texts[:len(posted_thread or [tweet_response])]:
+                    self.spreadsheet_manager.duplicate_index.record(account_id, text)
+
             # 4. 投稿済みとしてスプレッドシートを更新
+            phase_started = time.monotonic()
             self.spreadsheet_manager.update_post_status(
                 worksheet_name=worksheet_name,
                 row_index=post_content["row_index"],
                 posted_at=datetime.now(timezone.utc)
             )
+            self.last_phase_seconds["sheet_update"] = time.monotonic() - phase_started
             
             return tweet_id
 
@@ -6,15 +6,32 @@ import os
 import json
 
 from .config import Config
+from . import metrics
+from .utils.http_session import configure_session
+from .duplicate_index import DuplicateContentIndex, text_hash
+from .utils.tweet_length import weighted_length, MAX_WEIGHTED_LENGTH
 
 logger = logging.getLogger(__name__)
 
 TRUTHY_VALUES = ["true", "1", "yes", "ok", "✓", "〇", "○", "公開", "投稿可"]
 
+
+def format_last_posted_at(posted_at: datetime) -> str:
+    """最終投稿日時列に書き込む形式 (JST) に変換する。"""
+    return posted_at.astimezone(timezone(timedelta(hours=9))).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def candidate_has_media(candidate: Dict[str, Any]) -> bool:
+    """投稿候補 (スレッドの続きの行を含む) にメディアがあるか。"""
+    return bool(candidate.get("media_path")) or any(part.get("media_path") for part in candidate.get("thread") or [])
+
+
 class SpreadsheetManager:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, duplicate_index: Optional[DuplicateContentIndex] = None):
         self.config = config
+        self.duplicate_index = duplicate_index # 指定された場合、直近に投稿した本文と重複する行を候補から除外する
         self.gspread_client = None
+        self.write_back_char_count = bool(self.config.should_write_back_char_count())
         self.columns = self.config.get_spreadsheet_columns()
         if not self.columns:
             raise ValueError("SpreadsheetManager: スプレッドシートの列定義を取得できませんでした。")
@@ -34,6 +51,11 @@ class SpreadsheetManager:
         
         try:
             gc = gspread.service_account_from_dict(gspread_creds_dict)
+            # gspreadが内部で使用するセッションにも接続プール・再試行・タイムアウトを適用する
+            http_client = getattr(gc, "http_client", None)
+            gspread_session = getattr(http_client, "session", None) or getattr(gc, "session", None)
+            if gspread_session is not None:
+                configure_session(gspread_session)
             self.gspread_client = gc
             logger.info("gspread: Google Spreadsheetへの接続認証に成功しました。")
         except Exception as e:
@@ -64,14 +86,19 @@ class SpreadsheetManager:
                 return i + 1
         return None
 
-    def get_post_candidate(self, worksheet_name: str) -> Optional[Dict[str, Any]]:
+    def get_post_candidate(self, worksheet_name: str, account_id: Optional[str] = None, fanout: bool = False,
+                           exclude_media: bool = False) -> Optional[Dict[str, Any]]:
         """
         指定されたワークシートから投稿可能な記事を1件取得する。
+        account_id と重複判定用の索引がある場合、そのアカウントが直近に投稿した本文と同じ行は除外する。
+        fanout=True の場合は、投稿先グループ列が入っている行 (グループ投稿用) からのみ選ぶ。
+        exclude_media=True の場合は、メディア付きの行 (スレッドの続きの行にメディアがある場合を含む) を除外する。
         """
         try:
             worksheet = self.gspread_client.open_by_key(self.spreadsheet_id).worksheet(worksheet_name)
             logger.info(f"ワークシート '{worksheet_name}' を開きました。")
             all_records = worksheet.get_all_records()
+            metrics.inc("sheets_api_calls_total", operation="read")
             logger.debug(f"ワークシート '{worksheet_name}' から {len(all_records)} 件のレコードを取得しました。")
         except gspread.exceptions.WorksheetNotFound:
             logger.error(f"ワークシート '{worksheet_name}' が見つかりません。")
@@ -80,15 +107,67 @@ class SpreadsheetManager:
             logger.error(f"ワークシート '{worksheet_name}' の読み込み中にエラー: {e}", exc_info=True)
             return None
 
+        # 全行の本文の重み付き文字数を読み込み時に一度だけ計算する (超過した行は候補から除外する)
+        lengths = self.compute_weighted_lengths(all_records)
+        if self.write_back_char_count:
+            self._write_back_char_counts(worksheet, worksheet_name, all_records, lengths)
+
+        return self.select_candidate(all_records, worksheet_name, account_id=account_id, lengths=lengths, fanout=fanout,
+                                     exclude_media=exclude_media)
+
+    def compute_weighted_lengths(self, all_records: List[Dict[str, Any]]) -> List[int]:
+        return [weighted_length(str(self._find_value_robustly(record, self.columns['text']) or '')) for record in all_records]
+
+    def select_candidate(self, all_records: List[Dict[str, Any]], worksheet_name: str, account_id: Optional[str] = None,
+                         lengths: Optional[List[int]] = None, fanout: bool = False,
+                         exclude_media: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        読み込み済みのレコード (get_all_records の形式) から投稿候補を1件選ぶ。
+        非同期エンジンなど、gspread 以外の方法でシートを読み込んだ場合もこの選択ロジックを使う。
+        投稿先グループ列が入っている行はグループ投稿 (fanout=True) の場合のみ、入っていない行はそれ以外の場合のみ対象とする。
+        """
+        if lengths is None:
+            lengths = self.compute_weighted_lengths(all_records)
+
+        # スレッドの続きの行 (スレッド親ID列に親のIDが入っている行) を親IDごとにシート順で集める
+        thread_parts: Dict[str, List[Dict[str, Any]]] = {}
+        thread_column = self.columns.get('thread_parent')
+        if thread_column:
+            for i, record in enumerate(all_records):
+                parent_id = str(self._find_value_robustly(record, thread_column) or '').strip()
+                if parent_id:
+                    thread_parts.setdefault(parent_id, []).append({
+                        "text": str(self._find_value_robustly(record, self.columns['text']) or ''),
+                        "media_path": str(self._find_value_robustly(record, self.columns['media_url']) or ''),
+                        "row_index": i + 2,
+                        "weighted_length": lengths[i]
+                    })
+
         candidates = []
         for i, record in enumerate(all_records):
             try:
+                # スレッドの続きの行は単独では投稿せず、親の行と一緒に投稿する
+                if thread_column and str(self._find_value_robustly(record, thread_column) or '').strip():
+                    continue
+
                 postable_val_raw = self._find_value_robustly(record, self.columns['postable'])
                 postable_val = str(postable_val_raw or '').strip().lower()
 
                 if postable_val not in TRUTHY_VALUES:
                     continue
 
+                target_group = str(self._find_value_robustly(record, self.columns['target_group']) or '').strip() if self.columns.get('target_group') else ''
+                if bool(target_group) != fanout:
+                    continue
+
+                row_id = str(self._find_value_robustly(record, self.columns['id']) or '')
+                thread = thread_parts.get(row_id.strip(), []) if row_id.strip() else []
+                overlong_rows = [i + 2] if lengths[i] > MAX_WEIGHTED_LENGTH else []
+                overlong_rows += [part["row_index"] for part in thread if part["weighted_length"] > MAX_WEIGHTED_LENGTH]
+                if overlong_rows:
+                    logger.warning(f"ワークシート '{worksheet_name}' 行 {i+2}: 本文が{MAX_WEIGHTED_LENGTH}文字 (重み付き) を超えているため候補から除外します (超過行: {overlong_rows})。")
+                    continue
+
                 last_posted_str = str(self._find_value_robustly(record, self.columns['last_posted_at']) or '').strip()
                 last_posted_dt = datetime.min.replace(tzinfo=timezone.utc)
                 if last_posted_str:
@@ -107,11 +186,14 @@ class SpreadsheetManager:
                                     logger.warning(f"行 {i+2}: 最終投稿日時の形式が不正です ('{last_posted_str}')。古いものとして扱います。")
 
                 candidates.append({
-                    "id": str(self._find_value_robustly(record, self.columns['id']) or ''),
+                    "id": row_id,
                     "text": str(self._find_value_robustly(record, self.columns['text']) or ''),
                     "media_path": str(self._find_value_robustly(record, self.columns['media_url']) or ''),
                     "last_posted_at": last_posted_dt,
-                    "row_index": i + 2
+                    "row_index": i + 2,
+                    "weighted_length": lengths[i],
+                    "thread": thread,
+                    "target_group": target_group
                 })
             except Exception as e:
                 logger.warning(f"ワークシート '{worksheet_name}' のレコード処理中にエラー (行 {i+2}): {record} - {e}", exc_info=True)
@@ -121,18 +203,93 @@ class SpreadsheetManager:
             logger.warning(f"ワークシート '{worksheet_name}' に投稿可能な候補が見つかりませんでした。")
             return None
 
+        if exclude_media:
+            text_only_candidates = [c for c in candidates if not candidate_has_media(c)]
+            skipped = len(candidates) - len(text_only_candidates)
+            if skipped:
+                logger.info(f"ワークシート '{worksheet_name}' の {skipped} 件のメディア付きの行は、アカウント '{account_id}' のメディアの回路が開いているため候補から除外しました。")
+            candidates = text_only_candidates
+            if not candidates:
+                logger.warning(f"ワークシート '{worksheet_name}' にはメディアのない投稿可能な行がありません。メディアの回路が閉じるまで投稿を見送ります。")
+                return None
+
+        if self.duplicate_index and account_id:
+            # 重複として拒否されるとメディアのアップロードが無駄になるため、ネットワーク処理の前に除外する
+            recent_hashes = self.duplicate_index.recent_hashes(account_id)
+            if recent_hashes:
+                unique_candidates = [c for c in candidates if text_hash(c["text"]) not in recent_hashes]
+                skipped = len(candidates) - len(unique_candidates)
+                if skipped:
+                    logger.info(f"ワークシート '{worksheet_name}' の {skipped} 件の行は、アカウント '{account_id}' が直近に投稿した本文と重複するため候補から除外しました。")
+                candidates = unique_candidates
+                if not candidates:
+                    logger.warning(f"ワークシート '{worksheet_name}' の投稿可能な行は全て直近の投稿と重複しています。本文を変更するか、時間をおいてください。")
+                    return None
+
         candidates.sort(key=lambda x: x["last_posted_at"])
         selected_candidate = candidates[0]
         logger.info(f"ワークシート '{worksheet_name}' から投稿候補を選択しました (ID: {selected_candidate['id']}, 行: {selected_candidate['row_index']})。")
         return selected_candidate
 
-    def update_post_status(self, worksheet_name: str, row_index: int, posted_at: datetime) -> bool:
+    def _write_back_char_counts(self, worksheet, worksheet_name: str, all_records: List[Dict[str, Any]], lengths: List[int]):
+        """計算した重み付き文字数を文字数列にまとめて書き戻す。値が変わっていない行は書き込まない。"""
+        if not all_records:
+            return
+        char_count_col_idx = self._find_column_index_robustly(list(all_records[0].keys()), self.columns['char_count'])
+        if not char_count_col_idx:
+            logger.warning(f"ワークシート '{worksheet_name}' のヘッダーに列名 '{self.columns['char_count']}' が見つからないため、文字数は書き戻しません。")
+            return
+
+        updates = [
+            gspread.Cell(i + 2, char_count_col_idx, str(length))
+            for i, (record, length) in enumerate(zip(all_records, lengths))
+            if str(self._find_value_robustly(record, self.columns['char_count'])).strip() != str(length)
+        ]
+        if not updates:
+            return
+        try:
+            worksheet.update_cells(updates, value_input_option='USER_ENTERED')
+            metrics.inc("sheets_api_calls_total", operation="write")
+            logger.info(f"ワークシート '{worksheet_name}' の {len(updates)} 行の文字数を更新しました。")
+        except Exception as e:
+            # 文字数の書き戻しは補助的な処理のため、失敗しても候補の選択は続ける
+            logger.warning(f"ワークシート '{worksheet_name}' の文字数の書き戻しに失敗しました: {e}", exc_info=True)
+
+    def build_post_status_cells(self, all_records: List[Dict[str, Any]], row_index: int, posted_at: datetime) -> Optional[List[gspread.Cell]]:
         """
-        指定されたワークシートの行について、投稿済み回数を1増やし、最終投稿日時を更新する。
+        読み込み済みのレコードをもとに、投稿済み回数と最終投稿日時を更新するセルを作る (書き込みは行わない)。
+        非同期エンジンなど、更新をまとめて送信する場合に使う。列が見つからない場合は None。
+        """
+        if not all_records or not 2 <= row_index < len(all_records) + 2:
+            return None
+        headers = list(all_records[0].keys())
+        posted_count_col_idx = self._find_column_index_robustly(headers, self.columns['posted_count'])
+        last_posted_col_idx = self._find_column_index_robustly(headers, self.columns['last_posted_at'])
+        if not posted_count_col_idx or not last_posted_col_idx:
+            logger.error(f"ヘッダーに列名 '{self.columns['posted_count']}' または '{self.columns['last_posted_at']}' が見つかりません。")
+            return None
+
+        current_posted_count_str = str(self._find_value_robustly(all_records[row_index - 2], self.columns['posted_count']) or '').strip()
+        try:
+            current_posted_count = int(current_posted_count_str) if current_posted_count_str else 0
+        except ValueError:
+            logger.warning(f"行 {row_index} の投稿済み回数 '{current_posted_count_str}' が数値ではありません。0として扱います。")
+            current_posted_count = 0
+        return [
+            gspread.Cell(row_index, posted_count_col_idx, str(current_posted_count + 1)),
+            gspread.Cell(row_index, last_posted_col_idx, format_last_posted_at(posted_at)),
+        ]
+
+    def update_post_status(self, worksheet_name: str, row_index: int, posted_at: datetime,
+                           increment: int = 1, result_text: Optional[str] = None) -> bool:
+        """
+        指定されたワークシートの行について、投稿済み回数を increment だけ増やし、最終投稿日時を更新する。
+        result_text を指定した場合は投稿結果列にも書き込む (グループ投稿のアカウントごとの結果)。更新は1回の書き込みで行う。
         """
         try:
             worksheet = self.gspread_client.open_by_key(self.spreadsheet_id).worksheet(worksheet_name)
             headers = worksheet.row_values(1)
+            metrics.inc("sheets_api_calls_total", operation="read")
             
             posted_count_col_idx = self._find_column_index_robustly(headers, self.columns['posted_count'])
             if not posted_count_col_idx:
@@ -151,18 +308,24 @@ class SpreadsheetManager:
                     current_posted_count = int(str(current_posted_count_str).strip())
                 except ValueError:
                     logger.warning(f"ワークシート '{worksheet_name}' 行 {row_index} の投稿済み回数 '{current_posted_count_str}' が数値ではありません。0として扱います。")
-            new_posted_count = current_posted_count + 1
+            new_posted_count = current_posted_count + increment
 
-            jst = timezone(timedelta(hours=9))
-            posted_at_jst = posted_at.astimezone(jst)
+            posted_at_jst_str = format_last_posted_at(posted_at)
             
             updates = [
                 gspread.Cell(row_index, posted_count_col_idx, str(new_posted_count)),
-                gspread.Cell(row_index, last_posted_col_idx, posted_at_jst.strftime("%Y-%m-%d %H:%M:%S"))
+                gspread.Cell(row_index, last_posted_col_idx, posted_at_jst_str)
             ]
+            if result_text is not None:
+                result_col_idx = self._find_column_index_robustly(headers, self.columns['fanout_result'])
+                if result_col_idx:
+                    updates.append(gspread.Cell(row_index, result_col_idx, result_text))
+                else:
+                    logger.warning(f"ワークシート '{worksheet_name}' のヘッダーに列名 '{self.columns['fanout_result']}' が見つからないため、投稿結果は書き込みません。")
             worksheet.update_cells(updates, value_input_option='USER_ENTERED')
+            metrics.inc("sheets_api_calls_total", operation="write")
             
-            logger.info(f"ワークシート '{worksheet_name}' 行 {row_index} のステータスを更新しました (投稿回数: {new_posted_count}, 最終投稿(JST): {posted_at_jst.strftime('%Y-%m-%d %H:%M:%S')})。")
+            logger.info(f"ワークシート '{worksheet_name}' 行 {row_index} のステータスを更新しました (投稿回数: {new_posted_count}, 最終投稿(JST): {posted_at_jst_str})。")
             return True
         except gspread.exceptions.WorksheetNotFound:
             logger.error(f"ワークシート '{worksheet_name}' が見つかりません。更新できませんでした。")
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Callable, Iterable
+
+from .utils.logging_utils import get_logger
+from .post_ledger import PostLedger
+from .rate_limit_tracker import RateLimitTracker
+from .twitter_client import TwitterClient, RateLimitError
+
+logger = get_logger(__name__)
+
+# DELETE /2/tweets/:id はユーザーあたり15分間に50回まで
+DEFAULT_DELETE_INTERVAL_SECONDS = 18
+DEFAULT_MAX_CONCURRENT_ACCOUNTS = 4
+# レート制限に達した場合に待機する最大秒数 (これを超える場合はそのアカウントの処理を打ち切る)
+MAX_RATE_LIMIT_WAIT_SECONDS = 15 * 60
+
+
+def load_targets_from_file(path: str) -> List[Dict[str, str]]:
+    """
+    削除対象をファイルから読み込む。
+    各行は JSON ({"account_id": ..., "tweet_id": ...}) または "account_id,tweet_id" 形式。'#' で始まる行は無視する。
+    """
+    targets = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                try:
+                    entry = json.loads(line)
+                    targets.append({"account_id": str(entry["account_id"]), "tweet_id": str(entry["tweet_id"])})
+                except (json.JSONDecodeError, KeyError) as e:
+                    logger.warning(f"削除対象ファイル '{path}' の {line_number} 行目が不正なためスキップします: {e}")
+                continue
+            parts = [p.strip() for p in line.split(',')]
+            if len(parts) != 2 or not all(parts):
+                logger.warning(f"削除対象ファイル '{path}' の {line_number} 行目が 'account_id,tweet_id' 形式ではないためスキップします。")
+                continue
+            targets.append({"account_id": parts[0], "tweet_id": parts[1]})
+    return targets
+
+
+def load_targets_from_ledger(ledger: PostLedger, older_than_days: Optional[int] = None) -> List[Dict[str, str]]:
+    """投稿台帳から削除対象を抽出する。older_than_days を指定した場合はそれより古い投稿のみ。"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days) if older_than_days is not None else None
+    targets = []
+    for entry in ledger.iter_entries():
+        if cutoff is not None:
+            try:
+                if datetime.fromisoformat(entry["posted_at"]) > cutoff:
+                    continue
+            except (KeyError, TypeError, ValueError):
+                continue
+        if entry.get("account_id") and entry.get("tweet_id"):
+            targets.append({"account_id": entry["account_id"], "tweet_id": str(entry["tweet_id"])})
+    return targets
+
+
+class TweetPurger:
+    """
+    複数アカウントのツイートを一括削除するクラス。
+    アカウント間は並列に、アカウント内は削除のレート制限に合わせた間隔で順番に削除する。
+    完了したツイートIDは進捗ファイルに記録し、中断後の再実行では続きから処理する。
+    """
+    def __init__(self, client_factory: Callable[[str], TwitterClient], progress_path: str,
+                 rate_limit_tracker: Optional[RateLimitTracker] = None,
+                 delete_interval_seconds: float = DEFAULT_DELETE_INTERVAL_SECONDS,
+                 max_concurrent_accounts: int = DEFAULT_MAX_CONCURRENT_ACCOUNTS,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.client_factory = client_factory
+        self.progress_path = progress_path
+        self.rate_limit_tracker = rate_limit_tracker
+        self.delete_interval_seconds = delete_interval_seconds
+        self.max_concurrent_accounts = max_concurrent_accounts
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._completed = self._read_progress()
+
+    def _read_progress(self) -> set:
+        if not os.path.exists(self.progress_path):
+            return set()
+        try:
+            with open(self.progress_path, 'r', encoding='utf-8') as f:
+                return set(json.load(f).get("completed_tweet_ids", []))
+        except (json.JSONDecodeError, IOError, AttributeError) as e:
+            logger.error(f"削除進捗ファイル '{self.progress_path}' の読み込みに失敗しました: {e}", exc_info=True)
+            return set()
+
+    def _mark_completed(self, tweet_id: str):
+        with self._lock:
+            self._completed.add(tweet_id)
+            try:
+                with open(self.progress_path, 'w', encoding='utf-8') as f:
+                    json.dump({"completed_tweet_ids": sorted(self._completed)}, f, indent=4)
+            except IOError as e:
+                logger.error(f"削除進捗ファイル '{self.progress_path}' の書き込みに失敗しました: {e}", exc_info=True)
+
+    def _wait_for_budget(self, account_id: str) -> bool:
+        """記録済みの削除レート制限が尽きていればリセットまで待つ。待てない場合は False。"""
+        if not self.rate_limit_tracker:
+            return True
+        wait_seconds = self.rate_limit_tracker.seconds_until_available(account_id, "delete_tweet")
+        if wait_seconds <= 0:
+            return True
+        if wait_seconds > MAX_RATE_LIMIT_WAIT_SECONDS:
+            logger.warning(f"アカウント '{account_id}' の削除レート制限のリセットまで {wait_seconds} 秒かかるため、処理を打ち切ります。")
+            return False
+        logger.info(f"アカウント '{account_id}' の削除レート制限の残りがないため、{wait_seconds} 秒待機します。")
+        self._sleep(wait_seconds)
+        return True
+
+    def _purge_account(self, account_id: str, tweet_ids: List[str]) -> Dict[str, int]:
+        summary = {"deleted": 0, "failed": 0, "skipped": 0}
+        try:
+            client = self.client_factory(account_id)
+        except Exception as e:
+            logger.error(f"アカウント '{account_id}' のクライアントを初期化できないため、削除をスキップします: {e}")
+            summary["skipped"] = len(tweet_ids)
+            return summary
+
+        for index, tweet_id in enumerate(tweet_ids):
+            if index > 0:
+                self._sleep(self.delete_interval_seconds)
+            if not self._wait_for_budget(account_id):
+                summary["skipped"] += len(tweet_ids) - index
+                break
+            try:
+                deleted = client.delete_tweet(tweet_id, treat_missing_as_deleted=True)
+            except RateLimitError as e:
+                wait_seconds = e.remaining_seconds if e.remaining_seconds is not None else MAX_RATE_LIMIT_WAIT_SECONDS
+                if wait_seconds > MAX_RATE_LIMIT_WAIT_SECONDS:
+                    summary["skipped"] += len(tweet_ids) - index
+                    break
+                logger.warning(f"アカウント '{account_id}' の削除でレート制限に達しました。{wait_seconds} 秒待機して再試行します。")
+                self._sleep(wait_seconds)
+                try:
+                    deleted = client.delete_tweet(tweet_id, treat_missing_as_deleted=True)
+                except RateLimitError:
+                    summary["skipped"] += len(tweet_ids) - index
+                    break
+            if deleted:
+                summary["deleted"] += 1
+                self._mark_completed(tweet_id)
+            else:
+                summary["failed"] += 1
+        logger.info(f"アカウント '{account_id}' の削除処理が完了しました: {summary}")
+        return summary
+
+    def purge(self, targets: Iterable[Dict[str, str]]) -> Dict[str, Dict[str, int]]:
+        """削除対象をアカウントごとにまとめて削除し、アカウント別の集計 (deleted/failed/skipped/already_done) を返す。"""
+        by_account: Dict[str, List[str]] = {}
+        already_done: Dict[str, int] = {}
+        seen = set()
+        for target in targets:
+            account_id, tweet_id = target["account_id"], str(target["tweet_id"])
+            if tweet_id in seen:
+                continue
+            seen.add(tweet_id)
+            if tweet_id in self._completed:
+                already_done[account_id] = already_done.get(account_id, 0) + 1
+                continue
+            by_account.setdefault(account_id, []).append(tweet_id)
+
+        total = sum(len(ids) for ids in by_account.values())
+        logger.info(f"{len(by_account)} アカウント・{total} 件のツイートを削除します (完了済みのため除外: {sum(already_done.values())} 件)。")
+
+        results: Dict[str, Dict[str, int]] = {}
+        if by_account:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrent_accounts, len(by_account)))) as pool:
+                futures = {account_id: pool.submit(self._purge_account, account_id, ids) for account_id, ids in by_account.items()}
+                for account_id, future in futures.items():
+                    results[account_id] = future.result()
+
+        for account_id, count in already_done.items():
+            results.setdefault(account_id, {"deleted": 0, "failed": 0, "skipped": 0})["already_done"] = count
+        return results
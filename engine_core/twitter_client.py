@@ -3,13 +3,23 @@ import logging
 import os
 import requests
 import time
-from typing import Optional, Dict, Any, List, Tuple # Tuple を追加
+import threading
+from typing import Optional, Dict, Any, List, Set, Tuple # Tuple を追加
 from datetime import datetime, timezone # timezone を追加
 import io # io を追加
 import tempfile # tempfile を追加
-import mimetypes # mimetypes を追加
 import subprocess # subprocess を追加
 import uuid # uuid を追加
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils.mp4_metadata import set_comment, Mp4MetadataError, UnsupportedContainerError
+from .utils.image_processor import ImageNormalizer
+from .utils.google_drive import GoogleDriveResolver, GoogleDriveError, is_drive_url
+from .utils.http_session import get_shared_session, create_child_session
+from .rate_limit_tracker import RateLimitTracker, endpoint_for_request
+from .utils.media_sniffer import MediaType, classify_media, looks_like_html
+from .circuit_breaker import ERROR_AUTH, ERROR_DUPLICATE, ERROR_MEDIA
+from . import metrics
 
 # このモジュールがengine_coreパッケージ内にあることを想定してConfigをインポート
 # ただし、TwitterClient自体はConfigに直接依存せず、キーは外部から渡される想定
@@ -22,6 +32,31 @@ MEDIA_ENDPOINT_URL_V1 = 'https://upload.twitter.com/1.1/media/upload.json'
 # Twitter API v2 (ツイート投稿用)
 # (tweepy.Clientが内部的にv2エンドポイントを使用する)
 
+# スレッド投稿時にメディアを並列アップロードする最大数
+MAX_PARALLEL_MEDIA_UPLOADS = 4
+
+# Google Driveリンクの解決結果をアカウント間で共有するための既定のリゾルバ
+_shared_drive_resolver: Optional[GoogleDriveResolver] = None
+
+def _get_shared_drive_resolver() -> GoogleDriveResolver:
+    global _shared_drive_resolver
+    if _shared_drive_resolver is None:
+        _shared_drive_resolver = GoogleDriveResolver(session=get_shared_session())
+    return _shared_drive_resolver
+
+# 重複投稿として拒否された場合のエラーコード (187: Status is a duplicate)
+DUPLICATE_TWEET_API_CODE = 187
+
+def classify_post_error(e: tweepy.errors.TweepyException) -> Optional[str]:
+    """投稿時のTweepyの例外を、サーキットブレーカーのエラー種別に分類する。該当しない場合は None。"""
+    if isinstance(e, tweepy.errors.Forbidden):
+        if DUPLICATE_TWEET_API_CODE in getattr(e, 'api_codes', []) or 'duplicate' in str(e).lower():
+            return ERROR_DUPLICATE
+        return ERROR_AUTH
+    if isinstance(e, tweepy.errors.Unauthorized):
+        return ERROR_AUTH
+    return None
+
 class RateLimitError(Exception):
     """レート制限エラーを示すカスタム例外"""
     def __init__(self, message: str, reset_at_utc: Optional[datetime] = None, remaining_seconds: Optional[int] = None):
@@ -32,49 +67,131 @@ class RateLimitError(Exception):
 class TwitterClient:
     def __init__(self, consumer_key: str, consumer_secret: str,
                  access_token: str, access_token_secret: str,
-                 bearer_token: Optional[str] = None): # v2用
+                 bearer_token: Optional[str] = None, # v2用
+                 image_normalizer: Optional[ImageNormalizer] = None,
+                 drive_resolver: Optional[GoogleDriveResolver] = None,
+                 session: Optional[requests.Session] = None,
+                 account_id: Optional[str] = None,
+                 rate_limit_tracker: Optional[RateLimitTracker] = None):
         self.consumer_key = consumer_key
         self.consumer_secret = consumer_secret
         self.access_token = access_token
         self.access_token_secret = access_token_secret
         self.bearer_token = bearer_token
+        self.image_normalizer = image_normalizer # 指定された場合、画像をアップロード前に縮小・再圧縮する
+        self.drive_resolver = drive_resolver or _get_shared_drive_resolver()
+        # 接続プール・再試行・タイムアウトを備えた共有セッションをtweepyにも使わせる
+        self.session = session or get_shared_session()
+        self.account_id = account_id
+        self.rate_limit_tracker = rate_limit_tracker
+        if self.rate_limit_tracker and self.account_id:
+            # 接続プールは共有したまま、このアカウントの全レスポンスからレート制限ヘッダーを記録する
+            self.session = create_child_session(self.session)
+            self.session.hooks['response'].append(self._record_rate_limit)
 
         if not all([consumer_key, consumer_secret, access_token, access_token_secret]):
             msg = "Twitter APIキー/トークンが不足しています。"
             logger.error(msg)
             raise ValueError(msg)
-        
-        # Tweepy Client (v2) の初期化
-        # bearer_tokenは必須ではないが、あると一部のv2エンドポイントで利用可能
-        try:
-            self.client_v2 = tweepy.Client(
-                bearer_token=self.bearer_token, # v2の読み取り専用エンドポイントなどで使用
-                consumer_key=self.consumer_key, # v2の投稿エンドポイントで使用
-                consumer_secret=self.consumer_secret,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret,
-                wait_on_rate_limit=False # Falseに変更
-            )
-            logger.info("Twitter API v2 クライアントの初期化に成功しました。")
-        except Exception as e:
-            logger.error(f"Twitter API v2 クライアントの初期化に失敗: {e}", exc_info=True)
-            # v2クライアントが失敗しても、v1.1のメディアアップロードは試行可能にするため、ここではraiseしない
-            self.client_v2 = None 
 
-        # Tweepy API (v1.1) の認証ハンドラ (メディアアップロード用)
+        # tweepy の Client (v2) / API (v1.1) は最初に使われた時点で初期化する。
+        # 投稿対象がない実行やメディアの事前準備だけの実行では、使わない方のクライアントを作らずに済む。
+        self._client_lock = threading.Lock()
+        self._client_v2 = None
+        self._client_v2_initialized = False
+        self._api_v1 = None
+        self._api_v1_initialized = False
+        # 直近の投稿処理で発生したエラーの種別 (サーキットブレーカー用。呼び出し側で clear してから使う)
+        self.error_classes: Set[str] = set()
+
+    @property
+    def client_v2(self) -> Optional[tweepy.Client]:
+        """Tweepy Client (v2)。初回アクセス時に初期化し、失敗した場合は None を返す。"""
+        if not self._client_v2_initialized:
+            with self._client_lock:
+                if not self._client_v2_initialized:
+                    # bearer_tokenは必須ではないが、あると一部のv2エンドポイントで利用可能
+                    try:
+                        client_v2 = tweepy.Client(
+                            bearer_token=self.bearer_token, # v2の読み取り専用エンドポイントなどで使用
+                            consumer_key=self.consumer_key, # v2の投稿エンドポイントで使用
+                            consumer_secret=self.consumer_secret,
+                            access_token=self.access_token,
+                            access_token_secret=self.access_token_secret,
+                            wait_on_rate_limit=False # Falseに変更
+                        )
+                        client_v2.session = self.session
+                        self._client_v2 = client_v2
+                        logger.info("Twitter API v2 クライアントの初期化に成功しました。")
+                    except Exception as e:
+                        logger.error(f"Twitter API v2 クライアントの初期化に失敗: {e}", exc_info=True)
+                        # v2クライアントが失敗しても、v1.1のメディアアップロードは試行可能にするため、ここではraiseしない
+                        self._client_v2 = None
+                    self._client_v2_initialized = True
+        return self._client_v2
+
+    @client_v2.setter
+    def client_v2(self, value: Optional[tweepy.Client]):
+        self._client_v2 = value
+        self._client_v2_initialized = True
+
+    @property
+    def api_v1(self) -> Optional[tweepy.API]:
+        """Tweepy API (v1.1, メディアアップロード用)。初回アクセス時に初期化し、失敗した場合は None を返す。"""
+        if not self._api_v1_initialized:
+            with self._client_lock:
+                if not self._api_v1_initialized:
+                    try:
+                        auth_v1 = tweepy.OAuth1UserHandler(
+                            consumer_key=self.consumer_key,
+                            consumer_secret=self.consumer_secret,
+                            access_token=self.access_token,
+                            access_token_secret=self.access_token_secret
+                        )
+                        api_v1 = tweepy.API(auth_v1, wait_on_rate_limit=False) # Falseに変更
+                        api_v1.session = self.session
+                        self._api_v1 = api_v1
+                        logger.info("Twitter API v1.1 ハンドラの初期化に成功しました。")
+                    except Exception as e:
+                        # v1.1の初期化に失敗するとメディアアップロードはできないが、呼び出し側でメディアなしの投稿に切り替えられるよう raise しない
+                        logger.error(f"Twitter API v1.1 ハンドラの初期化に失敗: {e}", exc_info=True)
+                        self._api_v1 = None
+                    self._api_v1_initialized = True
+        return self._api_v1
+
+    @api_v1.setter
+    def api_v1(self, value: Optional[tweepy.API]):
+        self._api_v1 = value
+        self._api_v1_initialized = True
+
+    def verify_credentials(self) -> Tuple[Optional[bool], Optional[str]]:
+        """
+        認証情報が有効かを GET /2/users/me で確認する。
+        戻り値は (有効か, エラー内容)。401/403 の場合のみ無効 (False) と判断し、
+        ネットワークエラーやレート制限など一時的な理由で確認できなかった場合は (None, エラー内容) を返す。
+        """
+        client = self.client_v2
+        if not client:
+            return False, "Twitter API v2 クライアントを初期化できませんでした。"
         try:
-            auth_v1 = tweepy.OAuth1UserHandler(
-                consumer_key=self.consumer_key,
-                consumer_secret=self.consumer_secret,
-                access_token=self.access_token,
-                access_token_secret=self.access_token_secret
-            )
-            self.api_v1 = tweepy.API(auth_v1, wait_on_rate_limit=False) # Falseに変更
-            logger.info("Twitter API v1.1 ハンドラの初期化に成功しました。")
+            client.get_me(user_auth=True)
+            return True, None
+        except (tweepy.errors.Unauthorized, tweepy.errors.Forbidden) as e:
+            return False, f"{type(e).__name__}: {e}"
+        except (tweepy.errors.TweepyException, requests.RequestException) as e:
+            return None, f"{type(e).__name__}: {e}"
+
+    def _record_rate_limit(self, response: requests.Response, *args, **kwargs):
+        """レスポンスフック: 成功・失敗を問わず x-rate-limit-* ヘッダーを記録する。"""
+        if response.status_code == 429:
+            metrics.inc("twitter_rate_limit_hits_total")
+        try:
+            if 'x-rate-limit-remaining' not in response.headers:
+                return
+            endpoint = endpoint_for_request(response.request.method, response.request.url)
+            self.rate_limit_tracker.record(self.account_id, endpoint, response.headers)
         except Exception as e:
-            logger.error(f"Twitter API v1.1 ハンドラの初期化に失敗: {e}", exc_info=True)
-            # v1.1の認証が失敗するとメディアアップロードができないので、これは致命的
-            raise ValueError(f"Twitter API v1.1 auth failed: {e}")
+            logger.warning(f"レート制限ヘッダーの記録に失敗しました: {e}")
 
     def _get_rate_limit_info_from_exception(self, e: tweepy.errors.TweepyException) -> Dict[str, Any]:
         """Tweepyの例外からレート制限関連情報を抽出するヘルパー"""
@@ -111,6 +228,23 @@ class TwitterClient:
 
         return {"raw_info": rate_limit_info, "reset_at_utc": reset_dt_utc_val, "remaining_seconds": remaining_sec_val}
 
+    def _modify_video_metadata(self, input_path: str) -> Optional[str]:
+        """
+        動画のコメントメタデータをランダムな値に変更し、アップロード対象のパスを返す。
+        MP4/MOVはプロセス内でアトムを直接書き換え (入力ファイルをその場で更新)、
+        対応していないコンテナの場合のみffmpegにフォールバックする。
+        """
+        random_comment = f"mod_{uuid.uuid4().hex[:12]}_{int(time.time())}"
+        try:
+            mode = set_comment(input_path, random_comment)
+            logger.info(f"動画メタデータをプロセス内で変更しました: {input_path} (方式: {mode}, comment: {random_comment})")
+            return input_path
+        except UnsupportedContainerError as e:
+            logger.info(f"プロセス内でのメタデータ変更に未対応のコンテナです ({e})。ffmpegにフォールバックします。")
+        except (Mp4MetadataError, OSError, ValueError) as e:
+            logger.warning(f"プロセス内でのメタデータ変更に失敗しました ({e})。ffmpegにフォールバックします。")
+        return self._modify_video_metadata_ffmpeg(input_path)
+
     def _modify_video_metadata_ffmpeg(self, input_path: str) -> Optional[str]:
         """ffmpegを使用して動画のコメントメタデータを変更し、新しい一時ファイルのパスを返す。"""
         output_temp_file = None
@@ -139,7 +273,9 @@ class TwitterClient:
             
             logger.info(f"ffmpegでメタデータ変更開始: {input_path} -> {output_path} (comment: {random_comment})")
             # ffmpegの実行 (標準出力・エラーは抑制し、エラー時のみログに出す)
+            started = time.monotonic()
             process = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, check=False)
+            metrics.observe("ffmpeg_seconds", time.monotonic() - started)
             
             if process.returncode == 0:
                 logger.info(f"ffmpegによるメタデータ変更成功: {output_path}")
@@ -163,186 +299,135 @@ class TwitterClient:
                  except: pass # エラー時は握りつぶす
             return None
 
-    def _upload_media_v1(self, media_url: str) -> Optional[str]:
-        """指定されたURLのメディアをTwitterにアップロードし、メディアIDを返す (v1.1 API)。"""
-        if not self.api_v1:
-            logger.error("Twitter API v1.1が初期化されていません。メディアをアップロードできません。")
-            return None
-        
-        try:
-            logger.info(f"メディアURLからデータをダウンロード開始: {media_url}")
-            response = requests.get(media_url, stream=True)
-            response.raise_for_status() # HTTPエラーチェック
-            original_media_url = media_url # 元のURLを保持
+    def _download_media(self, media_url: str) -> Tuple[bytes, str]:
+        """メディアURLからデータをダウンロードし、(データ, Content-Type) を返す。Google Driveのリンクは専用のリゾルバで処理する。"""
+        if is_drive_url(media_url):
+            partial_path, content_type = self.drive_resolver.download(media_url)
+            try:
+                with open(partial_path, 'rb') as f:
+                    content = f.read()
+            finally:
+                os.remove(partial_path)
+            metrics.inc("media_download_bytes_total", len(content), source="drive")
+            return content, content_type
+
+        # 加工・アップロードには全体が必要なため、ストリーミングせずに一度で読み込む
+        response = self.session.get(media_url)
+        response.raise_for_status() # HTTPエラーチェック
+        metrics.inc("media_download_bytes_total", len(response.content), source="http")
+        return response.content, response.headers.get('content-type', '').lower()
+
+    def prepare_upload_file(self, media_content: bytes, content_type: str, media_url: str) -> Tuple[str, MediaType, List[str]]:
+        """
+        ダウンロードしたメディアを一時ファイルに書き出し、種類に応じた加工 (動画のメタデータ変更・画像の正規化) を行う。
+        (アップロードするファイルのパス, メディアの種類, アップロード後に削除する一時ファイルのリスト) を返す。
+        """
+        # 先頭のマジックバイトからメディアの種類を判定し、カテゴリとアップロード方式 (チャンク/シンプル) を決める
+        media_type = classify_media(media_content, content_type, media_url)
+        if media_type.mime_type == 'image/gif':
+            logger.info(f"GIFのフレーム数: {media_type.frame_count} (カテゴリ: {media_type.media_category})")
+        logger.debug(f"判定後の media_category: '{media_type.media_category}', is_video: {media_type.is_video}, file_extension: {media_type.extension}")
+
+        # 一時ファイル名のプレフィックス (拡張子なし)
+        base_file_name = os.path.basename(media_url.split('?')[0])
+        file_name_prefix = os.path.splitext(base_file_name)[0] if '.' in base_file_name else base_file_name
+
+        # 一時ファイルを作成 (正しい拡張子を付ける)
+        with tempfile.NamedTemporaryFile(delete=False, prefix=file_name_prefix + '_', suffix=media_type.extension) as temp_f:
+            temp_f.write(media_content)
+            temp_file_path = temp_f.name
+        temp_paths = [temp_file_path]
+        upload_target_path = temp_file_path # アップロード対象のパス（デフォルトは元のファイル）
+
+        # 動画の場合、メタデータを変更する
+        if media_type.is_video:
+            logger.info(f"動画ファイル ({temp_file_path}) のメタデータ変更を試みます...")
+            modified_temp_file_path = self._modify_video_metadata(temp_file_path)
+            if modified_temp_file_path:
+                logger.info(f"メタデータ変更成功。アップロードには変更後ファイルを使用: {modified_temp_file_path}")
+                upload_target_path = modified_temp_file_path
+                if modified_temp_file_path != temp_file_path:
+                    temp_paths.append(modified_temp_file_path)
+            else:
+                logger.warning(f"動画メタデータの変更に失敗。元のファイルでアップロードを続行します: {temp_file_path}")
+
+        # 画像の場合、設定に応じて縮小・再圧縮・EXIF除去を行う (結果はキャッシュされるため削除しない)
+        if media_type.media_category == 'tweet_image' and self.image_normalizer:
+            upload_target_path = self.image_normalizer.normalize(temp_file_path)
 
-            # Google Driveの共有リンクを直接ダウンロード用URLに変換
-            if "drive.google.com" in media_url and "/view" in media_url:
+        return upload_target_path, media_type, temp_paths
+
+    @staticmethod
+    def remove_temp_files(paths: List[str]):
+        for path in paths:
+            if path and os.path.exists(path):
                 try:
-                    parts = media_url.split('/')
-                    file_id = None
-                    for i, part in enumerate(parts):
-                        if part == 'd' and i + 1 < len(parts):
-                            file_id = parts[i+1]
-                            break
-                    
-                    if file_id:
-                        direct_download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-                        logger.info(f"Google Driveリンクを検出。直接ダウンロードURLに変換: {direct_download_url}")
-                        # stream=True を維持しつつ、新しいURLで再度リクエスト
-                        response = requests.get(direct_download_url, stream=True, timeout=30, allow_redirects=True)
-                        response.raise_for_status()
-                        current_content_type = response.headers.get('content-type', '').lower()
-                        if 'text/html' in current_content_type:
-                            logger.warning(f"Google DriveからHTMLが返されました (Content-Type: {current_content_type})。URL: {direct_download_url}. 元のURLでの処理を試みます。")
-                            # HTMLが返された場合は元のURLで取得し直す
-                            response = requests.get(original_media_url, stream=True, timeout=30)
-                            response.raise_for_status()
-                    else:
-                        logger.warning(f"Google DriveのファイルID抽出に失敗しました: {media_url}")
-                        # ファイルIDが取れなければ元のresponseで続行 (既に取得済み)
-
-                except requests.exceptions.RequestException as e_gdrive:
-                    logger.error(f"Google Drive直接ダウンロードURLからの取得/処理に失敗: {e_gdrive}。元のURLで試行します。")
-                    response = requests.get(original_media_url, stream=True, timeout=30)
-                    response.raise_for_status()
-                except Exception as e_general:
-                    logger.error(f"Google Driveリンク処理中に予期せぬエラー: {e_general}。元のURLで試行します。")
-                    response = requests.get(original_media_url, stream=True, timeout=30)
-                    response.raise_for_status()
-            
-            try:
-                media_content = response.content # 全コンテンツをメモリに読み込む
-                content_type = response.headers.get('content-type', '').lower()
-                logger.debug(f"取得したContent-Type: '{content_type}' (URL: {response.url})")
+                    os.remove(path)
+                    logger.debug(f"一時ファイル {path} を削除しました。")
+                except OSError as e_remove:
+                    logger.error(f"一時ファイル {path} の削除に失敗: {e_remove}")
+
+    def download_and_prepare(self, media_url: str) -> Optional[Tuple[str, MediaType, List[str]]]:
+        """
+        メディアURLからダウンロードし、アップロードできる状態に加工する。
+        (アップロードするファイルのパス, メディアの種類, 削除する一時ファイルのリスト) を返し、失敗した場合は None。
+        複数アカウントに同じメディアを投稿する場合は、この結果を upload_prepared_file で使い回す。
+        """
+        try:
+            logger.info(f"メディアURLからデータをダウンロード開始: {media_url}")
+            media_content, content_type = self._download_media(media_url)
+            logger.debug(f"取得したContent-Type: '{content_type}' (URL: {media_url})")
 
-            except Exception as e_content:
-                logger.error(f"レスポンスコンテンツの読み込みに失敗: {e_content}")
+            if looks_like_html(media_content):
+                logger.error(f"メディアURLからHTMLが返されました。共有設定やURLを確認してください: {media_url}")
                 return None
+            return self.prepare_upload_file(media_content, content_type, media_url)
+        except (requests.exceptions.RequestException, GoogleDriveError) as e_req:
+            logger.error(f"メディアURLからのダウンロードまたはGoogle Drive処理で失敗: {media_url}, Error: {e_req}", exc_info=True)
+            return None
+        except Exception as e_outer:
+            logger.error(f"メディア処理の全体的な予期せぬエラー: {e_outer}", exc_info=True)
+            return None
 
-            # ファイル拡張子を決定
-            # mimetypesを使ってContent-Typeから拡張子を推測
-            guessed_extension = mimetypes.guess_extension(content_type.split(';')[0])
-            base_file_name = os.path.basename(original_media_url.split('?')[0])
-            original_extension = os.path.splitext(base_file_name)[1].lower()
-
-            # 適切な拡張子を選択 (mimetypesの結果を優先、なければ元のURLから)
-            file_extension = guessed_extension if guessed_extension else original_extension
-            if not file_extension: # それでもなければデフォルト
-                if 'video' in content_type:
-                    file_extension = '.mp4'
-                elif 'gif' in content_type:
-                    file_extension = '.gif'
-                else:
-                    file_extension = '.jpg' # デフォルト
-            
-            # 一時ファイル名のプレフィックス (拡張子なし)
-            file_name_prefix = os.path.splitext(base_file_name)[0] if '.' in base_file_name else base_file_name
-            
-            media_category = None
-            is_video = False
-
-            if 'image/gif' in content_type:
-                media_category = 'tweet_gif'
-            elif 'image/' in content_type:
-                media_category = 'tweet_image'
-            elif 'video/mp4' in content_type or (file_extension == '.mp4' and 'video' in content_type):
-                media_category = 'tweet_video'
-                is_video = True
-            elif 'video/' in content_type: # mp4以外のvideoタイプも考慮
-                 media_category = 'tweet_video'
-                 is_video = True
-                 if not file_extension.startswith('.'):
-                     file_extension = '.' + content_type.split('/')[-1] # video/quicktime -> .quicktime
-                 if file_extension == '.mov': # .movはTwitterでサポートされない場合があるので注意喚起
-                     logger.warning("Content-Typeまたはファイル名が .mov (video/quicktime) です。Twitterでの互換性に注意してください。")
-
-            elif 'application/octet-stream' in content_type or not content_type:
-                logger.warning(f"Content-Typeが '{content_type}' のため、ファイル拡張子 '{file_extension}' から推測します。")
-                if file_extension in ['.mp4', '.mov']:
-                    media_category = 'tweet_video'
-                    is_video = True
-                    if file_extension == '.mov': logger.warning("拡張子が .mov です。Twitterでの互換性に注意してください。")
-                elif file_extension in ['.jpg', '.jpeg', '.png']:
-                    media_category = 'tweet_image'
-                elif file_extension == '.gif':
-                    media_category = 'tweet_gif'
-                else:
-                    logger.warning(f"拡張子 '{file_extension}' からもメディアタイプを特定できませんでした。デフォルトで画像として扱います。")
-                    media_category = 'tweet_image'
-            else:
-                logger.warning(f"不明なContent-Type: {content_type}。ファイル拡張子 '{file_extension}' から推測し、デフォルトで画像として扱います。")
-                media_category = 'tweet_image' # デフォルト
-
-            logger.debug(f"判定後の media_category: '{media_category}', is_video: {is_video}, file_extension: {file_extension}")
-
-            temp_file_path = None # 元のダウンロードされた一時ファイル
-            modified_temp_file_path = None # ffmpegで処理された後の一時ファイル
-
-            try: # Inner try for file processing and upload
-                # 一時ファイルを作成 (正しい拡張子を付ける)
-                with tempfile.NamedTemporaryFile(delete=False, prefix=file_name_prefix + '_', suffix=file_extension) as temp_f:
-                    temp_f.write(media_content)
-                    temp_file_path = temp_f.name
-                
-                upload_target_path = temp_file_path # アップロード対象のパス（デフォルトは元のファイル）
-
-                # 動画の場合、ffmpegでメタデータを変更する
-                if is_video and temp_file_path:
-                    logger.info(f"動画ファイル ({temp_file_path}) のメタデータ変更を試みます...")
-                    modified_temp_file_path = self._modify_video_metadata_ffmpeg(temp_file_path)
-                    if modified_temp_file_path:
-                        logger.info(f"メタデータ変更成功。アップロードには変更後ファイルを使用: {modified_temp_file_path}")
-                        upload_target_path = modified_temp_file_path
-                    else: # このelseは if modified_temp_file_path: に対応
-                        logger.warning(f"動画メタデータの変更に失敗。元のファイルでアップロードを続行します: {temp_file_path}")
-                
-                # 上記のifブロックが終わった後 (動画処理が終わった後、または動画でなかった場合)
-                logger.info(f"メディアを一時ファイル {upload_target_path} に保存し、Twitterにアップロード中 (カテゴリ: {media_category or '未指定'}, メディアタイプ: {content_type})...")
-
-                uploaded_media = self.api_v1.media_upload(
-                    filename=upload_target_path, 
-                    media_category=media_category,
-                    chunked=is_video # 動画の場合はチャンクアップロードを有効にする
-                )
-                logger.info(f"メディアのアップロード成功。Media ID: {uploaded_media.media_id_string}")
-                return uploaded_media.media_id_string
-
-            except Exception as e_upload: # This except corresponds to the inner try
-                logger.error(f"メディアアップロード処理中の予期せぬエラー: {e_upload}", exc_info=True)
-                pass 
+    def upload_prepared_file(self, upload_target_path: str, media_type: MediaType) -> Optional[str]:
+        """加工済みのファイルをTwitterにアップロードし、メディアIDを返す (v1.1 API)。ファイルは削除しない。"""
+        if not self.api_v1:
+            logger.error("Twitter API v1.1が初期化されていません。メディアをアップロードできません。")
+            return None
 
-            finally: # This finally corresponds to the inner try
-                if temp_file_path and os.path.exists(temp_file_path):
-                    try:
-                        os.remove(temp_file_path)
-                        logger.debug(f"一時ファイル {temp_file_path} を削除しました。")
-                    except OSError as e_remove:
-                        logger.error(f"一時ファイル {temp_file_path} の削除に失敗: {e_remove}")
-                if modified_temp_file_path and os.path.exists(modified_temp_file_path):
-                    try:
-                        os.remove(modified_temp_file_path)
-                        logger.debug(f"ffmpeg処理後の一時ファイル {modified_temp_file_path} を削除しました。")
-                    except OSError as e_remove_mod:
-                        logger.error(f"ffmpeg処理後の一時ファイル {modified_temp_file_path} の削除に失敗: {e_remove_mod}")
-                # If an error occurred in the try block above, and we didn't return a media_id,
-                # _upload_media_v1 needs to return None.
-                # This will be caught by the outer try-except structure if an error was raised from inner 'except'
-                # or if we simply fall through.
-
-        except tweepy.TweepyException as e: # This is for Tweepy specific errors outside the inner file processing try-catch
-            logger.error(f"Twitterへのメディアアップロード失敗 (TweepyException): {e}", exc_info=True) # Clarified log
+        media_category = media_type.media_category
+        try:
+            logger.info(f"メディアを一時ファイル {upload_target_path} に保存し、Twitterにアップロード中 (カテゴリ: {media_category or '未指定'}, メディアタイプ: {media_type.mime_type})...")
+            uploaded_media = self.api_v1.media_upload(
+                filename=upload_target_path,
+                media_category=media_category,
+                chunked=media_type.is_video # 動画の場合はチャンクアップロードを有効にする
+            )
+            logger.info(f"メディアのアップロード成功。Media ID: {uploaded_media.media_id_string}")
+            return uploaded_media.media_id_string
+        except tweepy.TweepyException as e:
+            logger.error(f"Twitterへのメディアアップロード失敗 (TweepyException): {e}", exc_info=True)
             if isinstance(e, tweepy.errors.Forbidden):
                 logger.error("Forbidden (403)エラー。APIキーの権限、アプリの承認状態、またはTwitterのルール違反を確認してください。")
-            # No separate 'except Exception as e_upload:' here, as that was for the inner try.
-            # Any other TweepyException will just be logged and lead to returning None.
-            return None # Return None for any TweepyException here
+            return None
+        except Exception as e_upload:
+            logger.error(f"メディアアップロード処理中の予期せぬエラー: {e_upload}", exc_info=True)
+            return None
 
-        except requests.exceptions.RequestException as e_req:
-            logger.error(f"メディアURLからのダウンロードまたはGoogle Drive処理で失敗: {original_media_url}, Error: {e_req}", exc_info=True)
+    def _upload_media_v1(self, media_url: str) -> Optional[str]:
+        """指定されたURLのメディアをTwitterにアップロードし、メディアIDを返す (v1.1 API)。"""
+        if not self.api_v1:
+            logger.error("Twitter API v1.1が初期化されていません。メディアをアップロードできません。")
             return None
-        except Exception as e_outer:
-            logger.error(f"メディア処理の全体的な予期せぬエラー: {e_outer}", exc_info=True)
+
+        prepared = self.download_and_prepare(media_url)
+        if not prepared:
             return None
+        upload_target_path, media_type, temp_paths = prepared
+        try:
+            return self.upload_prepared_file(upload_target_path, media_type)
+        finally:
+            self.remove_temp_files(temp_paths)
 
     def post_tweet(self, text: str, media_ids: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
         """テキストとオプションでメディアIDリストを指定してツイートを投稿する (v2 API)。"""
@@ -360,7 +445,7 @@ class TwitterClient:
             # response は tweepy.Response オブジェクトで、data, includes, errors, meta などの属性を持つ
             # response.data は投稿されたツイートの情報 (id, textなど) を含むdict
             if response.data and response.data.get("id"):
-                logger.info(f"ツイート投稿成功。Tweet ID: {response.data['id']}, Text: {response.data['text']}")
+                logger.info(f"ツイート投稿成功。Tweet ID: {response.data['id']}, Text: {response.data['text'][:30]}...")
                 return response.data # dictを返す
             else:
                 logger.error(f"ツイート投稿は成功しましたが、レスポンスデータが不正です: {response}")
@@ -378,6 +463,9 @@ class TwitterClient:
                 raise RateLimitError(message=str(e), reset_at_utc=reset_at, remaining_seconds=remaining_sec)
             elif isinstance(e, tweepy.errors.Forbidden):
                 logger.error("Forbidden (401/403)エラー。APIキー、アクセストークンの有効性、権限、またはTwitterのルール違反を確認してください。")
+            error_class = classify_post_error(e)
+            if error_class:
+                self.error_classes.add(error_class)
             
             # 上記以外のTweepyExceptionや、Forbiddenの場合も（当面は）Noneを返す
             return None
@@ -385,6 +473,11 @@ class TwitterClient:
             logger.error(f"ツイート投稿中の予期せぬエラー: {e}", exc_info=True)
             return None
 
+    def upload_media(self, media_url: str) -> Optional[str]:
+        """メディアURLからダウンロード・加工・アップロードまでを行い、メディアIDを返す。投稿は行わない。"""
+        logger.info(f"メディアの事前アップロード: {media_url}")
+        return self._upload_media_v1(media_url)
+
     def post_with_media_url(self, text: str, media_url: Optional[str]) -> Optional[Dict[str, Any]]:
         """メディアURLを指定して、ダウンロード・アップロード後にツイートする統合メソッド。"""
         media_id_list = None
@@ -394,11 +487,59 @@ class TwitterClient:
             if uploaded_media_id:
                 media_id_list = [uploaded_media_id]
             else:
+                self.error_classes.add(ERROR_MEDIA)
                 logger.warning("メディアのアップロードに失敗したため、メディアなしで投稿を試みます。")
                 # メディアアップロード失敗時はテキストのみで投稿を試みる
         
         return self.post_tweet(text, media_ids=media_id_list)
 
+    def post_thread(self, parts: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        複数のパートを自己リプライでつないだスレッドとして投稿する。
+        各パートは {"text": 本文, "media_path": メディアURL (任意), "media_ids": アップロード済みID (任意)}。
+        全パートのメディアを先に並列でアップロードしてから、ツイートを続けて投稿する。
+        先頭ツイートの投稿に失敗した場合は None、途中で失敗した場合はそこまでに投稿したツイートのリストを返す。
+        """
+        if not parts:
+            logger.warning("スレッドに投稿するパートがありません。")
+            return None
+
+        media_ids_by_index: Dict[int, Optional[List[str]]] = {i: part.get("media_ids") for i, part in enumerate(parts)}
+        pending_uploads = {i: part["media_path"] for i, part in enumerate(parts)
+                           if part.get("media_path") and not part.get("media_ids")}
+        if pending_uploads:
+            logger.info(f"スレッドの {len(pending_uploads)} 件のメディアを並列でアップロードします。")
+            with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_MEDIA_UPLOADS, len(pending_uploads))) as pool:
+                futures = {i: pool.submit(self._upload_media_v1, url) for i, url in pending_uploads.items()}
+                for i, future in futures.items():
+                    media_id = future.result()
+                    if media_id:
+                        media_ids_by_index[i] = [media_id]
+                    else:
+                        self.error_classes.add(ERROR_MEDIA)
+                        logger.warning(f"スレッドの {i + 1} 件目のメディアのアップロードに失敗したため、メディアなしで投稿します。")
+
+        posted: List[Dict[str, Any]] = []
+        head = self.post_tweet(parts[0]["text"], media_ids=media_ids_by_index.get(0))
+        if not head or 'id' not in head:
+            logger.error("スレッド先頭のツイート投稿に失敗しました。")
+            return None
+        posted.append(head)
+
+        for i, part in enumerate(parts[1:], start=1):
+            try:
+                reply = self.post_reply(part["text"], in_reply_to_tweet_id=posted[-1]["id"], media_ids=media_ids_by_index.get(i))
+            except RateLimitError as e:
+                logger.error(f"スレッドの {i + 1}/{len(parts)} 件目の投稿中にレート制限に達しました: {e}")
+                reply = None
+            if not reply:
+                logger.error(f"スレッドの {i + 1}/{len(parts)} 件目の投稿に失敗しました。以降のパートは投稿されません。")
+                break
+            posted.append(reply)
+
+        logger.info(f"スレッドを投稿しました ({len(posted)}/{len(parts)} 件)。先頭 Tweet ID: {posted[0]['id']}")
+        return posted
+
     def post_reply(self, text: str, in_reply_to_tweet_id: str, media_ids: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
         """指定されたツイートにリプライを投稿する (v2 API)。"""
         if not self.client_v2:
@@ -454,6 +595,7 @@ class TwitterClient:
                     remaining_seconds=rate_limit_details.get('remaining_seconds')
                 )
             # それ以外の403エラーはそのまま失敗として処理
+            self.error_classes.add(classify_post_error(e))
             return None
         except tweepy.errors.TooManyRequests as e: # 429 Too Many Requests
             rate_limit_details = self._get_rate_limit_info_from_exception(e)
@@ -470,8 +612,11 @@ class TwitterClient:
             logger.error(f"リプライ投稿中に予期せぬ一般エラー: {e}", exc_info=True)
             return None
 
-    def delete_tweet(self, tweet_id: str) -> bool:
-        """指定されたIDのツイートを削除する (v2 API)。成功すればTrueを返す。"""
+    def delete_tweet(self, tweet_id: str, treat_missing_as_deleted: bool = False) -> bool:
+        """
+        指定されたIDのツイートを削除する (v2 API)。成功すればTrueを返す。
+        treat_missing_as_deleted が True の場合、既に存在しないツイート (404) も削除済みとしてTrueを返す。
+        """
         if not self.client_v2:
             logger.error("Twitter API v2 クライアントが初期化されていません。ツイートを削除できません。")
             return False
@@ -508,7 +653,7 @@ class TwitterClient:
             return False
         except tweepy.errors.NotFound as e_404: # ツイートが存在しない
             logger.warning(f"削除対象のツイートが見つかりませんでした (404 Not Found): ID={tweet_id}")
-            return False # 見つからない場合は、ある意味「削除済み」とも言えるのでTrueを返すか議論の余地あり。ここではFalse。
+            return treat_missing_as_deleted
         except tweepy.errors.TweepyException as e:
             logger.error(f"ツイート削除中に予期せぬTweepyエラー: {e}. ID={tweet_id}", exc_info=True)
             return False
@@ -0,0 +1,270 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import logging
+from html.parser import HTMLParser
+from typing import Dict, Optional, Tuple, Any
+from urllib.parse import urlparse, parse_qs, urlencode
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DRIVE_HOSTS = ("drive.google.com", "docs.google.com", "drive.usercontent.google.com")
+DIRECT_DOWNLOAD_URL = "https://drive.usercontent.google.com/download"
+# 解決済みURLの有効期間 (確認ページのuuidなどは時間が経つと無効になる)
+DEFAULT_RESOLVE_CACHE_TTL_SECONDS = 3600
+DEFAULT_MAX_ATTEMPTS = 3
+# 再試行までの待ち時間 (試行ごとに2倍にする)
+DEFAULT_BACKOFF_SECONDS = 1.0
+DEFAULT_TIMEOUT = (10, 60)
+CHUNK_SIZE = 1024 * 1024
+
+# /file/d/<id>/view, /file/u/0/d/<id>, /presentation/d/<id>, /d/<id> など
+_PATH_ID_PATTERN = re.compile(r"/d/([A-Za-z0-9_-]{10,})")
+# Content-Range: bytes 100-199/1000
+_CONTENT_RANGE_TOTAL_PATTERN = re.compile(r"/(\d+)\s*$")
+
+
+class GoogleDriveError(Exception):
+    """Google Driveのファイルを解決・ダウンロードできなかったことを示す例外"""
+
+
+def is_drive_url(url: str) -> bool:
+    host = (urlparse(url).hostname or "").lower()
+    return host in DRIVE_HOSTS
+
+
+def extract_file_id(url: str) -> Optional[str]:
+    """Google DriveのあらゆるURL形式からファイルIDを取り出す。取り出せない場合は None。"""
+    if not is_drive_url(url):
+        return None
+    parsed = urlparse(url)
+    match = _PATH_ID_PATTERN.search(parsed.path)
+    if match:
+        return match.group(1)
+    # /open?id=<id>, /uc?id=<id>&export=download, /download?id=<id> など
+    ids = parse_qs(parsed.query).get("id")
+    if ids and ids[0]:
+        return ids[0]
+    return None
+
+
+def _response_validator(response: requests.Response) -> Tuple[Optional[str], Optional[int]]:
+    """レスポンスが指すファイルの版を見分けるための (ETag, ファイル全体のサイズ) を返す。"""
+    total: Optional[int] = None
+    if response.status_code == 206:
+        match = _CONTENT_RANGE_TOTAL_PATTERN.search(response.headers.get('content-range', ''))
+        if match:
+            total = int(match.group(1))
+    elif response.headers.get('content-length', '').isdigit():
+        total = int(response.headers['content-length'])
+    return response.headers.get('etag'), total
+
+
+def _same_file(previous: Tuple[Optional[str], Optional[int]], current: Tuple[Optional[str], Optional[int]]) -> bool:
+    """両方で分かっている項目 (ETag・全体のサイズ) が一致すれば同じファイルとみなす。"""
+    return all(a == b for a, b in zip(previous, current) if a is not None and b is not None)
+
+
+class _DownloadFormParser(HTMLParser):
+    """ウイルススキャン確認ページからダウンロード用フォームのactionとhidden inputを取り出す。"""
+    def __init__(self):
+        super().__init__()
+        self.action: Optional[str] = None
+        self.params: Dict[str, str] = {}
+        self._in_form = False
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == "form" and self.action is None:
+            self.action = attributes.get("action")
+            self._in_form = True
+        elif tag == "input" and self._in_form and attributes.get("name"):
+            self.params[attributes["name"]] = attributes.get("value") or ""
+        elif tag == "a" and not self.params:
+            # 旧形式の確認ページ: <a href="/uc?export=download&confirm=XXXX&id=...">
+            href = attributes.get("href") or ""
+            if "confirm=" in href:
+                query = parse_qs(urlparse(href).query)
+                self.params = {k: v[0] for k, v in query.items()}
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._in_form = False
+
+
+class GoogleDriveResolver:
+    """
+    Google Driveの共有リンクを直接ダウンロード可能なURLに解決し、ダウンロードするクラス。
+    大きなファイルで返されるウイルススキャン確認ページを処理し、解決結果をキャッシュする。
+    ダウンロードは呼び出しごとの部分ファイルに書き込み、中断時はHTTP Rangeで続きから再開する。
+    """
+    def __init__(self, session: Optional[requests.Session] = None, cache_path: Optional[str] = None,
+                 cache_ttl_seconds: int = DEFAULT_RESOLVE_CACHE_TTL_SECONDS,
+                 partial_dir: Optional[str] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 backoff_seconds: float = DEFAULT_BACKOFF_SECONDS):
+        self.session = session or requests.Session()
+        self.cache_path = cache_path
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.partial_dir = partial_dir or tempfile.gettempdir()
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        # 複数スレッド (スレッド投稿のメディア並列アップロード・非同期エンジン) から同時に使われるため、キャッシュの更新を排他する
+        self._cache_lock = threading.Lock()
+        self._cache: Dict[str, Dict[str, Any]] = self._load_cache()
+
+    def _load_cache(self) -> Dict[str, Dict[str, Any]]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"Google Drive解決キャッシュ '{self.cache_path}' の読み込みに失敗しました: {e}")
+            return {}
+
+    def _save_cache(self):
+        """キャッシュを書き出す。_cache_lock を取得した状態で呼び出す。"""
+        if not self.cache_path:
+            return
+        now = time.time()
+        # 期限切れの項目は書き出さない (ファイルが際限なく大きくならないように)
+        self._cache = {file_id: entry for file_id, entry in self._cache.items()
+                       if now - entry.get("resolved_at", 0) < self.cache_ttl_seconds}
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._cache, f, indent=4, ensure_ascii=False)
+            # ワーカーが同時に書き出しても壊れたファイルが残らないよう、置き換えで書き込む
+            os.replace(tmp_path, self.cache_path)
+        except IOError as e:
+            logger.warning(f"Google Drive解決キャッシュ '{self.cache_path}' の書き込みに失敗しました: {e}")
+
+    def _cached(self, file_id: str) -> Optional[str]:
+        with self._cache_lock:
+            entry = self._cache.get(file_id)
+        if entry and time.time() - entry.get("resolved_at", 0) < self.cache_ttl_seconds:
+            return entry.get("url")
+        return None
+
+    def _remember(self, file_id: str, url: str):
+        with self._cache_lock:
+            self._cache[file_id] = {"url": url, "resolved_at": time.time()}
+            self._save_cache()
+
+    def invalidate(self, file_id: str):
+        with self._cache_lock:
+            if self._cache.pop(file_id, None) is not None:
+                self._save_cache()
+
+    def resolve(self, url: str) -> str:
+        """共有リンクを直接ダウンロードURLに解決する。確認ページが返される場合は確認トークン付きURLを返す。"""
+        file_id = extract_file_id(url)
+        if not file_id:
+            raise GoogleDriveError(f"Google DriveのURLからファイルIDを取得できませんでした: {url}")
+        cached = self._cached(file_id)
+        if cached:
+            return cached
+
+        direct_url = f"{DIRECT_DOWNLOAD_URL}?{urlencode({'id': file_id, 'export': 'download'})}"
+        with self.session.get(direct_url, stream=True, timeout=DEFAULT_TIMEOUT, allow_redirects=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('content-type', '').lower()
+            if 'text/html' not in content_type:
+                self._remember(file_id, direct_url)
+                return direct_url
+            confirm_url = self._confirm_url_from_page(response.text, file_id)
+
+        if not confirm_url:
+            raise GoogleDriveError(f"Google Driveの確認ページからダウンロードURLを取得できませんでした (共有設定を確認してください): {url}")
+        logger.info(f"Google Driveの確認ページを検出しました。確認トークン付きURLでダウンロードします: file_id={file_id}")
+        self._remember(file_id, confirm_url)
+        return confirm_url
+
+    def _confirm_url_from_page(self, html: str, file_id: str) -> Optional[str]:
+        parser = _DownloadFormParser()
+        parser.feed(html)
+        if not parser.params.get("confirm"):
+            return None
+        params = dict(parser.params)
+        params.setdefault("id", file_id)
+        params.setdefault("export", "download")
+        action = parser.action or DIRECT_DOWNLOAD_URL
+        if action.startswith("/"):
+            action = f"https://drive.google.com{action}"
+        return f"{action}?{urlencode(params)}"
+
+    def download(self, url: str) -> Tuple[str, str]:
+        """
+        ファイルを部分ファイルにダウンロードし、(ファイルパス, Content-Type) を返す。ファイルは呼び出し側で削除する。
+        部分ファイルは呼び出しごとに別の名前で作るため、同じファイルを並行してダウンロードしても干渉しない。
+        接続が途中で切れた場合は、ETag と全体のサイズが変わっていないことを確かめてから、取得済みのバイト数からRangeリクエストで再開する。
+        """
+        file_id = extract_file_id(url)
+        if not file_id:
+            raise GoogleDriveError(f"Google DriveのURLからファイルIDを取得できませんでした: {url}")
+        os.makedirs(self.partial_dir, exist_ok=True)
+        fd, partial_path = tempfile.mkstemp(prefix=f"gdrive_{file_id}_", suffix=".part", dir=self.partial_dir)
+        os.close(fd)
+
+        validator: Optional[Tuple[Optional[str], Optional[int]]] = None
+        last_error: Optional[Exception] = None
+        completed = False
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                if attempt > 1:
+                    time.sleep(self.backoff_seconds * (2 ** (attempt - 2)))
+                try:
+                    # 解決 (確認ページの取得) の失敗も、ダウンロードの失敗と同じく再試行する
+                    download_url = self.resolve(url)
+                    offset = os.path.getsize(partial_path)
+                    headers = {"Range": f"bytes={offset}-"} if offset else {}
+                    with self.session.get(download_url, stream=True, timeout=DEFAULT_TIMEOUT, headers=headers) as response:
+                        if response.status_code == 416:
+                            # 取得済みの部分がサーバー上のファイルと合わない。最初からダウンロードし直す
+                            _truncate(partial_path)
+                            validator = None
+                            raise GoogleDriveError(f"Range {offset}- が受け付けられませんでした (file_id={file_id})")
+                        response.raise_for_status()
+                        content_type = response.headers.get('content-type', '').lower()
+                        if 'text/html' in content_type:
+                            # 確認トークンの失効などでHTMLが返された場合は解決し直す
+                            self.invalidate(file_id)
+                            raise GoogleDriveError(f"Google DriveからHTMLが返されました (file_id={file_id})")
+
+                        current = _response_validator(response)
+                        resuming = response.status_code == 206 and offset > 0
+                        if resuming and (validator is None or not _same_file(validator, current)):
+                            # 前回の試行からファイルが差し替えられている。取得済みの部分は捨てて最初から
+                            _truncate(partial_path)
+                            validator = None
+                            raise GoogleDriveError(f"再開前とファイルが変わっているため、最初からダウンロードし直します (file_id={file_id})")
+                        if resuming:
+                            logger.info(f"Google Driveのダウンロードを {offset} バイト目から再開します: file_id={file_id}")
+                        else:
+                            validator = current
+                        with open(partial_path, 'ab' if resuming else 'wb') as f:
+                            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                                if chunk:
+                                    f.write(chunk)
+                    expected_size = validator[1]
+                    if expected_size is not None and os.path.getsize(partial_path) < expected_size:
+                        raise GoogleDriveError(f"ダウンロードが途中で終了しました ({os.path.getsize(partial_path)}/{expected_size} バイト)")
+                    completed = True
+                    return partial_path, content_type
+                except (requests.exceptions.RequestException, GoogleDriveError) as e:
+                    last_error = e
+                    logger.warning(f"Google Driveのダウンロードに失敗しました (試行 {attempt}/{self.max_attempts}): {e}")
+            raise GoogleDriveError(f"Google Driveのダウンロードに失敗しました: {url} ({last_error})")
+        finally:
+            if not completed and os.path.exists(partial_path):
+                os.remove(partial_path)
+
+
+def _truncate(path: str):
+    with open(path, 'wb'):
+        pass
@@ -0,0 +1,122 @@
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# (接続タイムアウト, 読み取りタイムアウト) 秒
+DEFAULT_TIMEOUT: Tuple[float, float] = (10, 60)
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+# 一時的なサーバーエラー。429はアプリケーション側 (RateLimitErrorなど) で扱うためここでは再試行しない
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+TimeoutType = Union[float, Tuple[float, float]]
+
+
+class _RequestCounter:
+    """ホスト別のリクエスト数をスレッドセーフに記録する。"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def increment(self, url: str):
+        host = urlparse(url).hostname or "unknown"
+        with self._lock:
+            self._counts[host] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+_request_counter = _RequestCounter()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    既定のタイムアウトとホスト別リクエスト数の記録を追加したHTTPAdapter。
+    再試行はurllib3のRetryに任せる。接続確立前のエラーはメソッドを問わず再試行され、
+    読み取りエラーやサーバーエラーによる再試行は冪等なメソッド (GET/PUT/DELETEなど) に限られる。
+    """
+    def __init__(self, timeout: TimeoutType = DEFAULT_TIMEOUT, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_maxsize: int = DEFAULT_POOL_MAXSIZE):
+        self.timeout = timeout
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        _request_counter.increment(request.url)
+        return super().send(request, **kwargs)
+
+
+def configure_session(session: requests.Session, timeout: TimeoutType = DEFAULT_TIMEOUT,
+                      max_retries: int = DEFAULT_MAX_RETRIES) -> requests.Session:
+    """既存のセッション (gspreadやtweepyが内部で作成したものなど) にプール・再試行・タイムアウト設定を適用する。"""
+    adapter = PooledHTTPAdapter(timeout=timeout, max_retries=max_retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def create_session(timeout: TimeoutType = DEFAULT_TIMEOUT, max_retries: int = DEFAULT_MAX_RETRIES) -> requests.Session:
+    """Keep-Alive・接続プール・再試行・既定タイムアウトを備えた新しいセッションを作成する。"""
+    return configure_session(requests.Session(), timeout=timeout, max_retries=max_retries)
+
+
+_shared_session: Optional[requests.Session] = None
+_shared_session_lock = threading.Lock()
+
+
+def get_shared_session() -> requests.Session:
+    """プロセス内で共有するセッションを取得する。同じホストへの接続はこのセッションのプールで再利用される。"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
+
+
+def create_child_session(parent: Optional[requests.Session] = None) -> requests.Session:
+    """
+    親セッションと同じアダプター (=接続プール) を共有する新しいセッションを作成する。
+    アカウントごとにレスポンスフックを設定したい場合など、プールを分けずにセッションを分けるために使う。
+    """
+    parent = parent or get_shared_session()
+    child = requests.Session()
+    child.adapters = parent.adapters
+    return child
+
+
+def get_request_counts() -> Dict[str, int]:
+    """このプロセスで送信したホスト別のリクエスト数を返す。"""
+    return _request_counter.snapshot()
+
+
+def log_request_counts():
+    counts = get_request_counts()
+    if not counts:
+        return
+    summary = ", ".join(f"{host}={count}" for host, count in sorted(counts.items()))
+    logger.info(f"HTTPリクエスト数 (ホスト別): {summary}")
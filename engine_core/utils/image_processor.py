@@ -0,0 +1,134 @@
+import hashlib
+import io
+import logging
+import os
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Twitterの画像アップロード上限 (5MB)
+DEFAULT_TARGET_BYTES = 5 * 1024 * 1024
+DEFAULT_MAX_EDGE = 4096
+DEFAULT_MAX_CACHE_FILES = 200
+# 目標サイズに収めるためにJPEG/WebPの品質を段階的に下げる際の候補
+QUALITY_STEPS = (90, 85, 80, 75, 70, 60)
+# 処理対象とする形式 (GIFはアニメーションを壊さないよう対象外)
+SUPPORTED_FORMATS = ("JPEG", "PNG", "WEBP")
+
+
+class ImageNormalizer:
+    """
+    アップロード前の画像を正規化するクラス。
+    長辺を max_edge 以下に縮小し、target_bytes 以下に再圧縮し、EXIFを除去する。
+    出力は元画像のハッシュと処理パラメータをキーとしてキャッシュディレクトリに保存し、再利用する。
+    """
+    def __init__(self, cache_dir: str, max_edge: int = DEFAULT_MAX_EDGE,
+                 target_bytes: int = DEFAULT_TARGET_BYTES, max_cache_files: int = DEFAULT_MAX_CACHE_FILES):
+        self.cache_dir = cache_dir
+        self.max_edge = max_edge
+        self.target_bytes = target_bytes
+        self.max_cache_files = max_cache_files
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _cache_key(self, source_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        digest.update(f"|{self.max_edge}|{self.target_bytes}".encode('ascii'))
+        return digest.hexdigest()
+
+    def _find_cached(self, key: str) -> Optional[str]:
+        for ext in ('.jpg', '.png', '.webp'):
+            path = os.path.join(self.cache_dir, key + ext)
+            if os.path.exists(path):
+                # 最近使われたものを残すため、更新日時を更新しておく
+                os.utime(path)
+                return path
+        return None
+
+    def _prune_cache(self):
+        try:
+            entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+            files = sorted((p for p in entries if os.path.isfile(p)), key=os.path.getmtime)
+            for path in files[:max(0, len(files) - self.max_cache_files)]:
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"画像キャッシュの整理に失敗しました: {e}")
+
+    def _needs_processing(self, image: Image.Image, source_size: int) -> bool:
+        width, height = image.size
+        return (
+            max(width, height) > self.max_edge
+            or source_size > self.target_bytes
+            or bool(image.info.get('exif'))
+        )
+
+    def _encode(self, image: Image.Image, image_format: str) -> Tuple[bytes, str]:
+        """target_bytes に収まるように画像をエンコードし、(データ, 拡張子) を返す。"""
+        if image_format == 'PNG':
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG', optimize=True)
+            data = buffer.getvalue()
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            if len(data) <= self.target_bytes or has_alpha:
+                return data, '.png'
+            # 透過のないPNGで目標サイズを超える場合はJPEGに変換する
+            image_format = 'JPEG'
+
+        save_format = 'WEBP' if image_format == 'WEBP' else 'JPEG'
+        if save_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        data = b''
+        for quality in QUALITY_STEPS:
+            buffer = io.BytesIO()
+            image.save(buffer, format=save_format, quality=quality, optimize=True)
+            data = buffer.getvalue()
+            if len(data) <= self.target_bytes:
+                break
+        return data, '.webp' if save_format == 'WEBP' else '.jpg'
+
+    def normalize(self, source_path: str) -> str:
+        """
+        画像を正規化し、アップロードに使用するファイルのパスを返す。
+        処理が不要な場合や対応していない形式の場合は元のパスをそのまま返す。
+        """
+        source_size = os.path.getsize(source_path)
+        try:
+            # Image.open はヘッダーのみを読み込むため、ここではまだデコードは行われない
+            with Image.open(source_path) as image:
+                image_format = image.format
+                if image_format not in SUPPORTED_FORMATS:
+                    logger.debug(f"画像形式 {image_format} は正規化の対象外です: {source_path}")
+                    return source_path
+                if not self._needs_processing(image, source_size):
+                    logger.debug(f"画像は正規化不要です ({image.size[0]}x{image.size[1]}, {source_size} bytes): {source_path}")
+                    return source_path
+
+                key = self._cache_key(source_path)
+                cached_path = self._find_cached(key)
+                if cached_path:
+                    logger.info(f"正規化済み画像のキャッシュを使用します: {cached_path}")
+                    return cached_path
+
+                if image_format == 'JPEG':
+                    # JPEGはデコード時にDCTスケーリングで縮小し、デコードコストを抑える
+                    image.draft('RGB', (self.max_edge, self.max_edge))
+                # EXIFの回転情報は画素に反映してから除去する
+                processed = ImageOps.exif_transpose(image)
+                processed.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+                data, ext = self._encode(processed, image_format)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            logger.warning(f"画像の正規化に失敗したため、元の画像を使用します: {source_path} ({e})")
+            return source_path
+
+        output_path = os.path.join(self.cache_dir, key + ext)
+        tmp_path = output_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, output_path)
+        self._prune_cache()
+        logger.info(f"画像を正規化しました: {source_size} bytes -> {len(data)} bytes ({output_path})")
+        return output_path
@@ -0,0 +1,41 @@
+import json
+import os
+import logging
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def read_json_file(path: str, label: str) -> Optional[Any]:
+    """
+    JSONファイルを読み込む。存在しない・空の場合は {} を返す。
+    壊れている・読み込めない場合は None を返す。呼び出し側は {} で上書きすると他の記録を消してしまうため、書き込みを見送ること。
+    :param label: ログに出すファイルの説明 (例: "レート制限記録ファイル")
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return json.loads(content) if content else {}
+    except (json.JSONDecodeError, IOError) as e:
+        logger.error(f"{label} '{path}' の読み込みに失敗しました: {e}", exc_info=True)
+        return None
+
+
+def write_json_file_atomic(path: str, data: Any, label: str, indent: Optional[int] = 4, sort_keys: bool = False) -> bool:
+    """
+    JSONを一時ファイルに書き出してから置き換える。書き込み中に異常終了しても、途中まで書かれたファイルは残らない。
+    書き込めた場合に True を返す。
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False, sort_keys=sort_keys)
+        os.replace(tmp_path, path)
+        return True
+    except (IOError, TypeError, ValueError) as e:
+        logger.error(f"{label} '{path}' の書き込みに失敗しました: {e}", exc_info=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
@@ -1,20 +1,176 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# setup_logging で設定済みの場合、get_logger はハンドラを追加せずルートのキューに任せる
+_listener: Optional[logging.handlers.QueueListener] = None
+_DEFAULT_HANDLER_ATTR = "_engine_default_handler"
+
 
 def get_logger(name: str, level=logging.INFO) -> logging.Logger:
     """
     指定された名前でロガーを取得し、基本的な設定を適用する。
+    setup_logging で設定済みの場合は、レベルとハンドラをルートの設定 (モジュールごとのレベルを含む) に任せる。
     """
     logger = logging.getLogger(name)
+    if _listener is not None:
+        return logger
     logger.setLevel(level)
 
     # 既にハンドラが設定されている場合は追加しない
     if not logger.handlers:
         handler = logging.StreamHandler(sys.stdout)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
+        formatter = logging.Formatter(LOG_FORMAT)
         handler.setFormatter(formatter)
+        setattr(handler, _DEFAULT_HANDLER_ATTR, True)
         logger.addHandler(handler)
 
-    return logger 
\ No newline at end of file
+    return logger
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """1件のログを1行のJSONに整形する (機械的な集計・検索用)。"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RepeatedMessageFilter(logging.Filter):
+    """
+    同じ呼び出し箇所 (ロガー・レベル・ファイル・行番号) から出るログを、window_seconds ごとに max_repeats 件までに抑える。
+    メッセージは f-string で組み立てるため本文では比較せず、試行回数やURLだけが違うログもまとめて抑える。
+    抑制した件数は、次の期間の最初のログに付記する。
+    """
+    def __init__(self, window_seconds: float = 60, max_repeats: int = 5):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.max_repeats = max_repeats
+        self._lock = threading.Lock()
+        # (ロガー名, レベル, ファイル, 行番号) -> [期間の開始時刻, 期間内の件数, 抑制した件数]
+        self._counters: Dict[Tuple[str, int, str, int], list] = {}
+        self._last_pruned = time.monotonic()
+
+    def _prune(self, now: float):
+        """期間が過ぎた呼び出し箇所を取り除く。抑制した件数が残っている箇所は、次のログに付記するまで残す。"""
+        if now - self._last_pruned < self.window_seconds:
+            return
+        self._last_pruned = now
+        expired = [key for key, counter in self._counters.items()
+                   if now - counter[0] >= self.window_seconds and not counter[2]]
+        for key in expired:
+            del self._counters[key]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            counter = self._counters.get(key)
+            if counter is None or now - counter[0] >= self.window_seconds:
+                suppressed = counter[2] if counter else 0
+                self._counters[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (直前の{self.window_seconds:g}秒間に同じ箇所のログを {suppressed} 件抑制しました)"
+                return True
+            counter[1] += 1
+            if counter[1] > self.max_repeats:
+                counter[2] += 1
+                return False
+            return True
+
+
+def _build_file_handler(logs_directory: str, settings: Dict[str, Any]) -> logging.Handler:
+    os.makedirs(logs_directory, exist_ok=True)
+    path = os.path.join(logs_directory, settings["file_name"])
+    if settings["rotation"] == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=settings["when"], backupCount=settings["backup_count"], encoding="utf-8", utc=True
+        )
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=settings["max_bytes"], backupCount=settings["backup_count"], encoding="utf-8"
+    )
+
+
+def setup_logging(level: int, logs_directory: Optional[str], settings: Dict[str, Any], file_logging: bool = True):
+    """
+    ルートロガーをキュー経由の非同期ログに設定する。
+    呼び出し元のスレッドはキューに積むだけで戻り、標準出力とローテートするログファイルへの書き込みはバックグラウンドのリスナーが行う。
+    :param level: ルートのログレベル
+    :param logs_directory: ログファイルを置くディレクトリ (common.logs_directory)
+    :param settings: Config.get_logging_settings() の戻り値
+    :param file_logging: False の場合はファイルに書き込まない (司令塔が標準出力を取り込むワーカーなど)
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonLinesFormatter() if settings["format"] == "json" else logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if file_logging and logs_directory:
+        handlers.append(_build_file_handler(logs_directory, settings))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if settings["rate_limit"]:
+        queue_handler.addFilter(RepeatedMessageFilter(**settings["rate_limit"]))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    # get_logger が先に追加した標準出力のハンドラを外し、ルートのキューとレベル設定に任せる
+    for existing in list(logging.Logger.manager.loggerDict.values()):
+        if not isinstance(existing, logging.Logger):
+            continue
+        default_handlers = [h for h in existing.handlers if getattr(h, _DEFAULT_HANDLER_ATTR, False)]
+        for handler in default_handlers:
+            existing.removeHandler(handler)
+        if default_handlers:
+            existing.setLevel(logging.NOTSET)
+
+    for module_name, module_level in settings["module_levels"].items():
+        logging.getLogger(module_name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """キューに残っているログを書き出してリスナーを止める。"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            root.removeHandler(handler)
+    _listener = None
@@ -0,0 +1,146 @@
+import logging
+import mimetypes
+import os
+import struct
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# 先頭バイトの判定に必要なバイト数 (ストリーミングダウンロードの最初のチャンクで足りる量)
+SNIFF_HEAD_SIZE = 64
+# ftypの直後に来る場合にQuickTime (MOV) と判断するメジャーブランド
+QUICKTIME_BRANDS = (b'qt  ',)
+# MP4 (M4V を含む) と判断するメジャーブランド。HEIC/HEIF/AVIF (heic, mif1, avif, msf1 など) も ftyp で始まるため、
+# 動画のブランドに限って判定し、それ以外は Content-Type と拡張子からの推測に任せる
+MP4_BRANDS = (
+    b'isom', b'iso2', b'iso3', b'iso4', b'iso5', b'iso6', b'mp41', b'mp42', b'mp71', b'avc1',
+    b'M4V ', b'M4VH', b'M4VP', b'dash', b'msnv', b'MSNV', b'XAVC', b'f4v ',
+)
+# 3GPP (携帯電話の動画) と判断するメジャーブランド。3gs*/3ge*/3gg* はストリーミング・拡張用のプロファイル
+THREE_GPP_BRANDS = (b'3gp4', b'3gp5', b'3gp6', b'3gp7', b'3gs7', b'3ge6', b'3ge7', b'3gg6')
+THREE_GPP2_BRANDS = (b'3g2a', b'3g2b', b'3g2c')
+# ftypを持たない古いQuickTimeファイルの先頭アトム
+QUICKTIME_LEADING_ATOMS = (b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot')
+
+
+class MediaType(NamedTuple):
+    """判定したメディアの種類と、Twitterへのアップロード方法"""
+    mime_type: str
+    extension: str
+    media_category: str  # tweet_image / tweet_gif / tweet_video
+    is_video: bool       # True の場合はチャンクアップロードを行う
+    frame_count: int = 1
+
+
+def count_gif_frames(data: bytes) -> int:
+    """GIFのブロック構造をたどって画像ブロック (フレーム) の数を数える。途中で切れている場合はそこまでの数を返す。"""
+    if len(data) < 13:
+        return 0
+    flags = data[10]
+    pos = 13
+    if flags & 0x80:
+        pos += 3 * (2 ** ((flags & 0x07) + 1))  # グローバルカラーテーブル
+    frames = 0
+    while pos < len(data):
+        block = data[pos]
+        if block == 0x3B:  # Trailer
+            break
+        if block == 0x21:  # Extension
+            pos += 2
+        elif block == 0x2C:  # Image Descriptor
+            frames += 1
+            if pos + 10 > len(data):
+                break
+            local_flags = data[pos + 9]
+            pos += 10
+            if local_flags & 0x80:
+                pos += 3 * (2 ** ((local_flags & 0x07) + 1))
+            pos += 1  # LZW最小コードサイズ
+        else:
+            break
+        # サブブロック列をスキップ
+        while pos < len(data):
+            size = data[pos]
+            pos += 1 + size
+            if size == 0:
+                break
+    return frames
+
+
+def sniff_media_type(data: bytes) -> Optional[MediaType]:
+    """
+    ファイル先頭のマジックバイトからメディアの種類を判定する。
+    JPEG/PNG/GIF/WebP/MP4/MOV/3GPに対応し、判定できない場合 (HEIC/AVIFなど動画以外の ftyp を含む) は None を返す。
+    GIFのフレーム数は渡されたデータ全体から数えるため、アニメーション判定には全体を渡すこと。
+    """
+    head = data[:SNIFF_HEAD_SIZE]
+    if head.startswith(b'\xff\xd8\xff'):
+        return MediaType('image/jpeg', '.jpg', 'tweet_image', False)
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return MediaType('image/png', '.png', 'tweet_image', False)
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        frames = count_gif_frames(data)
+        category = 'tweet_gif' if frames > 1 else 'tweet_image'
+        return MediaType('image/gif', '.gif', category, False, frames)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return MediaType('image/webp', '.webp', 'tweet_image', False)
+    if len(head) >= 12:
+        atom_type = head[4:8]
+        if atom_type == b'ftyp':
+            major_brand = head[8:12]
+            if major_brand in QUICKTIME_BRANDS:
+                return MediaType('video/quicktime', '.mov', 'tweet_video', True)
+            if major_brand in MP4_BRANDS:
+                return MediaType('video/mp4', '.mp4', 'tweet_video', True)
+            if major_brand in THREE_GPP_BRANDS:
+                return MediaType('video/3gpp', '.3gp', 'tweet_video', True)
+            if major_brand in THREE_GPP2_BRANDS:
+                return MediaType('video/3gpp2', '.3g2', 'tweet_video', True)
+            logger.debug(f"動画として扱わない ftyp のメジャーブランドです: {major_brand!r}")
+            return None
+        if atom_type in QUICKTIME_LEADING_ATOMS and struct.unpack('>I', head[:4])[0] >= 8:
+            return MediaType('video/quicktime', '.mov', 'tweet_video', True)
+    return None
+
+
+def looks_like_html(data: bytes) -> bool:
+    """ダウンロード結果がメディアではなくHTML (Google Driveの確認ページなど) かどうかを判定する。"""
+    head = data[:SNIFF_HEAD_SIZE].lstrip().lower()
+    return head.startswith(b'<!doctype html') or head.startswith(b'<html')
+
+
+def guess_media_type_from_headers(content_type: str, source_url: str) -> MediaType:
+    """マジックバイトで判定できなかった場合に、Content-Typeとファイル拡張子から推測する。"""
+    guessed_extension = mimetypes.guess_extension(content_type.split(';')[0])
+    base_file_name = os.path.basename(source_url.split('?')[0])
+    original_extension = os.path.splitext(base_file_name)[1].lower()
+    file_extension = guessed_extension or original_extension
+
+    if 'image/gif' in content_type:
+        return MediaType('image/gif', '.gif', 'tweet_gif', False)
+    if 'image/' in content_type:
+        return MediaType(content_type.split(';')[0], file_extension or '.jpg', 'tweet_image', False)
+    if 'video/' in content_type:
+        if file_extension == '.mov':
+            logger.warning("Content-Typeまたはファイル名が .mov (video/quicktime) です。Twitterでの互換性に注意してください。")
+        return MediaType(content_type.split(';')[0], file_extension or '.mp4', 'tweet_video', True)
+
+    logger.warning(f"Content-Typeが '{content_type}' のため、ファイル拡張子 '{original_extension}' から推測します。")
+    if original_extension in ('.mp4', '.mov'):
+        return MediaType('video/mp4' if original_extension == '.mp4' else 'video/quicktime', original_extension, 'tweet_video', True)
+    if original_extension == '.gif':
+        return MediaType('image/gif', '.gif', 'tweet_gif', False)
+    if original_extension not in ('.jpg', '.jpeg', '.png', '.webp'):
+        logger.warning(f"拡張子 '{original_extension}' からもメディアタイプを特定できませんでした。デフォルトで画像として扱います。")
+    return MediaType('image/jpeg', original_extension or '.jpg', 'tweet_image', False)
+
+
+def classify_media(data: bytes, content_type: str, source_url: str) -> MediaType:
+    """ダウンロードしたメディアの種類を判定する。マジックバイトを優先し、判定できない場合のみヘッダーから推測する。"""
+    sniffed = sniff_media_type(data)
+    if sniffed:
+        declared = content_type.split(';')[0]
+        if declared and declared != sniffed.mime_type:
+            logger.info(f"Content-Type '{declared}' を実データに基づき '{sniffed.mime_type}' と判定しました。")
+        return sniffed
+    return guess_media_type_from_headers(content_type, source_url)
@@ -0,0 +1,312 @@
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# iTunes形式 (meta/ilst) およびQuickTime形式 (udta直下) のコメントアトム名
+COMMENT_ATOM = b'\xa9cmt'
+# moovの直後にあってmoovの伸縮を吸収できるアトム
+PADDING_ATOMS = (b'free', b'skip')
+# チャンクオフセットを含むアトムまでの経路
+CONTAINER_PATH_TO_STBL = (b'trak', b'mdia', b'minf', b'stbl')
+# オフセットを絶対位置で持つため、moovの移動に追従できないアトム
+FRAGMENT_ATOMS = (b'moof', b'mfra')
+QUICKTIME_BRAND = b'qt  '
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class Mp4MetadataError(Exception):
+    """MP4/MOVのアトム構造を解析・編集できなかったことを示す例外"""
+
+
+class UnsupportedContainerError(Mp4MetadataError):
+    """このモジュールでは安全に編集できないコンテナであることを示す例外 (ffmpegへのフォールバック対象)"""
+
+
+def _iter_boxes(buf, start: int, end: int) -> Iterator[Tuple[bytes, int, int, int]]:
+    """buf[start:end] に含まれるアトムを (type, offset, size, header_size) で列挙する。"""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', buf, pos)
+        header_size = 8
+        if size == 1:
+            if pos + 16 > end:
+                raise Mp4MetadataError(f"64bitサイズのアトムヘッダーが途中で切れています (offset={pos})")
+            size = struct.unpack_from('>Q', buf, pos + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size or pos + size > end:
+            raise Mp4MetadataError(f"アトム '{box_type!r}' のサイズが不正です (offset={pos}, size={size})")
+        yield box_type, pos, size, header_size
+        pos += size
+
+
+def _make_box(box_type: bytes, payload: bytes) -> bytes:
+    size = 8 + len(payload)
+    if size > 0xFFFFFFFF:
+        return struct.pack('>I4sQ', 1, box_type, size + 8) + payload
+    return struct.pack('>I4s', size, box_type) + payload
+
+
+def _children(box: bytes, payload_offset: int) -> List[Tuple[bytes, bytes]]:
+    return [(t, box[o:o + s]) for t, o, s, _ in _iter_boxes(box, payload_offset, len(box))]
+
+
+def _header_size(box: bytes) -> int:
+    return 16 if struct.unpack_from('>I', box, 0)[0] == 1 else 8
+
+
+def _is_full_meta(meta_box: bytes) -> bool:
+    """metaアトムがISO形式 (version/flags付き) かQuickTime形式かを判定する。"""
+    header = _header_size(meta_box)
+    # ISO形式ではヘッダー直後に version/flags (通常0) が続き、子アトムのサイズとしては不正な値になる
+    return meta_box[header:header + 4] == b'\x00\x00\x00\x00'
+
+
+def _itunes_comment_item(comment: str) -> bytes:
+    # data アトム: 型指示子 1 (UTF-8) + ロケール 0
+    data = _make_box(b'data', struct.pack('>II', 1, 0) + comment.encode('utf-8'))
+    return _make_box(COMMENT_ATOM, data)
+
+
+def _quicktime_comment_item(comment: str) -> bytes:
+    text = comment.encode('utf-8')
+    # QuickTimeのユーザーデータ文字列: 16bit長 + 16bit言語コード (0x55C4 = 'und')
+    return _make_box(COMMENT_ATOM, struct.pack('>HH', len(text), 0x55C4) + text)
+
+
+def _metadata_handler() -> bytes:
+    # version/flags, pre_defined, handler_type='mdir', reserved='appl'+0+0, name=''
+    return _make_box(b'hdlr', b'\x00' * 8 + b'mdir' + b'appl' + b'\x00' * 8 + b'\x00')
+
+
+def _rebuild_ilst(ilst_box: Optional[bytes], comment: str) -> bytes:
+    items = []
+    if ilst_box is not None:
+        items = [raw for t, raw in _children(ilst_box, _header_size(ilst_box)) if t != COMMENT_ATOM]
+    items.append(_itunes_comment_item(comment))
+    return _make_box(b'ilst', b''.join(items))
+
+
+def _rebuild_meta(meta_box: Optional[bytes], comment: str) -> bytes:
+    if meta_box is None:
+        return _make_box(b'meta', b'\x00' * 4 + _metadata_handler() + _rebuild_ilst(None, comment))
+
+    header = _header_size(meta_box)
+    full_box = _is_full_meta(meta_box)
+    payload_offset = header + 4 if full_box else header
+    parts: List[bytes] = []
+    has_handler = False
+    has_ilst = False
+    for box_type, raw in _children(meta_box, payload_offset):
+        if box_type == b'hdlr':
+            has_handler = True
+            parts.append(raw)
+        elif box_type == b'ilst':
+            has_ilst = True
+            parts.append(_rebuild_ilst(raw, comment))
+        else:
+            parts.append(raw)
+    if not has_handler:
+        parts.insert(0, _metadata_handler())
+    if not has_ilst:
+        parts.append(_rebuild_ilst(None, comment))
+    prefix = meta_box[header:header + 4] if full_box else b''
+    return _make_box(b'meta', prefix + b''.join(parts))
+
+
+def _rebuild_udta(udta_box: Optional[bytes], comment: str, quicktime: bool) -> bytes:
+    parts: List[bytes] = []
+    has_meta = False
+    if udta_box is not None:
+        for box_type, raw in _children(udta_box, _header_size(udta_box)):
+            if box_type == COMMENT_ATOM:
+                # 既存のQuickTime形式コメントは置き換える
+                continue
+            if box_type == b'meta' and not quicktime:
+                has_meta = True
+                parts.append(_rebuild_meta(raw, comment))
+            else:
+                parts.append(raw)
+    if quicktime:
+        parts.append(_quicktime_comment_item(comment))
+    elif not has_meta:
+        parts.append(_rebuild_meta(None, comment))
+    return _make_box(b'udta', b''.join(parts))
+
+
+def _rebuild_moov(moov_box: bytes, comment: str, quicktime: bool) -> bytearray:
+    parts: List[bytes] = []
+    has_udta = False
+    for box_type, raw in _children(moov_box, _header_size(moov_box)):
+        if box_type == b'udta':
+            has_udta = True
+            parts.append(_rebuild_udta(raw, comment, quicktime))
+        else:
+            parts.append(raw)
+    if not has_udta:
+        parts.append(_rebuild_udta(None, comment, quicktime))
+    return bytearray(_make_box(b'moov', b''.join(parts)))
+
+
+def _find_stbl_boxes(moov: bytearray) -> Iterator[Tuple[int, int]]:
+    """moov内のstblアトムを (payload_offset, end) で列挙する。"""
+    def walk(start: int, end: int, depth: int) -> Iterator[Tuple[int, int]]:
+        for box_type, offset, size, header in _iter_boxes(moov, start, end):
+            if box_type != CONTAINER_PATH_TO_STBL[depth]:
+                continue
+            if depth == len(CONTAINER_PATH_TO_STBL) - 1:
+                yield offset + header, offset + size
+            else:
+                yield from walk(offset + header, offset + size, depth + 1)
+
+    yield from walk(_header_size(moov), len(moov), 0)
+
+
+def _shift_chunk_offsets(moov: bytearray, threshold: int, delta: int) -> None:
+    """stco/co64 のうち threshold 以降を指すチャンクオフセットを delta だけずらす。"""
+    for stbl_start, stbl_end in _find_stbl_boxes(moov):
+        for box_type, offset, _size, header in _iter_boxes(moov, stbl_start, stbl_end):
+            if box_type not in (b'stco', b'co64'):
+                continue
+            entry_count = struct.unpack_from('>I', moov, offset + header + 4)[0]
+            entries_offset = offset + header + 8
+            fmt, width = ('>I', 4) if box_type == b'stco' else ('>Q', 8)
+            for i in range(entry_count):
+                pos = entries_offset + i * width
+                value = struct.unpack_from(fmt, moov, pos)[0]
+                if value < threshold:
+                    continue
+                value += delta
+                if box_type == b'stco' and value > 0xFFFFFFFF:
+                    raise UnsupportedContainerError("チャンクオフセットが32bitに収まらなくなるため、stcoを書き換えられません。")
+                struct.pack_into(fmt, moov, pos, value)
+
+
+def _copy_range(mm: mmap.mmap, out, start: int, end: int) -> None:
+    for pos in range(start, end, COPY_CHUNK_SIZE):
+        out.write(mm[pos:min(pos + COPY_CHUNK_SIZE, end)])
+
+
+def _read_major_brand(buf, top_level: List[Tuple[bytes, int, int, int]]) -> Optional[bytes]:
+    for box_type, offset, size, header in top_level:
+        if box_type == b'ftyp' and size >= header + 4:
+            return bytes(buf[offset + header:offset + header + 4])
+    return None
+
+
+def set_comment(path: str, comment: str) -> str:
+    """
+    MP4/MOVファイルのコメントメタデータ (©cmt) をプロセス内で書き換える。
+    moovが末尾にある場合や直後のfree/skipアトムで伸縮を吸収できる場合はファイルをその場で更新し、
+    mdatを移動させる必要がある場合のみ、チャンクオフセットを補正した上でファイル全体を書き直す。
+    戻り値は実行した書き換え方法 ('append' / 'in_place' / 'rewrite')。
+    """
+    file_size = os.path.getsize(path)
+    if file_size < 8:
+        raise UnsupportedContainerError(f"ファイルが小さすぎるためMP4として解析できません: {path}")
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        try:
+            top_level = list(_iter_boxes(mm, 0, file_size))
+        except Mp4MetadataError as e:
+            raise UnsupportedContainerError(f"トップレベルのアトム構造を解析できません: {e}") from e
+
+        major_brand = _read_major_brand(mm, top_level)
+        if major_brand is None:
+            raise UnsupportedContainerError("ftypアトムが見つからないため、MP4/MOVではないと判断しました。")
+        moov_entries = [entry for entry in top_level if entry[0] == b'moov']
+        if len(moov_entries) != 1:
+            raise UnsupportedContainerError(f"moovアトムの数が想定外です ({len(moov_entries)}個)。")
+        has_fragments = any(entry[0] in FRAGMENT_ATOMS for entry in top_level)
+
+        moov_index = top_level.index(moov_entries[0])
+        _, moov_offset, moov_size, _ = moov_entries[0]
+        old_moov_end = moov_offset + moov_size
+        try:
+            new_moov = _rebuild_moov(bytes(mm[moov_offset:old_moov_end]), comment,
+                                     quicktime=(major_brand == QUICKTIME_BRAND))
+        except struct.error as e:
+            raise Mp4MetadataError(f"moovアトムの解析に失敗しました: {e}") from e
+        delta = len(new_moov) - moov_size
+
+        # 1. moovが最後のアトム: 切り詰めて追記するだけで済む (mdatは動かない)
+        if moov_index == len(top_level) - 1:
+            mode = 'append'
+        else:
+            # 2. 直後のfree/skipでサイズ差を吸収できれば、その場で書き換える
+            next_type, _, next_size, _ = top_level[moov_index + 1]
+            slack = next_size if next_type in PADDING_ATOMS else 0
+            remaining = slack - delta
+            if delta == 0 or (slack and (remaining == 0 or remaining >= 8)):
+                mode = 'in_place'
+            else:
+                mode = 'rewrite'
+
+        if mode == 'rewrite':
+            if has_fragments:
+                raise UnsupportedContainerError("フラグメント化MP4 (moof) のオフセット補正には対応していません。")
+            _shift_chunk_offsets(new_moov, old_moov_end, delta)
+            dir_name = os.path.dirname(os.path.abspath(path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.mp4meta_', dir=dir_name)
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    _copy_range(mm, out, 0, moov_offset)
+                    out.write(new_moov)
+                    _copy_range(mm, out, old_moov_end, file_size)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+
+    if mode == 'append':
+        with open(path, 'r+b') as f:
+            f.truncate(moov_offset)
+            f.seek(moov_offset)
+            f.write(new_moov)
+    elif mode == 'in_place':
+        with open(path, 'r+b') as f:
+            f.seek(moov_offset)
+            f.write(new_moov)
+            if remaining >= 8:
+                # 残りをfreeアトムとして書き戻し、後続アトムの位置を維持する
+                f.write(struct.pack('>I4s', remaining, b'free'))
+    else:
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+
+    logger.debug(f"MP4コメントメタデータを更新しました: {path} (方式: {mode}, moovサイズ差: {delta:+d})")
+    return mode
+
+
+def read_comment(path: str) -> Optional[str]:
+    """MP4/MOVファイルのコメントメタデータ (©cmt) を読み出す。見つからない場合は None。"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    for box_type, offset, size, header in _iter_boxes(data, 0, len(data)):
+        if box_type != b'moov':
+            continue
+        moov = data[offset:offset + size]
+        for udta_type, udta in _children(moov, header):
+            if udta_type != b'udta':
+                continue
+            for item_type, item in _children(udta, _header_size(udta)):
+                if item_type == COMMENT_ATOM:
+                    length = struct.unpack_from('>H', item, 8)[0]
+                    return item[12:12 + length].decode('utf-8')
+                if item_type != b'meta':
+                    continue
+                payload_offset = _header_size(item) + (4 if _is_full_meta(item) else 0)
+                for ilst_type, ilst in _children(item, payload_offset):
+                    if ilst_type != b'ilst':
+                        continue
+                    for entry_type, entry in _children(ilst, _header_size(ilst)):
+                        if entry_type == COMMENT_ATOM:
+                            # data アトム: ヘッダー8 + 型指示子4 + ロケール4
+                            return entry[8 + 16:].decode('utf-8')
+    return None
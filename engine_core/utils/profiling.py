@@ -0,0 +1,84 @@
+import cProfile
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 0.005
+PROFILES_DIRECTORY = "profiles"
+
+
+class StackSampler:
+    """
+    一定間隔で全スレッドのスタックを採取し、フレームグラフ用の collapsed 形式 ('スレッド;関数;関数 件数') で集計する。
+    cProfile は呼び出し元と呼び出し先の組しか記録しないため、スタック全体はこちらで採取する。
+    """
+    def __init__(self, interval_seconds: float = DEFAULT_SAMPLE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}")
+                    frame = frame.f_back
+                frames.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def write_collapsed(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiling_session(logs_directory: str, label: str,
+                      interval_seconds: float = DEFAULT_SAMPLE_INTERVAL_SECONDS) -> Iterator[None]:
+    """
+    ブロックの実行を cProfile (決定的・呼び出したスレッドのみ) とスタックの採取 (サンプリング・全スレッド) の両方で計測し、
+    '<logs_directory>/profiles/<時刻>_<label>_<pid>.pstats' と '.collapsed.txt' に書き出す。
+    """
+    directory = os.path.join(logs_directory, PROFILES_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+    safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label)
+    base_path = os.path.join(directory, f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}_{safe_label}_{os.getpid()}")
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler(interval_seconds)
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        try:
+            profiler.dump_stats(f"{base_path}.pstats")
+            sampler.write_collapsed(f"{base_path}.collapsed.txt")
+            logger.info(f"プロファイルを書き出しました: {base_path}.pstats / {base_path}.collapsed.txt")
+        except IOError as e:
+            logger.error(f"プロファイルの書き出しに失敗しました ({base_path}): {e}", exc_info=True)
@@ -0,0 +1,72 @@
+import unicodedata
+from typing import Dict, List, Optional
+
+# 埋め込みの description の上限 (4096文字) からコードブロックの囲みとページ表記の分を引いた、1ページの最大文字数
+MAX_PAGE_CHARS = 3900
+COLUMN_SEPARATOR = "  "
+CODE_FENCE = "```"
+
+
+def display_width(text: str) -> int:
+    """等幅フォントでの表示幅を返す。全角文字と絵文字は2、結合文字と異体字セレクタは0として数える。"""
+    width = 0
+    for char in text:
+        if unicodedata.combining(char) or 0xFE00 <= ord(char) <= 0xFE0F or char == "\u200d":
+            continue
+        width += 2 if unicodedata.east_asian_width(char) in ("W", "F") or ord(char) >= 0x1F000 else 1
+    return width
+
+
+def _clean_cell(value: Optional[str]) -> str:
+    # コードブロック内ではバッククォートと改行が表を崩すため取り除く
+    return str(value if value is not None else "").replace("`", "").replace("\n", " ").strip() or "─"
+
+
+def render_table_lines(headers: List[str], rows: List[List[str]]) -> List[str]:
+    """ヘッダーと各行を、列の表示幅を揃えたテキストの行に変換する。先頭2行はヘッダーと区切り線。"""
+    cells = [[_clean_cell(h) for h in headers]] + [[_clean_cell(c) for c in row] for row in rows]
+    widths = [max(display_width(row[i]) for row in cells) for i in range(len(headers))]
+
+    def format_row(row: List[str]) -> str:
+        return COLUMN_SEPARATOR.join(cell + " " * (width - display_width(cell)) for cell, width in zip(row, widths)).rstrip()
+
+    lines = [format_row(cells[0]), COLUMN_SEPARATOR.join("-" * width for width in widths)]
+    lines.extend(format_row(row) for row in cells[1:])
+    return lines
+
+
+def render_table_pages(headers: List[str], rows: List[List[str]], max_page_chars: int = MAX_PAGE_CHARS) -> List[str]:
+    """
+    表をコードブロックのページに分割する。各ページにはヘッダーを繰り返し、max_page_chars 文字に収まるだけ行を詰める。
+    行が1つもない場合はヘッダーのみのページを1つ返す。
+    """
+    lines = render_table_lines(headers, rows)
+    header_lines, body_lines = lines[:2], lines[2:]
+    overhead = len(CODE_FENCE) * 2 + 2 + sum(len(line) + 1 for line in header_lines)
+
+    pages: List[List[str]] = []
+    current: List[str] = []
+    current_size = overhead
+    for line in body_lines:
+        line = line[:max_page_chars - overhead - 1]  # 1行でページに収まらない場合は切り詰める
+        if current and current_size + len(line) + 1 > max_page_chars:
+            pages.append(current)
+            current, current_size = [], overhead
+        current.append(line)
+        current_size += len(line) + 1
+    if current or not pages:
+        pages.append(current)
+    return [f"{CODE_FENCE}\n" + "\n".join(header_lines + page) + f"\n{CODE_FENCE}" for page in pages]
+
+
+def diff_rows(previous: Dict[str, List[str]], current: Dict[str, List[str]], removed_label: str = "削除") -> Dict[str, List[str]]:
+    """
+    前回通知した行 (キーごと) と比べて、変化した行・新しい行・なくなった行を返す。
+    なくなった行は、先頭以外の列を removed_label で埋めた行として返す。
+    """
+    changed = {key: row for key, row in current.items() if previous.get(key) != row}
+    column_count = len(next(iter(current.values()), None) or next(iter(previous.values()), None) or [])
+    for key in previous:
+        if key not in current:
+            changed[key] = [key] + [removed_label] * max(0, column_count - 1)
+    return changed
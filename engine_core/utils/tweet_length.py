@@ -0,0 +1,68 @@
+import re
+import unicodedata
+
+# twitter-text (v3) の設定に準拠した重み付き文字数
+MAX_WEIGHTED_LENGTH = 280
+DEFAULT_WEIGHT = 200
+SCALE = 100
+# URLは実際の長さに関わらず t.co に短縮された長さで数えられる
+TRANSFORMED_URL_LENGTH = 23
+# 重み 100 (=1文字) として数えるコードポイントの範囲。それ以外 (CJKや絵文字など) は2文字として数える
+LIGHT_RANGES = (
+    (0, 4351),        # Latin〜Georgian など
+    (8192, 8205),     # 一般句読点の一部 (空白類)
+    (8208, 8223),     # ハイフン・引用符
+    (8242, 8247),     # プライム記号
+)
+
+URL_PATTERN = re.compile(r'https?://[^\s　]+|www\.[^\s　]+', re.IGNORECASE)
+
+# 絵文字は複数のコードポイントから成るもの (ZWJ結合・肌の色・異体字セレクタ・キーキャップ・国旗・タグ) も
+# まとめて1つとして、重み 200 (=2文字) で数える (twitter-text v3 と同じ)
+_EMOJI_ELEMENT = (
+    r'(?:[\u2190-\u2bff\u3030\u303d\u3297\u3299\U0001f000-\U0001faff][\ufe0f\U0001f3fb-\U0001f3ff]?'
+    r'|[\u00a9\u00ae\u203c\u2049\u2122\u2139]\ufe0f'
+    r'|[0-9#*]\ufe0f?\u20e3)'
+    r'[\U000e0020-\U000e007f]*'
+)
+EMOJI_PATTERN = re.compile(
+    r'[\U0001f1e6-\U0001f1ff]{2}|' + _EMOJI_ELEMENT + r'(?:\u200d' + _EMOJI_ELEMENT + r')*'
+)
+
+
+def _char_weight(char: str) -> int:
+    code_point = ord(char)
+    for start, end in LIGHT_RANGES:
+        if start <= code_point <= end:
+            return SCALE
+    return DEFAULT_WEIGHT
+
+
+def _segment_weight(segment: str) -> int:
+    total = 0
+    position = 0
+    for match in EMOJI_PATTERN.finditer(segment):
+        total += sum(_char_weight(c) for c in segment[position:match.start()])
+        total += DEFAULT_WEIGHT
+        position = match.end()
+    return total + sum(_char_weight(c) for c in segment[position:])
+
+
+def weighted_length(text: str) -> int:
+    """
+    Twitterの文字数制限で使われる重み付き文字数を返す。
+    NFC正規化した上で、CJKや絵文字 (結合された絵文字も1つとして) は2、Latin文字などは1、URLは長さに関わらず23として数える。
+    """
+    text = unicodedata.normalize('NFC', text or '')
+    total = 0
+    position = 0
+    for match in URL_PATTERN.finditer(text):
+        total += _segment_weight(text[position:match.start()])
+        total += TRANSFORMED_URL_LENGTH * SCALE
+        position = match.end()
+    total += _segment_weight(text[position:])
+    return total // SCALE
+
+
+def is_within_limit(text: str) -> bool:
+    return weighted_length(text) <= MAX_WEIGHTED_LENGTH
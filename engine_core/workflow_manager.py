@@ -4,14 +4,33 @@ import json
 import subprocess
 import sys
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import atexit
+import signal
+import threading
 
-from .config import Config
+from .config import Config, ConfigChanges
 from .utils.logging_utils import get_logger
 from .spreadsheet_manager import SpreadsheetManager
 from .discord_notifier import DiscordNotifier
 from .scheduler.scheduled_post_executor import ScheduledPostExecutor
+from .scheduler.media_preparer import MediaPreparer
+from .scheduler.fanout_executor import FanoutPostExecutor
+from .scheduler.due_check import read_last_post_times
+from .rate_limit_tracker import RateLimitTracker
+from .post_ledger import PostLedger
+from .credential_checker import CredentialChecker
+from .duplicate_index import DuplicateContentIndex
+from .circuit_breaker import CircuitBreaker, ACCOUNT_ERROR_CLASSES, ERROR_MEDIA, STATE_OPEN, STATE_HALF_OPEN
+from .tweet_purger import TweetPurger, load_targets_from_file, load_targets_from_ledger
+from .utils.status_table import diff_rows
+from .utils.http_session import get_request_counts
+from . import metrics
+from .twitter_client import RateLimitError
+from .notification_digest import (
+    NotificationDigest, format_digest, OUTCOME_POSTED, OUTCOME_SKIPPED, OUTCOME_FAILED, OUTCOME_RATE_LIMITED,
+    ERROR_RATE_LIMIT, ERROR_OTHER,
+)
 
 logger = get_logger(__name__)
 
@@ -20,11 +39,15 @@ class WorkflowManager:
     投稿ワークフロー全体を管理するクラス。
     司令塔として機能し、投稿タイミングの判断、ワーカープロセスの起動、通知を行う。
     """
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, profile_workers: bool = False):
         self.config = config
+        self.profile_workers = profile_workers # True の場合、起動するワーカーにも --profile を付ける
         self.logs_dir = self.config.get("common.logs_directory", "logs")
         os.makedirs(self.logs_dir, exist_ok=True)
         self.lock_file_path = os.path.join(self.logs_dir, "commander.lock")
+        self._lock_held = False
+        # 常駐モード (run_resident) を止めるためのイベント (SIGTERM・Ctrl+C で設定する)
+        self._stop_event = threading.Event()
 
         schedule_settings = self.config.get_schedule_config()
         if not schedule_settings:
@@ -34,26 +57,158 @@ class WorkflowManager:
         if not last_post_times_filename:
             raise ValueError("Configに最終投稿時刻ファイル (last_post_times_file) の設定がありません。")
         self.last_post_times_path = os.path.join(self.logs_dir, last_post_times_filename)
+        # 前回Discordに通知したステータス表の内容 (status_table_mode: diff で差分のみを送るために使う)
+        self.status_snapshot_path = os.path.join(self.logs_dir, schedule_settings.get("status_snapshot_file", "status_snapshot.json"))
+
+        # メディアの事前準備 (投稿予定時刻の media_prepare_lead_minutes 分前からアップロードを済ませておく)
+        self.media_prepare_lead_minutes = self.config.get_media_prepare_lead_minutes()
+        self.media_preparer = None
+        if self.media_prepare_lead_minutes:
+            prepared_media_filename = schedule_settings.get("prepared_media_file", "prepared_media.json")
+            self.media_preparer = MediaPreparer(store_path=os.path.join(self.logs_dir, prepared_media_filename))
+            logger.info(f"メディアの事前準備を有効化しました (リードタイム: {self.media_prepare_lead_minutes}分)。")
+
+        # アカウント・エンドポイント別のレート制限の残り回数 (全レスポンスのヘッダーから記録)
+        rate_limit_filename = schedule_settings.get("rate_limit_file", "rate_limits.json")
+        self.rate_limit_tracker = RateLimitTracker(store_path=os.path.join(self.logs_dir, rate_limit_filename))
+        self.rate_limit_reserve = schedule_settings.get("rate_limit_reserve", 0)
+
+        # 投稿したツイートIDの台帳 (一括削除 --purge の対象になる)
+        posted_tweets_filename = schedule_settings.get("posted_tweets_file", "posted_tweets.jsonl")
+        self.post_ledger = PostLedger(path=os.path.join(self.logs_dir, posted_tweets_filename))
+
+        # 認証情報の事前確認 (無効なアカウントはTTLの間、シート読み込みなどの前に除外する)
+        self.credential_checker = None
+        credential_check_ttl_minutes = self.config.get_credential_check_ttl_minutes()
+        if credential_check_ttl_minutes:
+            credential_check_filename = schedule_settings.get("credential_check_file", "credential_checks.json")
+            self.credential_checker = CredentialChecker(
+                store_path=os.path.join(self.logs_dir, credential_check_filename),
+                ttl_seconds=credential_check_ttl_minutes * 60
+            )
+
+        # 認証・重複・メディアの失敗が続くアカウントを一定時間投稿対象から外すサーキットブレーカー
+        self.circuit_breaker = None
+        breaker_settings = self.config.get_circuit_breaker_settings()
+        if breaker_settings:
+            self.circuit_breaker = CircuitBreaker(
+                store_path=os.path.join(self.logs_dir, breaker_settings["state_file"]),
+                failure_threshold=breaker_settings["failure_threshold"],
+                base_open_seconds=breaker_settings["base_open_minutes"] * 60,
+                max_open_seconds=breaker_settings["max_open_minutes"] * 60
+            )
+
+        # 直近に投稿した本文の索引 (重複として拒否される行を候補選択の時点で除外する)
+        duplicate_index = None
+        duplicate_window_hours = self.config.get_duplicate_window_hours()
+        if duplicate_window_hours:
+            duplicate_index_filename = schedule_settings.get("duplicate_index_file", "duplicate_index.json")
+            duplicate_index = DuplicateContentIndex(
+                store_path=os.path.join(self.logs_dir, duplicate_index_filename),
+                window_hours=duplicate_window_hours
+            )
 
         # コアコンポーネントの初期化
-        self.spreadsheet_manager = SpreadsheetManager(config=self.config)
+        self.spreadsheet_manager = SpreadsheetManager(config=self.config, duplicate_index=duplicate_index)
         self.post_executor = ScheduledPostExecutor(
             config=self.config,
-            spreadsheet_manager=self.spreadsheet_manager
+            spreadsheet_manager=self.spreadsheet_manager,
+            media_preparer=self.media_preparer,
+            rate_limit_tracker=self.rate_limit_tracker,
+            rate_limit_reserve=self.rate_limit_reserve,
+            post_ledger=self.post_ledger,
+            credential_checker=self.credential_checker,
+            circuit_breaker=self.circuit_breaker
         )
         
-        discord_webhook_url = self.config.get_discord_webhook_url()
-        if discord_webhook_url:
-            self.notifier = DiscordNotifier(webhook_url=discord_webhook_url)
+        discord_webhook_urls = self.config.get_discord_webhook_urls()
+        if discord_webhook_urls:
+            outbox_settings = self.config.get_discord_outbox_settings()
+            if outbox_settings:
+                # 通知はアウトボックスに積んでバックグラウンドで送信し、終了時に期限付きで送り切る
+                self.notifier = DiscordNotifier(
+                    webhook_url=discord_webhook_urls,
+                    outbox_dir=os.path.join(self.logs_dir, outbox_settings["directory"]),
+                    drain_timeout_seconds=outbox_settings["drain_timeout_seconds"]
+                )
+                atexit.register(self.notifier.close)
+            else:
+                self.notifier = DiscordNotifier(webhook_url=discord_webhook_urls)
             logger.info("Discord通知クライアントを初期化しました。")
         else:
             self.notifier = None
             logger.info("Discord Webhook URLが設定されていないため、通知は行われません。")
 
+        # 投稿ごとの通知をまとめ、一定時間ごとに1件のサマリーとして送る (immediate_error_classes の失敗のみすぐに通知)
+        self.notification_digest = None
+        self.immediate_error_classes = set()
+        digest_settings = self.config.get_notification_digest_settings()
+        if digest_settings and self.notifier:
+            self.notification_digest = NotificationDigest(
+                path=os.path.join(self.logs_dir, digest_settings["state_file"]),
+                window_seconds=digest_settings["window_seconds"]
+            )
+            self.immediate_error_classes = digest_settings["immediate_error_classes"]
+            logger.info(f"投稿結果のまとめ通知を有効化しました (期間: {digest_settings['window_seconds'] // 60}分)。")
+
+        # 実行ごとのメトリクスを累積値に加算して保存し、Prometheus のテキストファイルに書き出す (常駐モードでは /metrics でも公開)
+        self.metrics_store = None
+        self.metrics_settings = self.config.get_metrics_settings()
+        self.metrics_server = None
+        self._exported_request_counts: Dict[str, int] = {}
+        if self.metrics_settings:
+            self.metrics_store = metrics.MetricsStore(
+                path=os.path.join(self.logs_dir, self.metrics_settings["store_file"]),
+                textfile_path=os.path.join(self.logs_dir, self.metrics_settings["textfile"])
+            )
+
         logger.info("WorkflowManager初期化完了。")
 
+    def _start_metrics_endpoint(self):
+        """
+        常駐モード (run_resident) でのみ /metrics の HTTP エンドポイントを起動する。
+        ワーカーや1回で終わる実行では起動しない (司令塔がポートを使っている間にワーカーが起動しても衝突しないように)。
+        """
+        if self.metrics_server or not self.metrics_store or not self.metrics_settings["http_port"]:
+            return
+        try:
+            self.metrics_server = metrics.start_metrics_server(
+                self.metrics_store, self.metrics_settings["http_port"], host=self.metrics_settings["http_host"]
+            )
+        except OSError as e:
+            logger.error(f"メトリクスの HTTP エンドポイントを起動できませんでした: {e}")
+
+    def export_metrics(self, mode: str):
+        """
+        前回の書き出し以降に加算したメトリクス (ホスト別のHTTPリクエスト数を含む) を累積値に加算して書き出す。
+        常駐モードでは1回の処理ごとに呼び出す。
+        """
+        if not self.metrics_store:
+            return
+        metrics.inc("runs_total", mode=mode)
+        # リクエスト数はプロセス全体の累計のため、前回書き出した分との差だけを加算する
+        request_counts = get_request_counts()
+        for host, count in request_counts.items():
+            delta = count - self._exported_request_counts.get(host, 0)
+            if delta:
+                metrics.inc("http_requests_total", delta, host=host)
+        self._exported_request_counts = request_counts
+        metrics.flush_to_store(self.metrics_store)
+
+    def _on_config_changed(self, changes: ConfigChanges):
+        """設定の再読み込みで変わったアカウントを、作成済みのクライアントに反映する (実行中の投稿はそのまま続ける)。"""
+        self.post_executor.apply_config_changes(changes)
+        if changes and self.notifier:
+            self.notifier.send_simple_notification(
+                title="🔄 設定を再読み込みしました",
+                description=f"追加: {', '.join(changes.added) or 'なし'}\n削除: {', '.join(changes.removed) or 'なし'}\n変更: {', '.join(changes.changed) or 'なし'}",
+                color=0x95A5A6 # Gray
+            )
+
     def _acquire_lock(self) -> bool:
-        """ロックファイルを作成して処理の多重実行を防ぐ。"""
+        """ロックファイルを作成して処理の多重実行を防ぐ。常駐モードで既にロックを持っている場合はそのまま True を返す。"""
+        if self._lock_held:
+            return True
         if os.path.exists(self.lock_file_path):
             logger.warning("ロックファイルが既に存在します。他の司令塔プロセスが実行中の可能性があります。処理を中止します。")
             return False
@@ -62,6 +217,7 @@ class WorkflowManager:
                 f.write(str(os.getpid()))
             # プロセス終了時にロックファイルを確実に削除する
             atexit.register(self._release_lock)
+            self._lock_held = True
             logger.info(f"ロックを取得しました: {self.lock_file_path}")
             return True
         except IOError as e:
@@ -79,32 +235,7 @@ class WorkflowManager:
 
     def _read_last_post_times(self) -> Dict[str, datetime]:
         """最終投稿時刻を記録したJSONファイルを読み込む。"""
-        if not os.path.exists(self.last_post_times_path):
-            return {}
-        try:
-            with open(self.last_post_times_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                if not content:
-                    return {}
-                data = json.loads(content)
-            
-            last_times: Dict[str, datetime] = {}
-            for acc_id, time_str in data.items():
-                try:
-                    # ISO 8601形式の文字列をdatetimeオブジェクト（タイムゾーン情報付き）に変換
-                    if isinstance(time_str, str):
-                        # オプション: 'Z'で終わる古い形式にも対応
-                        if time_str.endswith('Z'):
-                            time_str = time_str[:-1] + '+00:00'
-                        last_times[acc_id] = datetime.fromisoformat(time_str)
-                    else:
-                        logger.warning(f"アカウント {acc_id} の最終投稿時刻 '{time_str}' の形式が不正です（文字列ではありません）。")
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"アカウント {acc_id} の最終投稿時刻 '{time_str}' のパースに失敗しました。スキップします。エラー: {e}")
-            return last_times
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"最終投稿時刻ファイル '{self.last_post_times_path}' の読み込みに失敗しました: {e}", exc_info=True)
-            return {} # エラー発生時は空の辞書を返す
+        return read_last_post_times(self.last_post_times_path)
 
     def _write_last_post_times(self, last_times: Dict[str, datetime]):
         """最終投稿時刻をJSONファイルに書き込む。"""
@@ -115,6 +246,36 @@ class WorkflowManager:
         except IOError as e:
             logger.error(f"最終投稿時刻ファイル '{self.last_post_times_path}' の書き込みに失敗しました: {e}", exc_info=True)
 
+    def _exclude_quarantined_accounts(self, active_accounts: List[Dict[str, any]]) -> List[Dict[str, any]]:
+        """認証情報の事前確認 (キャッシュが切れたアカウントのみ並列に確認) で無効と判定されたアカウントを除外する。"""
+        if not self.credential_checker:
+            return active_accounts
+        credential_results = self.credential_checker.check_accounts(active_accounts, self.post_executor.get_twitter_client)
+        quarantined = [account_id for account_id, valid in credential_results.items() if valid is False]
+        if quarantined:
+            logger.warning(f"認証情報が無効なため隔離中のアカウントを除外します: {', '.join(quarantined)}")
+        return [account for account in active_accounts if account["account_id"] not in quarantined]
+
+    def _find_due_accounts(self, active_accounts: List[Dict[str, any]], last_post_times: Dict[str, datetime],
+                           interval_hours: int, now_utc: datetime) -> List[Tuple[Dict[str, any], datetime]]:
+        """投稿間隔が経過し、回路が開いておらずレート制限の残りもあるアカウントを (アカウント, 最終投稿日時) で返す。"""
+        accounts_to_post_candidates: List[Tuple[Dict[str, any], datetime]] = []
+        for account in active_accounts:
+            account_id = account["account_id"]
+            last_post_time = last_post_times.get(account_id, datetime.min.replace(tzinfo=timezone.utc))
+
+            if now_utc >= last_post_time + timedelta(hours=interval_hours):
+                if self.circuit_breaker and not self.circuit_breaker.allows(account_id):
+                    _, error_class, open_until = self.circuit_breaker.get_state(account_id, ACCOUNT_ERROR_CLASSES)
+                    logger.warning(f"アカウント '{account_id}' は回路 '{error_class}' が開いているため、今回は見送ります (再試行可能: {datetime.fromtimestamp(open_until, tz=timezone.utc).isoformat()})。")
+                    continue
+                wait_seconds = self.rate_limit_tracker.seconds_until_available(account_id, "create_tweet", self.rate_limit_reserve)
+                if wait_seconds > 0:
+                    logger.warning(f"アカウント '{account_id}' は create_tweet の残り回数が尽きているため、今回は見送ります (リセットまで約{wait_seconds}秒)。")
+                    continue
+                accounts_to_post_candidates.append((account, last_post_time))
+        return accounts_to_post_candidates
+
     def launch_pending_posts(self):
         """
         [司令塔機能] 投稿時間になったアカウントを検出し、ワーカープロセスを起動する。
@@ -124,6 +285,7 @@ class WorkflowManager:
             return
             
         logger.info("司令塔プロセス開始: 投稿時間になったアカウントのワーカーを起動します。")
+        self._send_digest_if_due()
         
         interval_hours = self.config.get_post_interval_hours()
         if not interval_hours:
@@ -135,19 +297,18 @@ class WorkflowManager:
             logger.info("処理対象のアクティブなアカウントがありません。")
             return
 
+        active_accounts = self._exclude_quarantined_accounts(active_accounts)
+        if not active_accounts:
+            logger.info("認証情報が有効なアクティブアカウントがありません。")
+            return
+
         last_post_times = self._read_last_post_times()
         now_utc = datetime.now(timezone.utc)
-        
-        accounts_to_post_candidates: List[Tuple[Dict[str, any], datetime]] = []
-        for account in active_accounts:
-            account_id = account["account_id"]
-            last_post_time = last_post_times.get(account_id, datetime.min.replace(tzinfo=timezone.utc))
-
-            if now_utc >= last_post_time + timedelta(hours=interval_hours):
-                accounts_to_post_candidates.append((account, last_post_time))
+        accounts_to_post_candidates = self._find_due_accounts(active_accounts, last_post_times, interval_hours, now_utc)
 
         if not accounts_to_post_candidates:
             logger.info("現時点で投稿対象となるアカウントはありません。")
+            self._prepare_upcoming_posts(active_accounts, last_post_times, interval_hours)
             return
 
         # 最終投稿日時が最も古いアカウントを1つだけ選ぶ
@@ -177,6 +338,8 @@ class WorkflowManager:
             if self.config.config_path:
                 command.extend(["--config", self.config.config_path])
             command.extend(["--worker", account_id])
+            if self.profile_workers:
+                command.append("--profile")
 
             logger.info(f"ワーカープロセスを起動します: `{' '.join(command)}`")
             
@@ -198,10 +361,181 @@ class WorkflowManager:
         except Exception as e:
             logger.error(f"ワーカープロセス `main.py --worker {account_id}` の起動自体に失敗: {e}", exc_info=True)
 
+        self._prepare_upcoming_posts(active_accounts, last_post_times, interval_hours)
+        logger.info("司令塔プロセスを終了します。")
+
+    def run_resident(self, interval_seconds: float):
+        """
+        [常駐モード] 司令塔の処理 (launch_pending_posts) を interval_seconds ごとに繰り返す。
+        ロックは最初に1回だけ取得し、/metrics の HTTP エンドポイントと設定ファイルの監視はこのプロセスだけが持つ。
+        SIGTERM または Ctrl+C で、実行中の1回分が終わってから停止する。
+        """
+        if not self._acquire_lock():
+            return
+        self._start_metrics_endpoint()
+        # 設定ファイルを監視し、アカウントの追加・無効化を再起動なしに反映する
+        # (ワーカーや1回で終わる実行でも監視すると、同じ変更をプロセスごとに通知してしまうため、常駐モードのみ)
+        config_watch_interval = self.config.get_config_watch_interval_seconds()
+        if config_watch_interval:
+            self.config.start_watching(self._on_config_changed, interval_seconds=config_watch_interval)
+
+        def request_stop(signum, frame):
+            logger.info(f"シグナル {signum} を受け取りました。実行中の処理が終わり次第、常駐モードを終了します。")
+            self._stop_event.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        logger.info(f"常駐モードを開始します ({interval_seconds:g}秒ごとに司令塔の処理を実行)。")
+        while not self._stop_event.is_set():
+            try:
+                self.launch_pending_posts()
+            except Exception as e:
+                # 1回分の失敗で常駐を止めない
+                logger.error(f"常駐モードの司令塔の処理でエラーが発生しました: {e}", exc_info=True)
+            self.export_metrics(mode="serve")
+            self._stop_event.wait(interval_seconds)
+        self.config.stop_watching()
+        logger.info("常駐モードを終了します。")
+
+    def launch_pending_posts_async(self):
+        """
+        [司令塔機能・非同期版] 投稿時間になった全アカウントを、ワーカープロセスを起動せずに
+        1つのイベントループ (AsyncPostingEngine) で並行して投稿する。アカウント数が多い場合向け。
+        """
+        # aiohttp は任意の依存関係のため、非同期版を使う場合のみ読み込む
+        from .async_engine import AsyncPostingEngine, AsyncEngineUnavailableError, classify_outcome_error
+
+        if not self._acquire_lock():
+            return
+
+        logger.info("司令塔プロセス開始 (非同期): 投稿時間になった全アカウントの投稿を並行して行います。")
+
+        interval_hours = self.config.get_post_interval_hours()
+        if not interval_hours:
+            logger.error("投稿間隔時間 (post_interval_hours) が設定されていないため、処理を中止します。")
+            return
+
+        active_accounts = self.config.get_active_twitter_accounts()
+        if not active_accounts:
+            logger.info("処理対象のアクティブなアカウントがありません。")
+            return
+
+        active_accounts = self._exclude_quarantined_accounts(active_accounts)
+        if not active_accounts:
+            logger.info("認証情報が有効なアクティブアカウントがありません。")
+            return
+
+        last_post_times = self._read_last_post_times()
+        now_utc = datetime.now(timezone.utc)
+        accounts_to_post = [account for account, _ in self._find_due_accounts(active_accounts, last_post_times, interval_hours, now_utc)]
+        if not accounts_to_post:
+            logger.info("現時点で投稿対象となるアカウントはありません。")
+            return
+
+        # 投稿できない状態で最終投稿日時を更新すると、そのアカウントが1周期分スキップされるため、先に接続とエンジンを確認する
+        if self.spreadsheet_manager.gspread_client is None:
+            logger.error("Google Sheets に接続できていないため、非同期投稿を中止します。")
+            return
+
+        async_settings = self.config.get_async_engine_settings()
+        try:
+            engine = AsyncPostingEngine(
+                config=self.config,
+                spreadsheet_manager=self.spreadsheet_manager,
+                rate_limit_tracker=self.rate_limit_tracker,
+                post_ledger=self.post_ledger,
+                circuit_breaker=self.circuit_breaker,
+                image_normalizer=self.post_executor.image_normalizer,
+                drive_resolver=self.post_executor.drive_resolver,
+                # まとめ通知が有効な場合は全体の結果を送らず、アカウントごとの結果をまとめ通知に記録する
+                notifier=None if self.notification_digest else self.notifier,
+                max_connections_per_host=async_settings["max_connections_per_host"],
+                host_limits=async_settings["host_limits"],
+            )
+        except AsyncEngineUnavailableError as e:
+            logger.error(f"非同期エンジンを使用できないため、非同期投稿を中止します: {e}")
+            return
+
+        # 投稿対象アカウント全件の最終投稿日時を先に更新（ロック）
+        for account in accounts_to_post:
+            last_post_times[account["account_id"]] = now_utc
+        self._write_last_post_times(last_post_times)
+        logger.info(f"{len(accounts_to_post)} アカウントの最終投稿日時を更新しました。")
+
+        results = engine.run(accounts_to_post)
+        succeeded = sum(1 for outcome in results.values() if isinstance(outcome, str))
+        for account_id, outcome in results.items():
+            if isinstance(outcome, str):
+                self._record_post_outcome(account_id, OUTCOME_POSTED, mode="async")
+            elif outcome is None:
+                self._record_post_outcome(account_id, OUTCOME_SKIPPED, mode="async")
+            else:
+                error_class = classify_outcome_error(outcome)
+                self._record_post_outcome(account_id, OUTCOME_RATE_LIMITED if error_class == ERROR_RATE_LIMIT else OUTCOME_FAILED,
+                                          error_class, mode="async")
+                if self.notifier and self.notification_digest and error_class in self.immediate_error_classes:
+                    self.notifier.send_simple_notification(
+                        title=f"⚠️ 非同期投稿失敗: `{account_id}`",
+                        description=f"アカウント `{account_id}` の投稿処理でエラーが発生しました ({error_class})。詳細はログを確認してください。",
+                        color=0xE74C3C # Red
+                    )
+        self._send_digest_if_due()
+        logger.info(f"非同期投稿が完了しました: {succeeded}/{len(results)} アカウントで投稿成功。")
         logger.info("司令塔プロセスを終了します。")
 
+    def _prepare_upcoming_posts(self, active_accounts: List[Dict[str, any]], last_post_times: Dict[str, datetime], interval_hours: int):
+        """投稿予定時刻がリードタイム内に迫っているアカウントのメディアを事前にアップロードする。"""
+        if not self.media_preparer:
+            return
+
+        now_utc = datetime.now(timezone.utc)
+        lead = timedelta(minutes=self.media_prepare_lead_minutes)
+        for account in active_accounts:
+            account_id = account["account_id"]
+            last_post_time = last_post_times.get(account_id)
+            if not last_post_time:
+                continue
+            due_at = last_post_time + timedelta(hours=interval_hours)
+            if not (now_utc < due_at <= now_utc + lead):
+                continue
+            if self.circuit_breaker and not self.circuit_breaker.allows(account_id):
+                continue
+
+            worksheet_name = account.get("google_sheets_source", {}).get("worksheet_name")
+            if not worksheet_name:
+                continue
+            logger.info(f"アカウント '{account_id}' の投稿予定時刻 ({due_at.isoformat()}) が近いため、メディアを事前準備します。")
+            try:
+                self.post_executor.prepare_post(account_id, worksheet_name)
+            except Exception as e:
+                # 事前準備の失敗は投稿時に通常経路で再試行されるため、ここでは記録のみ
+                logger.warning(f"アカウント '{account_id}' のメディア事前準備に失敗しました: {e}", exc_info=True)
+
+    def _read_status_snapshot(self) -> Dict[str, List[str]]:
+        """前回通知したステータス表の行 (アカウントIDごと) を読み込む。"""
+        if not os.path.exists(self.status_snapshot_path):
+            return {}
+        try:
+            with open(self.status_snapshot_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            return json.loads(content) if content else {}
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"ステータス表の記録ファイル '{self.status_snapshot_path}' の読み込みに失敗しました: {e}", exc_info=True)
+            return {}
+
+    def _write_status_snapshot(self, rows: Dict[str, List[str]]):
+        try:
+            with open(self.status_snapshot_path, 'w', encoding='utf-8') as f:
+                json.dump(rows, f, indent=4, ensure_ascii=False)
+        except IOError as e:
+            logger.error(f"ステータス表の記録ファイル '{self.status_snapshot_path}' の書き込みに失敗しました: {e}", exc_info=True)
+
     def _notify_status_to_discord(self, accounts_to_post, active_accounts):
-        """現在の全アカウントのステータスをDiscordにテーブル形式で通知する。"""
+        """
+        現在の全アカウントのステータスをDiscordにテーブル形式で通知する。
+        status_table_mode が diff の場合は、前回の通知から状態が変わったアカウントのみを送る。
+        """
         if not self.notifier:
             return
             
@@ -209,16 +543,17 @@ class WorkflowManager:
         interval_hours = self.config.get_post_interval_hours()
         title = f"🚀 {len(accounts_to_post)}件の並列投稿を開始"
         headers = ["アカウント", "ステータス", "最終投稿 (JST)", "次回投稿予定 (JST)"]
-        table_data = []
+        rows: Dict[str, List[str]] = {}
 
         # この時点での最新の最終投稿時刻を再読み込みして正確な情報を表示
         current_last_post_times = self._read_last_post_times()
+        posting_account_ids = {acc["account_id"] for acc in accounts_to_post}
 
         for account in active_accounts:
             account_id = account["account_id"]
             last_post_time_utc = current_last_post_times.get(account_id)
             
-            is_posting_now = any(acc["account_id"] == account_id for acc in accounts_to_post)
+            is_posting_now = account_id in posting_account_ids
             
             status = ""
             if is_posting_now:
@@ -228,6 +563,17 @@ class WorkflowManager:
             else:
                 status = "✅ 初回待機"
 
+            if self.circuit_breaker and not is_posting_now:
+                breaker_state, error_class, open_until = self.circuit_breaker.get_state(account_id, ACCOUNT_ERROR_CLASSES)
+                media_state, _, media_open_until = self.circuit_breaker.get_state(account_id, (ERROR_MEDIA,))
+                if breaker_state == STATE_OPEN:
+                    status = f"⛔ 停止中 ({error_class}, {datetime.fromtimestamp(open_until, tz=timezone.utc).astimezone(jst).strftime('%H:%M')}まで)"
+                elif breaker_state == STATE_HALF_OPEN:
+                    status = f"🔶 試行待ち ({error_class})"
+                elif media_state == STATE_OPEN:
+                    # メディアの回路はテキストのみの行の投稿を止めないため、待機中の表示と区別する
+                    status = f"🖼️ メディア停止中 ({datetime.fromtimestamp(media_open_until, tz=timezone.utc).astimezone(jst).strftime('%H:%M')}まで)"
+
             last_post_str = last_post_time_utc.astimezone(jst).strftime('%m-%d %H:%M') if last_post_time_utc else "─"
             
             next_post_str = "─"
@@ -235,17 +581,30 @@ class WorkflowManager:
                 next_post_due_utc = last_post_time_utc + timedelta(hours=interval_hours)
                 next_post_str = next_post_due_utc.astimezone(jst).strftime('%m-%d %H:%M')
             
-            table_data.append([f"`{account_id}`", status, f"`{last_post_str}`", f"`{next_post_str}`"])
-        
+            rows[account_id] = [account_id, status, last_post_str, next_post_str]
+
+        rows_to_send = rows
+        if self.config.get_status_table_mode() == "diff":
+            rows_to_send = diff_rows(self._read_status_snapshot(), rows)
+            title = f"{title} (変更 {len(rows_to_send)}/{len(rows)} アカウント)"
+        if not rows_to_send:
+            logger.info("前回の通知からステータスが変わったアカウントがないため、ステータス表は送信しません。")
+            return
+
         # 実行中のアカウントが先頭に来るようにソート
-        table_data.sort(key=lambda row: not row[1].startswith("▶️"))
+        table_data = sorted(rows_to_send.values(), key=lambda row: not row[1].startswith("▶️"))
 
-        self.notifier.send_status_table(
+        sent = self.notifier.send_status_table(
             title=title,
             headers=headers,
             data=table_data,
             color=0x2ECC71 # Green
         )
+        # 送信できなかった変更を次回の差分に含めるため、前回の通知内容は送信できた (アウトボックスに積めた) 場合のみ更新する
+        if sent:
+            self._write_status_snapshot(rows)
+        else:
+            logger.warning("ステータス表を送信できなかったため、前回の通知内容を更新せず次回に再送します。")
 
     def execute_worker_post(self, account_id: str):
         """
@@ -275,7 +634,8 @@ class WorkflowManager:
             tweet_id = self.post_executor.execute_post(scheduled_post)
             if tweet_id:
                 logger.info(f"ワーカー処理成功。アカウント '{account_id}' の投稿が完了しました。Tweet ID: {tweet_id}")
-                if self.notifier:
+                self._record_worker_outcome(account_id, OUTCOME_POSTED)
+                if self.notifier and not self.notification_digest:
                     self.notifier.send_simple_notification(
                         title=f"✅ 投稿成功: `{account_id}`",
                         description=f"Tweet ID: `{tweet_id}`",
@@ -284,7 +644,8 @@ class WorkflowManager:
             else:
                 # 投稿に至らなかった場合（例：投稿可能な記事がない）
                 logger.warning(f"ワーカー処理は正常に完了しましたが、アカウント '{account_id}' の投稿は実行されませんでした（条件未達）。")
-                if self.notifier:
+                self._record_worker_outcome(account_id, OUTCOME_SKIPPED)
+                if self.notifier and not self.notification_digest:
                     self.notifier.send_simple_notification(
                         title=f"🤔 投稿スキップ: `{account_id}`",
                         description="投稿可能な記事が見つからなかったため、今回の処理はスキップされました。",
@@ -292,17 +653,54 @@ class WorkflowManager:
                     )
         except Exception as e:
             logger.error(f"ワーカー処理中に予期せぬエラーが発生しました (アカウント: {account_id}): {e}", exc_info=True)
-            if self.notifier:
+            error_class = self._classify_worker_error(account_id, e)
+            self._record_worker_outcome(account_id, OUTCOME_RATE_LIMITED if error_class == ERROR_RATE_LIMIT else OUTCOME_FAILED, error_class)
+            if self.notifier and (not self.notification_digest or error_class in self.immediate_error_classes):
                 self.notifier.send_simple_notification(
                     title=f"⚠️ ワーカー処理失敗: `{account_id}`",
-                    description=f"アカウント `{account_id}` の投稿処理でエラーが発生しました。詳細はログを確認してください。",
+                    description=f"アカウント `{account_id}` の投稿処理でエラーが発生しました ({error_class})。詳細はログを確認してください。",
                     color=0xE74C3C # Red
                 )
             # エラーを再送出し、呼び出し元（main.py）に失敗を伝播させる
             raise
         finally:
+            self._send_digest_if_due()
             logger.info(f"--- ワーカー完了 (アカウントID: {account_id}) ---")
 
+    def _classify_worker_error(self, account_id: str, error: Exception) -> str:
+        """ワーカーの失敗を、まとめ通知とすぐに通知するかの判断に使う分類に変換する。"""
+        if isinstance(error, RateLimitError):
+            return ERROR_RATE_LIMIT
+        client = self.post_executor.twitter_clients.get(account_id)
+        if client and client.error_classes:
+            return sorted(client.error_classes)[0]
+        return ERROR_OTHER
+
+    def _record_worker_outcome(self, account_id: str, outcome: str, error_class: str = None):
+        self._record_post_outcome(account_id, outcome, error_class, mode="worker",
+                                  phase_seconds=self.post_executor.last_phase_seconds)
+
+    def _record_post_outcome(self, account_id: str, outcome: str, error_class: str = None, mode: str = "worker",
+                             phase_seconds: Optional[Dict[str, float]] = None):
+        """投稿結果をメトリクスとまとめ通知 (有効な場合) に記録する。"""
+        metrics.inc("posts_total", outcome=outcome, mode=mode)
+        for phase, seconds in (phase_seconds or {}).items():
+            metrics.observe("post_phase_seconds", seconds, phase=phase)
+        if self.notification_digest:
+            self.notification_digest.record(account_id, outcome, error_class=error_class, phase_seconds=phase_seconds)
+
+    def _send_digest_if_due(self):
+        """まとめ通知の期間が過ぎていれば、記録した投稿結果を1件のサマリーとしてDiscordに送る。"""
+        if not self.notification_digest:
+            return
+        summary = self.notification_digest.take_if_due()
+        if not summary:
+            return
+        title, description = format_digest(summary)
+        has_failures = summary["counts"][OUTCOME_FAILED] or summary["counts"][OUTCOME_RATE_LIMITED]
+        self.notifier.send_simple_notification(title=title, description=description,
+                                               color=0xE67E22 if has_failures else 0x3498DB)
+
     def run_manual_test_post(self, account_id: str):
         """
         [手動テスト機能] 指定されたアカウントで投稿を一件テスト実行する。
@@ -359,4 +757,80 @@ class WorkflowManager:
                     color=0xE74C3C # Red
                 )
         finally:
-            logger.info(f"--- 手動テスト投稿完了 (アカウントID: {account_id}) ---")
\ No newline at end of file
+            logger.info(f"--- 手動テスト投稿完了 (アカウントID: {account_id}) ---")
+
+    def run_fanout(self, worksheet_name: str) -> Dict[str, Dict[str, any]]:
+        """
+        [グループ投稿機能] ワークシートの投稿先グループ列が入っている行を1件選び、グループ内の全アカウントに投稿する。
+        メディアのダウンロードと加工は1回だけ行い、各アカウントへのアップロードと投稿は並列に行う。
+        """
+        logger.info(f"--- グループ投稿開始 (ワークシート: {worksheet_name}) ---")
+        executor = FanoutPostExecutor(self.post_executor, max_concurrent_accounts=self.config.get_fanout_max_concurrent_accounts())
+        results = executor.execute_fanout(worksheet_name)
+        if not results:
+            print(f"\nワークシート '{worksheet_name}' にグループ投稿できる行がありませんでした。")
+            return results
+
+        print("\n--- グループ投稿サマリー ---")
+        for account_id, result in results.items():
+            if result["tweet_id"]:
+                print(f"  ✅ {account_id}: Tweet ID {result['tweet_id']}")
+            else:
+                print(f"  {'⏭️' if result.get('skipped') else '❌'} {account_id}: {result['error']}")
+
+        succeeded = sum(1 for r in results.values() if r["tweet_id"])
+        for r in results.values():
+            outcome_name = OUTCOME_POSTED if r["tweet_id"] else (OUTCOME_SKIPPED if r.get("skipped") else OUTCOME_FAILED)
+            metrics.inc("posts_total", outcome=outcome_name, mode="fanout")
+        if self.notifier:
+            lines = [f"`{account_id}`: " + (f"Tweet ID `{r['tweet_id']}`" if r["tweet_id"] else f"{'見送り' if r.get('skipped') else '失敗'} ({r['error']})")
+                     for account_id, r in results.items()]
+            self.notifier.send_simple_notification(
+                title=f"📣 グループ投稿完了 ({succeeded}/{len(results)} アカウント)",
+                description="\n".join(lines)[:4000],
+                color=0x2ECC71 if succeeded == len(results) else 0xE74C3C
+            )
+        logger.info(f"--- グループ投稿完了: {succeeded}/{len(results)} アカウントで成功 ---")
+        return results
+
+    def run_purge(self, targets_file: str = None, account_ids: List[str] = None, older_than_days: int = None) -> Dict[str, Dict[str, int]]:
+        """
+        [一括削除機能] 投稿台帳 (または targets_file) に記録されたツイートをアカウント横断で削除する。
+        中断しても、削除済みのツイートは進捗ファイルに記録されているため再実行で続きから処理される。
+        """
+        logger.info("--- 一括削除開始 ---")
+        if targets_file:
+            targets = load_targets_from_file(targets_file)
+            logger.info(f"削除対象ファイル '{targets_file}' から {len(targets)} 件を読み込みました。")
+        else:
+            targets = load_targets_from_ledger(self.post_ledger, older_than_days=older_than_days)
+            logger.info(f"投稿台帳 '{self.post_ledger.path}' から {len(targets)} 件を読み込みました。")
+        if account_ids:
+            targets = [t for t in targets if t["account_id"] in account_ids]
+
+        purge_settings = self.config.get_purge_settings()
+        purger = TweetPurger(
+            client_factory=self.post_executor.get_twitter_client,
+            progress_path=os.path.join(self.logs_dir, purge_settings["progress_file"]),
+            rate_limit_tracker=self.rate_limit_tracker,
+            delete_interval_seconds=purge_settings["delete_interval_seconds"],
+            max_concurrent_accounts=purge_settings["max_concurrent_accounts"]
+        )
+        results = purger.purge(targets)
+
+        totals = {key: sum(r.get(key, 0) for r in results.values()) for key in ("deleted", "failed", "skipped", "already_done")}
+        print("\n--- 一括削除サマリー ---")
+        for account_id, result in sorted(results.items()):
+            print(f"  {account_id}: 削除 {result['deleted']} / 失敗 {result['failed']} / 未処理 {result['skipped']} / 完了済み {result.get('already_done', 0)}")
+        print(f"  合計: 削除 {totals['deleted']} / 失敗 {totals['failed']} / 未処理 {totals['skipped']} / 完了済み {totals['already_done']}")
+        if totals["skipped"]:
+            print("  未処理のツイートは、再度 --purge を実行すると続きから削除されます。")
+
+        if self.notifier and results:
+            self.notifier.send_simple_notification(
+                title="🗑️ 一括削除完了",
+                description=f"削除: {totals['deleted']} 件 / 失敗: {totals['failed']} 件 / 未処理: {totals['skipped']} 件",
+                color=0xE74C3C if totals["failed"] else 0x2ECC71
+            )
+        logger.info(f"--- 一括削除完了: {totals} ---")
+        return results
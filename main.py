@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import contextlib
 import logging
 import os
 from datetime import datetime, date, timedelta, timezone
@@ -18,9 +19,12 @@ if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
 # パス設定後、必要なモジュールをインポート
+# WorkflowManager (gspread・tweepy・requests などを読み込む) は実際に処理する場合のみ main() の中で読み込み、
+# 投稿対象がない司令塔の実行や --help を速くする
 from engine_core.utils.file_utils import get_project_root # これはもう不要かもしれないが、念のため
 from engine_core.config import Config
-from engine_core.workflow_manager import WorkflowManager
+from engine_core.scheduler.due_check import has_pending_work
+from engine_core.utils.logging_utils import setup_logging
 
 # ロガーのグローバル設定は main() の中で Config からレベルを取得した後に行う
 logger = logging.getLogger(__name__) 
@@ -43,7 +47,7 @@ def _get_manual_test_account_info(config_instance: Config, target_account_id: st
         return None, None
     account_found = False
     for acc in all_twitter_accounts:
-        if isinstance(acc, dict) and acc.get("account_id") == target_account_id:
+        if acc.get("account_id") == target_account_id:
             account_found = True
             if not acc.get("enabled", True):
                 logger.error(f"指定されたアカウントID '{target_account_id}' は設定で無効化されています。")
@@ -92,6 +96,61 @@ def _delete_manual_test_executed_log(executed_log_path: str):
 
 # --- ここまでヘルパー関数 ---
 
+MODE_OPTIONS = ("process", "process_async", "serve", "worker", "manual_test", "fanout", "purge")
+
+def _selected_mode_name(args: argparse.Namespace) -> str:
+    return next(name for name in MODE_OPTIONS if getattr(args, name))
+
+def _run_selected_mode(args: argparse.Namespace, config: Config):
+    """指定された実行モードを1つ実行する。"""
+    if args.process and not has_pending_work(config):
+        # 投稿対象・事前準備・送信待ちの通知がなければ、Googleへの認証などを行わずに終了する
+        logger.info("モード: --process (司令塔) - 現時点で処理対象はありません。")
+        return
+
+    from engine_core.workflow_manager import WorkflowManager
+    from engine_core.utils.http_session import log_request_counts
+
+    # 司令塔をプロファイルする場合は、起動するワーカーもプロファイルする
+    manager = WorkflowManager(config=config, profile_workers=args.profile)
+    try:
+        _dispatch_mode(args, manager)
+    finally:
+        # 失敗した実行の分もメトリクスに残す (常駐モードは1回の処理ごとに書き出し済み)
+        if not args.serve:
+            manager.export_metrics(mode=_selected_mode_name(args))
+
+    log_request_counts()
+    logger.info("システムメイン処理を正常に終了しました。")
+
+def _dispatch_mode(args: argparse.Namespace, manager):
+    """指定された実行モードの処理を WorkflowManager で実行する。"""
+    if args.process:
+        logger.info("モード: --process (司令塔)")
+        manager.launch_pending_posts()
+    elif args.process_async:
+        logger.info("モード: --process-async (司令塔・非同期)")
+        manager.launch_pending_posts_async()
+    elif args.serve:
+        logger.info("モード: --serve (常駐する司令塔)")
+        manager.run_resident(interval_seconds=manager.config.get_serve_interval_seconds())
+    elif args.worker:
+        logger.info(f"モード: --worker (アカウントID: {args.worker})")
+        manager.execute_worker_post(args.worker)
+    elif args.manual_test:
+        logger.info(f"モード: --manual-test (アカウントID: {args.manual_test})")
+        manager.run_manual_test_post(args.manual_test)
+    elif args.fanout:
+        logger.info(f"モード: --fanout (ワークシート: {args.fanout})")
+        manager.run_fanout(args.fanout)
+    elif args.purge:
+        logger.info("モード: --purge (一括削除)")
+        manager.run_purge(
+            targets_file=args.purge_file,
+            account_ids=args.purge_account,
+            older_than_days=args.purge_older_than_days
+        )
+
 def main():
     # --- 引数パーサーの設定 ---
     parser = argparse.ArgumentParser(description="Twitter自動投稿ボット")
@@ -111,6 +170,16 @@ def main():
         action="store_true",
         help="投稿時間になったアカウントの投稿処理を（司令塔として）起動します。"
     )
+    parser.add_argument(
+        "--process-async",
+        action="store_true",
+        help="投稿時間になった全アカウントの投稿を、ワーカーを起動せず1プロセスで並行して行います (aiohttp が必要)。"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="常駐して --process の処理を common.serve_interval_seconds ごとに繰り返します (設定ファイルの監視と /metrics の公開はこのモードのみ)。"
+    )
     parser.add_argument(
         "--manual-test",
         type=str,
@@ -123,7 +192,42 @@ def main():
         metavar="ACCOUNT_ID",
         help="（内部用）指定したアカウントの投稿処理をワーカーとして実行します。"
     )
+    parser.add_argument(
+        "--fanout",
+        type=str,
+        metavar="WORKSHEET",
+        help="ワークシートの投稿先グループ列が入っている行を1件選び、グループ (auto_post_bot.account_groups) の全アカウントに投稿します。"
+    )
+    parser.add_argument(
+        "--purge",
+        action="store_true",
+        help="投稿台帳 (logs/posted_tweets.jsonl) に記録されたツイートを一括削除します。中断した場合は再実行で続きから処理します。"
+    )
+    parser.add_argument(
+        "--purge-file",
+        type=str,
+        metavar="PATH",
+        help="--purge の削除対象を投稿台帳ではなくファイル (1行に 'account_id,tweet_id' またはJSON) から読み込みます。"
+    )
+    parser.add_argument(
+        "--purge-account",
+        type=str,
+        action="append",
+        metavar="ACCOUNT_ID",
+        help="--purge の対象を指定したアカウントに限定します (複数指定可)。"
+    )
+    parser.add_argument(
+        "--purge-older-than-days",
+        type=int,
+        metavar="DAYS",
+        help="--purge の対象を指定日数より前に投稿したツイートに限定します (投稿台帳から読み込む場合のみ)。"
+    )
     parser.add_argument("--debug", action="store_true", help="デバッグログを有効にします (Config設定を上書き)。")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="実行をプロファイルし、logs/profiles に pstats とフレームグラフ用の collapsed 形式のファイルを書き出します (司令塔の場合はワーカーも対象)。"
+    )
 
     args = parser.parse_args()
 
@@ -131,10 +235,11 @@ def main():
     try:
         # 指定された設定ファイルを使用
         config = Config(config_path=args.config)
-        log_level_str = config.get_log_level()
+        log_level_str = "DEBUG" if args.debug else config.get_log_level()
         numeric_log_level = getattr(logging, log_level_str.upper(), logging.INFO)
-        logging.basicConfig(level=numeric_log_level,
-                            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        # ログはキューに積んでバックグラウンドで書き出す。ワーカーの出力は司令塔が取り込んでファイルに書くため、ワーカーは標準出力のみ
+        setup_logging(numeric_log_level, config.get_logs_directory(), config.get_logging_settings(),
+                      file_logging=not args.worker)
         logger.info(f"Configから取得したログレベル '{log_level_str}' を設定しました。")
     except FileNotFoundError:
         print(f"エラー: 指定された設定ファイルが見つかりません: {args.config}")
@@ -148,28 +253,34 @@ def main():
     if args.process and args.manual_test:
         parser.error("--process と --manual-test は同時に指定できません。")
 
-    if not args.process and not args.manual_test and not args.worker:
-        logger.warning("実行モードが指定されていません。--process, --manual-test, --worker のいずれかを指定してください。")
-        parser.print_help()
-        exit(0)
+    if args.process_async and (args.process or args.manual_test or args.worker):
+        parser.error("--process-async は他の実行モードと同時に指定できません。")
 
-    try:
-        # AppConfigの初期化はここで行う
-        config = Config(config_path=args.config)
-        manager = WorkflowManager(config=config)
+    if args.fanout and (args.process or args.process_async or args.manual_test or args.worker):
+        parser.error("--fanout は他の実行モードと同時に指定できません。")
 
-        if args.process:
-            logger.info("モード: --process (司令塔)")
-            manager.launch_pending_posts()
-        elif args.worker:
-            logger.info(f"モード: --worker (アカウントID: {args.worker})")
-            manager.execute_worker_post(args.worker)
-        elif args.manual_test:
-            logger.info(f"モード: --manual-test (アカウントID: {args.manual_test})")
-            manager.run_manual_test_post(args.manual_test)
+    if args.purge and (args.process or args.process_async or args.manual_test or args.worker or args.fanout):
+        parser.error("--purge は他の実行モードと同時に指定できません。")
 
-        logger.info("システムメイン処理を正常に終了しました。")
+    if args.serve and sum(1 for name in MODE_OPTIONS if getattr(args, name)) > 1:
+        parser.error("--serve は他の実行モードと同時に指定できません。")
 
+    if not any(getattr(args, name) for name in MODE_OPTIONS):
+        logger.warning("実行モードが指定されていません。--process, --process-async, --serve, --manual-test, --worker, --fanout, --purge のいずれかを指定してください。")
+        parser.print_help()
+        exit(0)
+
+    profile_context = contextlib.nullcontext()
+    if args.profile:
+        from engine_core.utils.profiling import profiling_session
+        mode_name = _selected_mode_name(args)
+        mode_value = getattr(args, mode_name)
+        mode_label = f"{mode_name}_{mode_value}" if isinstance(mode_value, str) else mode_name
+        profile_context = profiling_session(config.get_logs_directory() or "logs", mode_label)
+
+    try:
+        with profile_context:
+            _run_selected_mode(args, config)
     except (ModuleNotFoundError, ImportError) as e:
         logger.error(f"engine_coreモジュールが見つかりません。PYTHONPATHを確認するか、プロジェクトルートから実行してください。詳細: {e}")
         logger.error(f"現在のsys.path: {sys.path}")
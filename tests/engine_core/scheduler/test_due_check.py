@@ -0,0 +1,38 @@
+import json
+from datetime import datetime, timezone, timedelta
+from unittest.mock import Mock
+
+from engine_core.scheduler.due_check import has_pending_work, read_last_post_times
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _config(tmp_path, last_post_times, lead_minutes=None):
+    (tmp_path / "last_post_times.json").write_text(json.dumps(last_post_times), encoding="utf-8")
+    config = Mock()
+    config.get.return_value = str(tmp_path)
+    config.get_schedule_config.return_value = {"last_post_times_file": "last_post_times.json"}
+    config.get_post_interval_hours.return_value = 3
+    config.get_media_prepare_lead_minutes.return_value = lead_minutes
+    config.get_active_twitter_accounts.return_value = [{"account_id": "acc1"}, {"account_id": "acc2"}]
+    config.get_discord_webhook_urls.return_value = []
+    return config
+
+
+def test_nothing_due_from_local_state(tmp_path):
+    recent = (NOW - timedelta(hours=1)).isoformat()
+    assert has_pending_work(_config(tmp_path, {"acc1": recent, "acc2": recent}), NOW) is False
+
+
+def test_due_account_or_upcoming_media_preparation(tmp_path):
+    recent = (NOW - timedelta(hours=1)).isoformat()
+    assert has_pending_work(_config(tmp_path, {"acc1": recent}), NOW) is True
+    almost_due = (NOW - timedelta(hours=2, minutes=50)).isoformat()
+    assert has_pending_work(_config(tmp_path, {"acc1": recent, "acc2": almost_due}), NOW) is False
+    assert has_pending_work(_config(tmp_path, {"acc1": recent, "acc2": almost_due}, lead_minutes=15), NOW) is True
+
+
+def test_read_last_post_times_accepts_z_suffix(tmp_path):
+    path = tmp_path / "last_post_times.json"
+    path.write_text(json.dumps({"acc1": "2026-01-01T00:00:00Z", "acc2": 5}), encoding="utf-8")
+    assert read_last_post_times(str(path)) == {"acc1": datetime(2026, 1, 1, tzinfo=timezone.utc)}
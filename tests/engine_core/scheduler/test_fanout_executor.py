@@ -0,0 +1,96 @@
+from unittest.mock import Mock
+
+from engine_core.scheduler.fanout_executor import FanoutPostExecutor, format_fanout_results
+
+
+def _executor(clients, groups):
+    post_executor = Mock()
+    post_executor.circuit_breaker = None
+    post_executor.post_ledger = None
+    post_executor.spreadsheet_manager.duplicate_index = None
+    post_executor.spreadsheet_manager.get_post_candidate.return_value = {
+        "id": "7", "text": "本文", "media_path": "https://example.com/a.mp4", "row_index": 5,
+        "thread": [], "target_group": "shared",
+    }
+    post_executor.config.get_account_groups.return_value = groups
+    post_executor.config.get_active_twitter_account_details.side_effect = lambda account_id: {"account_id": account_id} if account_id in clients else None
+    post_executor.get_twitter_client.side_effect = lambda account_id: clients[account_id]
+    return FanoutPostExecutor(post_executor), post_executor
+
+
+def _client(tweet_id):
+    client = Mock()
+    client.error_classes = set()
+    client.download_and_prepare.return_value = ("/tmp/prepared.mp4", "video", [])
+    client.upload_prepared_file.return_value = f"media-{tweet_id}"
+    client.post_thread.return_value = [{"id": tweet_id}] if tweet_id else None
+    return client
+
+
+def test_media_is_prepared_once_and_uploaded_to_each_account():
+    clients = {"acc1": _client("100"), "acc2": _client("200"), "acc3": _client(None)}
+    fanout, post_executor = _executor(clients, {"shared": ["acc1", "acc2", "acc3", "disabled"]})
+
+    results = fanout.execute_fanout("Sheet1")
+
+    downloads = sum(c.download_and_prepare.call_count for c in clients.values())
+    assert downloads == 1
+    for account_id, client in clients.items():
+        client.upload_prepared_file.assert_called_once_with("/tmp/prepared.mp4", "video")
+    clients["acc2"].post_thread.assert_called_once_with([{"text": "本文", "media_ids": ["media-200"]}])
+
+    assert results["acc1"]["tweet_id"] == "100"
+    assert results["acc3"]["tweet_id"] is None
+    assert results["disabled"]["skipped"] is True
+
+    # 結果は1回のシート更新でまとめて書き込む
+    post_executor.spreadsheet_manager.update_post_status.assert_called_once()
+    kwargs = post_executor.spreadsheet_manager.update_post_status.call_args.kwargs
+    assert kwargs["row_index"] == 5
+    assert kwargs["increment"] == 2
+    assert kwargs["result_text"] == "acc1: 100 / acc2: 200 / acc3: 失敗 / disabled: 見送り"
+
+
+def test_open_media_circuit_skips_only_that_account():
+    clients = {"acc1": _client("100"), "acc2": _client("200")}
+    fanout, post_executor = _executor(clients, {"shared": ["acc1", "acc2"]})
+    post_executor.circuit_breaker = Mock()
+    post_executor.circuit_breaker.allows.return_value = True
+    post_executor.circuit_breaker.allows_media.side_effect = lambda account_id: account_id != "acc2"
+
+    results = fanout.execute_fanout("Sheet1")
+
+    assert results["acc1"]["tweet_id"] == "100"
+    assert results["acc2"]["skipped"] is True
+    clients["acc2"].post_thread.assert_not_called()
+    post_executor.circuit_breaker.record_result.assert_called_once_with("acc1", set(), skipped_classes=())
+
+
+def test_unknown_group_posts_nothing():
+    clients = {"acc1": _client("100")}
+    fanout, post_executor = _executor(clients, {})
+
+    assert fanout.execute_fanout("Sheet1") == {}
+    clients["acc1"].post_thread.assert_not_called()
+    post_executor.spreadsheet_manager.update_post_status.assert_not_called()
+
+
+def test_format_fanout_results():
+    assert format_fanout_results({"a": {"tweet_id": "1", "error": None}}) == "a: 1"
+
+
+def test_accounts_that_cannot_post_are_skipped():
+    clients = {"acc1": _client("100"), "acc2": _client("200")}
+    fanout, post_executor = _executor(clients, {"shared": ["acc1", "acc2"]})
+
+    def ensure_can_post(account_id):
+        if account_id == "acc2":
+            raise ValueError("隔離中")
+
+    post_executor.ensure_can_post.side_effect = ensure_can_post
+
+    results = fanout.execute_fanout("Sheet1")
+
+    assert results["acc1"]["tweet_id"] == "100"
+    assert results["acc2"]["skipped"] is True
+    clients["acc2"].post_thread.assert_not_called()
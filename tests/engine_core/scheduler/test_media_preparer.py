@@ -0,0 +1,46 @@
+from unittest.mock import Mock
+
+from engine_core.scheduler.media_preparer import MediaPreparer
+
+
+def _candidate(text="本文", media_path="https://example.com/a.mp4"):
+    return {"id": "1", "text": text, "media_path": media_path, "row_index": 2}
+
+
+def test_prepared_media_is_reused_for_unchanged_row(tmp_path):
+    preparer = MediaPreparer(store_path=str(tmp_path / "prepared_media.json"))
+    spreadsheet_manager = Mock()
+    spreadsheet_manager.get_post_candidate.return_value = _candidate()
+    client = Mock()
+    client.upload_media.return_value = "media-1"
+
+    assert preparer.prepare("acc", "Sheet1", spreadsheet_manager, client) is True
+    # 同じ行であれば再アップロードしない
+    assert preparer.prepare("acc", "Sheet1", spreadsheet_manager, client) is True
+    assert client.upload_media.call_count == 1
+
+    assert preparer.take("acc", _candidate()) == ["media-1"]
+    # 一度取り出した準備結果は再利用されない
+    assert preparer.take("acc", _candidate()) is None
+
+
+def test_prepared_media_is_invalidated_when_row_changes(tmp_path):
+    preparer = MediaPreparer(store_path=str(tmp_path / "prepared_media.json"))
+    spreadsheet_manager = Mock()
+    spreadsheet_manager.get_post_candidate.return_value = _candidate()
+    client = Mock()
+    client.upload_media.return_value = "media-1"
+    preparer.prepare("acc", "Sheet1", spreadsheet_manager, client)
+
+    assert preparer.take("acc", _candidate(text="編集後の本文")) is None
+
+
+def test_expired_media_is_discarded(tmp_path):
+    preparer = MediaPreparer(store_path=str(tmp_path / "prepared_media.json"), ttl_hours=0)
+    spreadsheet_manager = Mock()
+    spreadsheet_manager.get_post_candidate.return_value = _candidate()
+    client = Mock()
+    client.upload_media.return_value = "media-1"
+    preparer.prepare("acc", "Sheet1", spreadsheet_manager, client)
+
+    assert preparer.take("acc", _candidate()) is None
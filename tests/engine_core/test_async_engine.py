@@ -0,0 +1,100 @@
+import asyncio
+
+from engine_core.async_engine import (
+    AsyncHTTPError, AsyncPostingEngine, HostLimiter, classify_http_error, classify_outcome_error, oauth1_authorization, records_from_values,
+    sheet_range,
+)
+from engine_core.circuit_breaker import ERROR_AUTH, ERROR_DUPLICATE
+from engine_core.notification_digest import ERROR_RATE_LIMIT, ERROR_OTHER
+
+CREDENTIALS = {"consumer_key": "ck", "consumer_secret": "cs", "access_token": "at", "access_token_secret": "ats"}
+
+
+def test_oauth1_authorization_signs_with_user_context():
+    header = oauth1_authorization("POST", "https://api.twitter.com/2/tweets", CREDENTIALS)
+
+    assert header.startswith("OAuth ")
+    assert 'oauth_consumer_key="ck"' in header
+    assert 'oauth_token="at"' in header
+    assert 'oauth_signature_method="HMAC-SHA1"' in header
+
+
+def test_records_from_values_pads_short_rows():
+    values = [["ID", "本文", "投稿可能"], ["1", "こんにちは", "TRUE"], ["2"]]
+
+    assert records_from_values(values) == [
+        {"ID": "1", "本文": "こんにちは", "投稿可能": "TRUE"},
+        {"ID": "2", "本文": "", "投稿可能": ""},
+    ]
+    assert records_from_values([]) == []
+
+
+def test_sheet_range_quotes_worksheet_name():
+    assert sheet_range("都内メンエス") == "'都内メンエス'"
+    assert sheet_range("it's", "C5") == "'it''s'!C5"
+
+
+def test_classify_http_error():
+    assert classify_http_error(AsyncHTTPError(403, '{"detail": "You are not allowed to create a Tweet with duplicate content."}', "u")) == ERROR_DUPLICATE
+    assert classify_http_error(AsyncHTTPError(401, "Unauthorized", "u")) == ERROR_AUTH
+    assert classify_http_error(AsyncHTTPError(429, "Too Many Requests", "u")) is None
+
+
+def test_classify_outcome_error():
+    assert classify_outcome_error(AsyncHTTPError(429, "Too Many Requests", "u")) == ERROR_RATE_LIMIT
+    assert classify_outcome_error(AsyncHTTPError(401, "Unauthorized", "u")) == ERROR_AUTH
+    assert classify_outcome_error(AsyncHTTPError(500, "Internal Server Error", "u")) == ERROR_OTHER
+    assert classify_outcome_error(ValueError("ワークシート名が設定されていません")) == ERROR_OTHER
+
+
+def test_host_limiter_caps_concurrency_per_host():
+    limiter = HostLimiter(default_limit=2, overrides={"upload.twitter.com": 1})
+    active = {"api.twitter.com": 0, "upload.twitter.com": 0}
+    peak = {"api.twitter.com": 0, "upload.twitter.com": 0}
+
+    async def call(url, host):
+        async with limiter.for_url(url):
+            active[host] += 1
+            peak[host] = max(peak[host], active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+
+    async def main():
+        await asyncio.gather(
+            *(call("https://api.twitter.com/2/tweets", "api.twitter.com") for _ in range(5)),
+            *(call("https://upload.twitter.com/1.1/media/upload.json", "upload.twitter.com") for _ in range(5)),
+        )
+
+    asyncio.run(main())
+    assert peak == {"api.twitter.com": 2, "upload.twitter.com": 1}
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def record_result(self, *args):
+        self.calls.append(("circuit",) + args)
+
+    def record(self, *args, **kwargs):
+        self.calls.append(("record",) + args + tuple(sorted(kwargs.items())))
+
+
+def test_record_posted_writes_all_stores_in_one_call():
+    recorder = _Recorder()
+    engine = object.__new__(AsyncPostingEngine)
+    engine.circuit_breaker = recorder
+    engine.post_ledger = recorder
+    engine.spreadsheet_manager = type("SM", (), {"duplicate_index": recorder})()
+
+    async def main():
+        # イベントループとは別のスレッドから書き込まれる
+        await asyncio.to_thread(engine._record_posted, "acc", "シート1", {"id": "r1"},
+                                [{"text": "本文"}], [{"id": "t1"}], set(), ("media",))
+
+    asyncio.run(main())
+    assert recorder.calls == [
+        ("circuit", "acc", set(), ("media",)),
+        ("record", "acc", "t1", ("row_id", "r1"), ("worksheet_name", "シート1")),
+        ("record", "acc", "本文"),
+    ]
@@ -0,0 +1,54 @@
+from unittest.mock import patch
+
+from engine_core.circuit_breaker import CircuitBreaker, ERROR_AUTH, ERROR_MEDIA, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+
+def test_opens_after_threshold_and_backs_off_exponentially(tmp_path):
+    breaker = CircuitBreaker(str(tmp_path / "circuit_breakers.json"), failure_threshold=2, base_open_seconds=60, max_open_seconds=150)
+
+    with patch("engine_core.circuit_breaker.time.time", return_value=1000):
+        breaker.record_result("acc", [ERROR_AUTH])
+        assert breaker.get_state("acc")[0] == STATE_CLOSED
+        breaker.record_result("acc", [ERROR_AUTH])
+        assert breaker.get_state("acc") == (STATE_OPEN, ERROR_AUTH, 1060)
+        assert not breaker.allows("acc")
+        assert breaker.allows("other")
+
+    # 期限後は1回の試行を許可し、失敗すれば2倍の時間で再び開く
+    with patch("engine_core.circuit_breaker.time.time", return_value=1060):
+        assert breaker.get_state("acc")[0] == STATE_HALF_OPEN
+        assert breaker.allows("acc")
+        breaker.record_result("acc", [ERROR_AUTH])
+        assert breaker.get_state("acc") == (STATE_OPEN, ERROR_AUTH, 1180)
+
+    # 上限で頭打ちになる
+    with patch("engine_core.circuit_breaker.time.time", return_value=1180):
+        breaker.record_result("acc", [ERROR_AUTH])
+        assert breaker.get_state("acc")[2] == 1330
+
+
+def test_success_closes_only_classes_that_did_not_fail(tmp_path):
+    breaker = CircuitBreaker(str(tmp_path / "circuit_breakers.json"), failure_threshold=1)
+    breaker.record_result("acc", [ERROR_AUTH, ERROR_MEDIA])
+    with patch("engine_core.circuit_breaker.time.time", return_value=10 ** 10):
+        breaker.record_result("acc", [ERROR_MEDIA])
+    assert breaker.get_state("acc")[1] == ERROR_MEDIA
+
+    breaker.record_result("acc")
+    assert breaker.get_state("acc") == (STATE_CLOSED, None, None)
+
+
+def test_open_media_circuit_only_blocks_media_rows(tmp_path):
+    breaker = CircuitBreaker(str(tmp_path / "circuit_breakers.json"), failure_threshold=1, base_open_seconds=60)
+    with patch("engine_core.circuit_breaker.time.time", return_value=1000):
+        breaker.record_result("acc", [ERROR_MEDIA])
+        # アカウント全体は止めず、メディア付きの行だけを止める
+        assert breaker.allows("acc")
+        assert not breaker.allows_media("acc")
+
+        # メディアのない行の成功ではメディアの回路を閉じない
+        breaker.record_result("acc", skipped_classes=[ERROR_MEDIA])
+        assert breaker.get_state("acc") == (STATE_OPEN, ERROR_MEDIA, 1060)
+
+        breaker.record_result("acc")
+        assert breaker.allows_media("acc")
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from engine_core.config import Config
+
+KEYS = {"consumer_key": "ck", "consumer_secret": "cs", "access_token": "at", "access_token_secret": "ats"}
+
+
+def _config(tmp_path, data):
+    path = tmp_path / "app_config.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return Config(config_path=str(path))
+
+
+def test_accounts_are_compiled_into_read_only_index(tmp_path):
+    config = _config(tmp_path, {"twitter_accounts": [
+        {"account_id": "Alpha", "google_sheets_source": {"worksheet_name": "Sheet1"}, **KEYS},
+        {"account_id": "beta", "enabled": False, **KEYS},
+        {"account_id": "gamma", "consumer_key": "ck"},
+        {"enabled": True},
+    ]})
+
+    assert [acc["account_id"] for acc in config.get_twitter_accounts()] == ["Alpha", "beta", "gamma"]
+    assert [acc["account_id"] for acc in config.get_active_twitter_accounts()] == ["Alpha", "gamma"]
+
+    details = config.get_active_twitter_account_details("alpha")
+    assert details["spreadsheet_worksheet"] == "Sheet1"
+    assert details is config.get_active_twitter_account_details("ALPHA")
+    # 無効なアカウントとAPIキーが不足しているアカウントは引けない
+    assert config.get_active_twitter_account_details("beta") is None
+    assert config.get_active_twitter_account_details("gamma") is None
+    with pytest.raises(TypeError):
+        details["enabled"] = False
+
+
+def test_columns_and_dotted_lookups(tmp_path):
+    config = _config(tmp_path, {
+        "auto_post_bot": {"spreadsheet_columns": {"text": "Body"}, "schedule_settings": {"post_interval_hours": 3}},
+        "common": {"log_level": None},
+    })
+
+    columns = config.get_spreadsheet_columns()
+    assert columns["text"] == "Body" and columns["id"] == "ID"
+    assert config.get_schedule_config()["post_interval_hours"] == 3
+    assert config.get("auto_post_bot.schedule_settings.post_interval_hours") == 3
+    assert config.get("auto_post_bot.missing.key", "fallback") == "fallback"
+    assert config.get("common.log_level", "fallback") is None
+    assert config.get("common.log_level.nested", "fallback") == "fallback"
+
+
+def test_reload_swaps_snapshot_and_reports_account_changes(tmp_path):
+    path = tmp_path / "app_config.json"
+    path.write_text(json.dumps({"twitter_accounts": [
+        {"account_id": "keep", **KEYS}, {"account_id": "drop", **KEYS}, {"account_id": "rotate", **KEYS},
+    ]}), encoding="utf-8")
+    config = Config(config_path=str(path))
+    assert config.reload_if_changed() is None
+
+    path.write_text(json.dumps({"twitter_accounts": [
+        {"account_id": "keep", **KEYS}, {"account_id": "rotate", **KEYS, "access_token": "new"}, {"account_id": "new", **KEYS},
+    ]}), encoding="utf-8")
+    changes = config.reload_if_changed()
+
+    assert changes == (("new",), ("drop",), ("rotate",))
+    assert config.get_active_twitter_account_details("rotate")["access_token"] == "new"
+    assert config.get_active_twitter_account_details("drop") is None
+
+
+def test_invalid_file_keeps_current_snapshot(tmp_path):
+    path = tmp_path / "app_config.json"
+    path.write_text(json.dumps({"twitter_accounts": [{"account_id": "keep", **KEYS}]}), encoding="utf-8")
+    config = Config(config_path=str(path))
+
+    path.write_text('{"twitter_accounts": [', encoding="utf-8")
+
+    assert config.reload_if_changed() is None
+    assert config.get_active_twitter_account_details("keep") is not None
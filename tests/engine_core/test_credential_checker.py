@@ -0,0 +1,41 @@
+import json
+
+from engine_core.credential_checker import CredentialChecker
+
+
+def _account(account_id, token="at"):
+    return {"account_id": account_id, "consumer_key": "ck", "consumer_secret": "cs", "access_token": token, "access_token_secret": "ats"}
+
+
+class FakeClient:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def verify_credentials(self):
+        self.calls += 1
+        return self.result
+
+
+def test_invalid_accounts_are_quarantined_until_ttl_or_key_change(tmp_path):
+    store_path = str(tmp_path / "credential_checks.json")
+    clients = {
+        "good": FakeClient((True, None)),
+        "bad": FakeClient((False, "Unauthorized: 401")),
+        "flaky": FakeClient((None, "ConnectionError")),
+    }
+    accounts = [_account(account_id) for account_id in clients]
+
+    checker = CredentialChecker(store_path, ttl_seconds=3600)
+    assert checker.check_accounts(accounts, clients.__getitem__) == {"good": True, "bad": False, "flaky": None}
+    assert checker.is_quarantined(_account("bad"))
+    # 一時的なエラーは記録しない
+    assert "flaky" not in json.loads(open(store_path, encoding="utf-8").read())
+
+    # TTL内は再確認しない (一時的なエラーのアカウントのみ再確認)
+    checker.check_accounts(accounts, clients.__getitem__)
+    assert (clients["good"].calls, clients["bad"].calls, clients["flaky"].calls) == (1, 1, 2)
+
+    # キーを差し替えた場合は隔離を解除して再確認する
+    assert not checker.is_quarantined(_account("bad", token="new"))
+    assert not CredentialChecker(store_path, ttl_seconds=0).is_quarantined(_account("bad"))
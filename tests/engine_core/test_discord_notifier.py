@@ -0,0 +1,66 @@
+from unittest.mock import Mock, patch
+
+from engine_core.discord_notifier import DiscordNotifier, coalesce_payloads
+
+
+def _response(status_code, json_body=None, headers=None):
+    response = Mock(status_code=status_code, headers=headers or {})
+    response.json.return_value = json_body or {}
+    response.raise_for_status.return_value = None
+    return response
+
+
+def test_coalesce_payloads_respects_embed_count_and_size_limits():
+    small = [{"embeds": [{"title": f"t{i}", "description": "ok"}]} for i in range(12)]
+    large = {"embeds": [{"description": "x" * 5995}]}
+    text = {"content": "テキスト"}
+
+    messages = coalesce_payloads(small + [large, text, small[0]])
+
+    assert [count for _, count in messages] == [10, 2, 1, 1, 1]
+    assert len(messages[0][0]["embeds"]) == 10
+    # 合計6000文字を超えるため、大きな埋め込みは前のメッセージにまとめない
+    assert messages[2][0]["embeds"] == large["embeds"]
+    assert messages[3][0] == text
+
+
+def test_rate_limited_webhook_is_skipped_for_the_next_one():
+    session = Mock()
+    session.post.side_effect = [
+        _response(429, {"retry_after": 30}),
+        _response(204),
+        _response(204),
+    ]
+    notifier = DiscordNotifier(["https://discord/a", "https://discord/b"], session=session)
+
+    with patch("engine_core.discord_notifier.time.sleep") as sleep:
+        assert notifier.send_simple_notification("タイトル", "本文") is True
+        assert notifier.send_simple_notification("タイトル", "本文") is True
+
+    urls = [call.args[0] for call in session.post.call_args_list]
+    # a が429を返したため、30秒間は b だけを使う
+    assert urls == ["https://discord/a", "https://discord/b", "https://discord/b"]
+    sleep.assert_not_called()
+
+
+def test_single_webhook_waits_for_retry_after():
+    session = Mock()
+    session.post.side_effect = [_response(429, {"retry_after": 0.5}), _response(204)]
+    notifier = DiscordNotifier("https://discord/a", session=session)
+
+    with patch("engine_core.discord_notifier.time.sleep") as sleep:
+        assert notifier.send_simple_notification("タイトル", "本文") is True
+
+    assert session.post.call_count == 2
+    assert 0 < sleep.call_args.args[0] <= 0.5
+
+
+def test_send_status_table_reports_failed_delivery():
+    session = Mock()
+    session.post.side_effect = [_response(204), _response(429, {"retry_after": 3600})]
+    notifier = DiscordNotifier("https://discord/a", session=session)
+
+    assert notifier.send_status_table("状態", ["アカウント", "ステータス"], [["acc1", "待機中"]]) is True
+    # レート制限の解除まで待てない場合は送信を見送り、呼び出し側で次回に再送できるよう False を返す
+    assert notifier.send_status_table("状態", ["アカウント", "ステータス"], [["acc1", "投稿中"]]) is False
+    assert notifier.send_status_table("状態", ["アカウント", "ステータス"], [["acc1"]]) is False
@@ -0,0 +1,62 @@
+import json
+import urllib.request
+
+from engine_core.metrics import MetricsRegistry, MetricsStore, render_prometheus, flush_to_store, start_metrics_server
+
+
+def test_registry_counts_and_histograms_are_rendered():
+    registry = MetricsRegistry()
+    registry.inc("posts_total", outcome="posted", mode="worker")
+    registry.inc("posts_total", outcome="posted", mode="worker")
+    registry.inc("sheets_api_calls_total", operation='re"ad')
+    registry.observe("ffmpeg_seconds", 0.3, buckets=(0.5, 1))
+    registry.observe("ffmpeg_seconds", 2.0, buckets=(0.5, 1))
+
+    lines = render_prometheus(registry.snapshot()).splitlines()
+
+    assert "# TYPE inbound_engine_posts_total counter" in lines
+    assert any(line.startswith("# HELP inbound_engine_posts_total ") for line in lines)
+    assert 'inbound_engine_posts_total{mode="worker",outcome="posted"} 2' in lines
+    assert 'inbound_engine_sheets_api_calls_total{operation="re\\"ad"} 1' in lines
+    assert "# TYPE inbound_engine_ffmpeg_seconds histogram" in lines
+    assert 'inbound_engine_ffmpeg_seconds_bucket{le="0.5"} 1' in lines
+    assert 'inbound_engine_ffmpeg_seconds_bucket{le="1"} 1' in lines
+    assert 'inbound_engine_ffmpeg_seconds_bucket{le="+Inf"} 2' in lines
+    assert "inbound_engine_ffmpeg_seconds_sum 2.3" in lines
+    assert "inbound_engine_ffmpeg_seconds_count 2" in lines
+
+
+def test_store_accumulates_across_runs(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.json"), textfile_path=str(tmp_path / "metrics.prom"))
+    for _ in range(2):
+        registry = MetricsRegistry()
+        registry.inc("runs_total", mode="process")
+        registry.observe("post_phase_seconds", 1.5, phase="post")
+        flush_to_store(store, registry)
+        # 取り出した値は二重に加算しない
+        assert registry.snapshot() == {}
+
+    total = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert total['runs_total{mode="process"}']["value"] == 2
+    assert total['post_phase_seconds{phase="post"}']["count"] == 2
+    textfile = (tmp_path / "metrics.prom").read_text(encoding="utf-8")
+    assert 'inbound_engine_runs_total{mode="process"} 2' in textfile.splitlines()
+
+
+def test_http_endpoint_serves_stored_and_pending_values(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.json"))
+    stored = MetricsRegistry()
+    stored.inc("runs_total", mode="process")
+    flush_to_store(store, stored)
+    pending = MetricsRegistry()
+    pending.inc("runs_total", mode="process")
+
+    server = start_metrics_server(store, 0, registry=pending)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert 'inbound_engine_runs_total{mode="process"} 2' in body.splitlines()
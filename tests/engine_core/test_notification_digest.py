@@ -0,0 +1,41 @@
+import os
+import time
+
+from engine_core.notification_digest import NotificationDigest, format_digest
+
+
+def test_outcomes_are_summarized_once_window_has_passed(tmp_path):
+    path = str(tmp_path / "digest.jsonl")
+    digest = NotificationDigest(path, window_seconds=3600)
+    digest.record("acc1", "posted", phase_seconds={"post": 2.0, "sheet_read": 0.5})
+    digest.record("acc2", "posted", phase_seconds={"post": 4.0})
+    digest.record("acc3", "skipped")
+    digest.record("acc4", "failed", error_class="media")
+    digest.record("acc4", "rate_limited", error_class="rate_limit")
+
+    assert digest.take_if_due() is None
+    summary = digest.take_if_due(now=time.time() + 3600)
+
+    assert summary["counts"] == {"posted": 2, "skipped": 1, "failed": 1, "rate_limited": 1}
+    assert summary["error_counts"] == {"media": 1, "rate_limit": 1}
+    assert summary["failed_accounts"] == {"acc4": 2}
+    assert summary["phase_seconds"]["post"] == {"p50": 4.0, "p95": 4.0, "max": 4.0}
+    # 取り出した記録は次の期間には含めない
+    assert not os.path.exists(path)
+    assert digest.take_if_due(force=True) is None
+
+
+def test_format_digest():
+    digest_summary = {
+        "counts": {"posted": 3, "skipped": 0, "failed": 1, "rate_limited": 0},
+        "error_counts": {"auth": 1},
+        "failed_accounts": {"acc1": 1},
+        "phase_seconds": {"post": {"p50": 1.0, "p95": 2.5, "max": 3.0}},
+    }
+
+    title, description = format_digest(digest_summary)
+
+    assert title == "📊 投稿サマリー (4件)"
+    assert "✅ 投稿: 3" in description
+    assert "失敗の内訳: auth 1" in description
+    assert "post: p50 1.0秒 / p95 2.5秒 / 最大 3.0秒" in description
@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+
+from engine_core.notification_outbox import NotificationOutbox
+
+
+def test_queued_notifications_are_sent_in_background(tmp_path):
+    sent = []
+    outbox = NotificationOutbox(str(tmp_path / "outbox"), sender=lambda payloads: sent.extend(payloads) or len(payloads))
+    outbox.start()
+
+    outbox.put({"content": "1"})
+    outbox.put({"content": "2"})
+
+    assert outbox.close(timeout_seconds=5) == 0
+    assert sent == [{"content": "1"}, {"content": "2"}]
+    assert os.listdir(tmp_path / "outbox") == []
+
+
+def test_unsent_notifications_are_kept_for_next_run(tmp_path):
+    directory = str(tmp_path / "outbox")
+    failing = NotificationOutbox(directory, sender=lambda payloads: 0, retry_interval_seconds=1)
+    failing.start()
+    failing.put({"content": "later"})
+
+    assert failing.close(timeout_seconds=0.2) == 1
+    assert [name.endswith(".json") for name in os.listdir(directory)] == [True]
+
+    sent = []
+    outbox = NotificationOutbox(directory, sender=lambda payloads: sent.extend(payloads) or len(payloads))
+    outbox.start()
+    assert outbox.close(timeout_seconds=5) == 0
+    assert sent == [{"content": "later"}]
+
+
+def test_close_does_not_wait_past_deadline_for_slow_sender(tmp_path):
+    release = threading.Event()
+    outbox = NotificationOutbox(str(tmp_path / "outbox"), sender=lambda payloads: release.wait(5) and len(payloads))
+    outbox.start()
+    outbox.put({"content": "slow"})
+
+    started = time.monotonic()
+    assert outbox.close(timeout_seconds=0.2) == 1
+    assert time.monotonic() - started < 1
+    release.set()
@@ -0,0 +1,55 @@
+import time
+
+from engine_core.rate_limit_tracker import RateLimitTracker, endpoint_for_request
+
+
+def test_endpoint_names():
+    assert endpoint_for_request("POST", "https://api.twitter.com/2/tweets") == "create_tweet"
+    assert endpoint_for_request("DELETE", "https://api.twitter.com/2/tweets/123") == "delete_tweet"
+    assert endpoint_for_request("POST", "https://upload.twitter.com/1.1/media/upload.json?command=INIT") == "media_upload"
+    assert endpoint_for_request("GET", "https://api.twitter.com/2/users/me") == "GET /2/users/me"
+
+
+def test_exhausted_budget_is_reported_until_reset(tmp_path):
+    store_path = str(tmp_path / "rate_limits.json")
+    reset_at = int(time.time()) + 600
+    RateLimitTracker(store_path).record("acc", "create_tweet", {
+        "x-rate-limit-limit": "50",
+        "x-rate-limit-remaining": "0",
+        "x-rate-limit-reset": str(reset_at),
+    })
+
+    # 別プロセス (司令塔) からも読めるように永続化されている
+    tracker = RateLimitTracker(store_path)
+    assert 590 <= tracker.seconds_until_available("acc", "create_tweet") <= 600
+    assert tracker.seconds_until_available("other", "create_tweet") == 0
+
+
+def test_reserve_and_expired_reset(tmp_path):
+    tracker = RateLimitTracker(str(tmp_path / "rate_limits.json"))
+    tracker.record("acc", "create_tweet", {
+        "x-rate-limit-remaining": "2",
+        "x-rate-limit-reset": str(int(time.time()) + 600),
+    })
+    tracker.record("acc", "media_upload", {
+        "x-rate-limit-remaining": "0",
+        "x-rate-limit-reset": str(int(time.time()) - 1),
+    })
+
+    assert tracker.seconds_until_available("acc", "create_tweet") == 0
+    assert tracker.seconds_until_available("acc", "create_tweet", reserve=2) > 0
+    assert tracker.seconds_until_available("acc", "media_upload") == 0
+
+
+def test_corrupt_store_is_not_overwritten(tmp_path):
+    store_path = tmp_path / "rate_limits.json"
+    store_path.write_text("{broken", encoding="utf-8")
+
+    RateLimitTracker(str(store_path)).record("acc", "create_tweet", {
+        "x-rate-limit-limit": "50",
+        "x-rate-limit-remaining": "0",
+        "x-rate-limit-reset": str(int(time.time()) + 600),
+    })
+
+    # 読み込めなかった記録を {} で上書きしない
+    assert store_path.read_text(encoding="utf-8") == "{broken"
@@ -0,0 +1,116 @@
+from unittest.mock import MagicMock, patch
+
+from engine_core.duplicate_index import DuplicateContentIndex, normalize_text
+from engine_core.spreadsheet_manager import SpreadsheetManager
+from engine_core.utils.tweet_length import weighted_length
+
+COLUMNS = {
+    "id": "ID",
+    "text": "本文",
+    "char_count": "文字数",
+    "media_url": "画像/動画URL",
+    "postable": "投稿可能",
+    "posted_count": "投稿済み回数",
+    "last_posted_at": "最終投稿日時",
+    "thread_parent": "スレッド親ID",
+    "target_group": "投稿先グループ",
+}
+
+
+def _record(row_id, text, last_posted=""):
+    return {"ID": row_id, "本文": text, "文字数": "", "画像/動画URL": "", "投稿可能": "TRUE",
+            "投稿済み回数": 0, "最終投稿日時": last_posted, "スレッド親ID": ""}
+
+
+def _manager(records, write_back_char_count=False, **kwargs):
+    config = MagicMock()
+    config.get_spreadsheet_columns.return_value = COLUMNS
+    config.should_write_back_char_count.return_value = write_back_char_count
+    with patch.object(SpreadsheetManager, "_authenticate_gspread"):
+        manager = SpreadsheetManager(config, **kwargs)
+    manager.spreadsheet_id = "sheet"
+    manager.gspread_client = MagicMock()
+    manager.gspread_client.open_by_key.return_value.worksheet.return_value.get_all_records.return_value = records
+    return manager
+
+
+def test_normalize_text():
+    assert normalize_text("  ＡＢＣ\n\n  1２3 ") == "ABC 123"
+
+
+def test_recently_posted_text_is_skipped(tmp_path):
+    index = DuplicateContentIndex(str(tmp_path / "duplicate_index.json"), window_hours=24)
+    index.record("acc", "おはよう  ございます")
+    manager = _manager([
+        _record("1", "おはよう ございます", "2024-01-01 00:00:00"),
+        _record("2", "こんにちは", "2024-01-02 00:00:00"),
+    ], duplicate_index=index)
+
+    assert manager.get_post_candidate("Sheet1", account_id="acc")["id"] == "2"
+    # 別アカウントや account_id 未指定の場合は除外しない
+    assert manager.get_post_candidate("Sheet1", account_id="other")["id"] == "1"
+    assert manager.get_post_candidate("Sheet1")["id"] == "1"
+
+
+def test_exclude_media_skips_rows_with_media():
+    with_media = _record("1", "画像つき", "2024-01-01 00:00:00")
+    with_media["画像/動画URL"] = "https://example.com/a.jpg"
+    manager = _manager([with_media, _record("2", "テキストのみ", "2024-01-02 00:00:00")])
+
+    assert manager.get_post_candidate("Sheet1", account_id="acc")["id"] == "1"
+    assert manager.get_post_candidate("Sheet1", account_id="acc", exclude_media=True)["id"] == "2"
+
+
+def test_all_duplicates_returns_none(tmp_path):
+    index = DuplicateContentIndex(str(tmp_path / "duplicate_index.json"), window_hours=24)
+    index.record("acc", "同じ本文")
+    manager = _manager([_record("1", "同じ本文")], duplicate_index=index)
+    assert manager.get_post_candidate("Sheet1", account_id="acc") is None
+
+
+def test_weighted_length():
+    assert weighted_length("hello") == 5
+    assert weighted_length("こんにちは") == 10
+    assert weighted_length("見て https://example.com/" + "a" * 100) == 4 + 1 + 23
+    assert weighted_length("ｶﾞ") == weighted_length("ガ") * 2
+
+
+def test_weighted_length_counts_emoji_sequences_once():
+    # ZWJ結合・肌の色・国旗・キーキャップ・異体字セレクタ付きの絵文字は、それぞれ1つの絵文字として2と数える
+    assert weighted_length("👨\u200d👩\u200d👧\u200d👦") == 2
+    assert weighted_length("👍🏽") == 2
+    assert weighted_length("🇯🇵🇺🇸") == 4
+    assert weighted_length("1\ufe0f\u20e3") == 2
+    assert weighted_length("❤\ufe0f") == 2
+    assert weighted_length("見て😀") == 6
+    assert weighted_length("©") == 1
+
+
+def test_overlong_rows_are_excluded_and_counts_written_back_in_one_batch():
+    records = [
+        _record("1", "あ" * 141),
+        _record("2", "あ" * 140),
+        _record("3", "ok"),
+    ]
+    records[2]["文字数"] = 2
+    records.append(dict(_record("4", "い" * 141), **{"スレッド親ID": "3"}))
+    manager = _manager(records, write_back_char_count=True)
+    worksheet = manager.gspread_client.open_by_key.return_value.worksheet.return_value
+
+    candidate = manager.get_post_candidate("Sheet1")
+    assert candidate["id"] == "2"
+    assert candidate["weighted_length"] == 280
+
+    worksheet.update_cells.assert_called_once()
+    cells = worksheet.update_cells.call_args[0][0]
+    assert [(c.row, c.col, c.value) for c in cells] == [(2, 3, "282"), (3, 3, "280"), (5, 3, "282")]
+
+
+def test_group_rows_are_only_selected_for_fanout():
+    group_row = dict(_record("2", "グループ向け"), **{"投稿先グループ": "shared"})
+    manager = _manager([group_row, _record("1", "通常")])
+
+    assert manager.get_post_candidate("Sheet1")["id"] == "1"
+    candidate = manager.get_post_candidate("Sheet1", fanout=True)
+    assert candidate["id"] == "2"
+    assert candidate["target_group"] == "shared"
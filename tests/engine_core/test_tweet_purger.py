@@ -0,0 +1,57 @@
+from datetime import datetime, timezone, timedelta
+
+from engine_core.post_ledger import PostLedger
+from engine_core.tweet_purger import TweetPurger, load_targets_from_file, load_targets_from_ledger
+from engine_core.twitter_client import RateLimitError
+
+
+class FakeClient:
+    def __init__(self, fail_ids=(), rate_limited_once=()):
+        self.deleted = []
+        self.fail_ids = set(fail_ids)
+        self.rate_limited_once = set(rate_limited_once)
+
+    def delete_tweet(self, tweet_id, treat_missing_as_deleted=False):
+        if tweet_id in self.rate_limited_once:
+            self.rate_limited_once.discard(tweet_id)
+            raise RateLimitError("429", remaining_seconds=5)
+        if tweet_id in self.fail_ids:
+            return False
+        self.deleted.append(tweet_id)
+        return True
+
+
+def test_targets_from_ledger_and_file(tmp_path):
+    ledger = PostLedger(str(tmp_path / "posted_tweets.jsonl"))
+    ledger.record("a", "1", posted_at=datetime.now(timezone.utc) - timedelta(days=10))
+    ledger.record("a", "2")
+    assert [t["tweet_id"] for t in load_targets_from_ledger(ledger)] == ["1", "2"]
+    assert [t["tweet_id"] for t in load_targets_from_ledger(ledger, older_than_days=7)] == ["1"]
+
+    targets_file = tmp_path / "targets.txt"
+    targets_file.write_text('# comment\nb,10\n{"account_id": "c", "tweet_id": 11}\nbroken\n', encoding="utf-8")
+    assert load_targets_from_file(str(targets_file)) == [
+        {"account_id": "b", "tweet_id": "10"},
+        {"account_id": "c", "tweet_id": "11"},
+    ]
+
+
+def test_purge_paces_accounts_and_resumes(tmp_path):
+    clients = {"a": FakeClient(fail_ids={"3"}, rate_limited_once={"2"}), "b": FakeClient()}
+    sleeps = []
+    progress_path = str(tmp_path / "purge_progress.json")
+    targets = [{"account_id": "a", "tweet_id": i} for i in ("1", "2", "3")] + [{"account_id": "b", "tweet_id": "9"}]
+
+    purger = TweetPurger(clients.__getitem__, progress_path, delete_interval_seconds=18, sleep=sleeps.append)
+    results = purger.purge(targets)
+
+    assert results["a"] == {"deleted": 2, "failed": 1, "skipped": 0}
+    assert results["b"] == {"deleted": 1, "failed": 0, "skipped": 0}
+    assert clients["a"].deleted == ["1", "2"]
+    assert 5 in sleeps and sleeps.count(18) == 2
+
+    # 再実行では削除済みのツイートを再度削除しない
+    clients["a"].fail_ids.clear()
+    results = TweetPurger(clients.__getitem__, progress_path, sleep=lambda s: None).purge(targets)
+    assert results["a"] == {"deleted": 1, "failed": 0, "skipped": 0, "already_done": 2}
+    assert clients["a"].deleted == ["1", "2", "3"]
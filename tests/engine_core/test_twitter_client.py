@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+import pytest
+
+from engine_core.twitter_client import TwitterClient
+
+
+@pytest.fixture
+def client():
+    return TwitterClient("ck", "cs", "at", "ats")
+
+
+def test_post_thread_uploads_media_first_and_chains_replies(client):
+    calls = []
+
+    def upload(url):
+        calls.append(("upload", url))
+        return f"media-{url}"
+
+    with patch.object(client, "_upload_media_v1", side_effect=upload), \
+         patch.object(client, "post_tweet", side_effect=lambda text, media_ids=None: calls.append(("tweet", text, media_ids)) or {"id": "1", "text": text}), \
+         patch.object(client, "post_reply", side_effect=lambda text, in_reply_to_tweet_id, media_ids=None: calls.append(("reply", text, in_reply_to_tweet_id, media_ids)) or {"id": str(len(calls)), "text": text}):
+        posted = client.post_thread([
+            {"text": "head", "media_path": "a"},
+            {"text": "second", "media_path": ""},
+            {"text": "third", "media_path": "c"},
+        ])
+
+    assert [c[0] for c in calls] == ["upload", "upload", "tweet", "reply", "reply"]
+    assert calls[2] == ("tweet", "head", ["media-a"])
+    assert calls[3] == ("reply", "second", "1", None)
+    assert calls[4][1:] == ("third", posted[1]["id"], ["media-c"])
+    assert len(posted) == 3
+
+
+def test_post_thread_uses_preuploaded_media(client):
+    with patch.object(client, "_upload_media_v1") as upload, \
+         patch.object(client, "post_tweet", return_value={"id": "1", "text": "head"}) as post_tweet:
+        client.post_thread([{"text": "head", "media_path": "a", "media_ids": ["prepared"]}])
+
+    upload.assert_not_called()
+    post_tweet.assert_called_once_with("head", media_ids=["prepared"])
+
+
+def test_tweepy_clients_are_built_on_first_use():
+    with patch("engine_core.twitter_client.tweepy.Client") as client_cls, \
+         patch("engine_core.twitter_client.tweepy.API") as api_cls:
+        client = TwitterClient("ck", "cs", "at", "ats")
+        client_cls.assert_not_called()
+        api_cls.assert_not_called()
+
+        assert client.client_v2 is client.client_v2
+        client_cls.assert_called_once()
+        api_cls.assert_not_called()
+
+
+def test_failed_v1_init_skips_media_instead_of_raising(client):
+    with patch("engine_core.twitter_client.tweepy.API", side_effect=RuntimeError("auth")) as api_cls, \
+         patch.object(client, "download_and_prepare") as prepare:
+        assert client.api_v1 is None
+        assert client._upload_media_v1("https://example.com/a.jpg") is None
+
+    # 失敗結果も保持し、アクセスのたびに初期化し直さない
+    api_cls.assert_called_once()
+    prepare.assert_not_called()
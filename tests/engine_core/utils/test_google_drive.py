@@ -0,0 +1,177 @@
+from unittest.mock import patch
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from engine_core.utils.google_drive import extract_file_id, is_drive_url, GoogleDriveResolver, GoogleDriveError
+
+FILE_ID = "1AbCdEfGhIjKlMnOpQrStUvWxYz012345"
+DOWNLOAD_URL = f"https://drive.usercontent.google.com/download?id={FILE_ID}&export=download"
+
+
+@pytest.mark.parametrize("url", [
+    f"https://drive.google.com/file/d/{FILE_ID}/view?usp=sharing",
+    f"https://drive.google.com/file/u/0/d/{FILE_ID}/preview",
+    f"https://drive.google.com/open?id={FILE_ID}",
+    f"https://drive.google.com/uc?id={FILE_ID}&export=download",
+    f"https://docs.google.com/uc?export=download&id={FILE_ID}",
+    f"https://drive.usercontent.google.com/download?id={FILE_ID}&export=download",
+])
+def test_extract_file_id_supports_drive_url_shapes(url):
+    assert is_drive_url(url)
+    assert extract_file_id(url) == FILE_ID
+
+
+def test_non_drive_url_is_ignored():
+    assert not is_drive_url("https://example.com/file/d/abcdefghijklmnop/view")
+    assert extract_file_id("https://example.com/file/d/abcdefghijklmnop/view") is None
+
+
+def test_confirm_form_is_turned_into_download_url():
+    html = f"""
+    <html><body>
+      <form id="download-form" action="https://drive.usercontent.google.com/download" method="get">
+        <input type="hidden" name="id" value="{FILE_ID}">
+        <input type="hidden" name="export" value="download">
+        <input type="hidden" name="confirm" value="t">
+        <input type="hidden" name="uuid" value="abc-123">
+      </form>
+    </body></html>
+    """
+    resolver = GoogleDriveResolver()
+
+    url = resolver._confirm_url_from_page(html, FILE_ID)
+
+    assert url.startswith("https://drive.usercontent.google.com/download?")
+    assert "confirm=t" in url and "uuid=abc-123" in url and f"id={FILE_ID}" in url
+
+
+class FakeResponse:
+    """iter_content の途中で接続が切れる場合を再現できるレスポンス。"""
+    def __init__(self, status_code, body=b"", headers=None, broken=False):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict({"Content-Type": "video/mp4", **(headers or {})})
+        self.body = body
+        self.broken = broken
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size):
+        yield self.body
+        if self.broken:
+            raise requests.exceptions.ChunkedEncodingError("Connection broken")
+
+
+class FakeSession:
+    def __init__(self, responses_to_return):
+        self.responses = list(responses_to_return)
+        self.range_headers = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.range_headers.append((headers or {}).get("Range"))
+        return self.responses.pop(0)
+
+
+def _download(tmp_path, session):
+    resolver = GoogleDriveResolver(session=session, partial_dir=str(tmp_path), backoff_seconds=0)
+    resolver._remember(FILE_ID, DOWNLOAD_URL)
+    path, content_type = resolver.download(f"https://drive.google.com/file/d/{FILE_ID}/view")
+    with open(path, 'rb') as f:
+        return path, f.read(), content_type
+
+
+def test_download_resumes_when_file_is_unchanged(tmp_path):
+    session = FakeSession([
+        FakeResponse(200, b"HEAD", {"ETag": '"v1"', "Content-Length": "9"}, broken=True),
+        FakeResponse(206, b"-REST", {"ETag": '"v1"', "Content-Range": "bytes 4-8/9"}),
+    ])
+
+    _, content, content_type = _download(tmp_path, session)
+
+    assert content == b"HEAD-REST"
+    assert content_type == "video/mp4"
+    assert session.range_headers == [None, "bytes=4-"]
+
+
+def test_download_restarts_when_file_was_replaced(tmp_path):
+    session = FakeSession([
+        FakeResponse(200, b"HEAD", {"ETag": '"v1"', "Content-Length": "9"}, broken=True),
+        FakeResponse(206, b"-NEW!", {"ETag": '"v2"', "Content-Range": "bytes 4-8/9"}),
+        FakeResponse(200, b"NEWFILE!!", {"ETag": '"v2"', "Content-Length": "9"}),
+    ])
+
+    _, content, _ = _download(tmp_path, session)
+
+    assert content == b"NEWFILE!!"
+    assert session.range_headers == [None, "bytes=4-", None]
+
+
+def test_download_restarts_on_range_not_satisfiable(tmp_path):
+    session = FakeSession([
+        FakeResponse(200, b"HEAD", {"ETag": '"v1"', "Content-Length": "9"}, broken=True),
+        FakeResponse(416),
+        FakeResponse(200, b"HEAD-REST", {"ETag": '"v1"', "Content-Length": "9"}),
+    ])
+
+    _, content, _ = _download(tmp_path, session)
+
+    assert content == b"HEAD-REST"
+    assert session.range_headers == [None, "bytes=4-", None]
+
+
+def test_each_download_uses_its_own_partial_file(tmp_path):
+    leftover = tmp_path / f"gdrive_{FILE_ID}.part"
+    leftover.write_bytes(b"STALE")
+    session = FakeSession([FakeResponse(200, b"DATA"), FakeResponse(200, b"DATA")])
+
+    first_path, first_content, _ = _download(tmp_path, session)
+    second_path, second_content, _ = _download(tmp_path, session)
+
+    assert first_content == second_content == b"DATA"
+    assert first_path != second_path
+    assert str(leftover) not in (first_path, second_path)
+    assert session.range_headers == [None, None]
+
+
+def test_failed_download_removes_partial_file(tmp_path):
+    session = FakeSession([FakeResponse(200, b"HEAD", {"Content-Length": "9"}, broken=True) for _ in range(3)])
+
+    with pytest.raises(GoogleDriveError):
+        _download(tmp_path, session)
+
+    assert list(tmp_path.glob("*.part")) == []
+
+
+def test_resolved_urls_are_cached_in_file(tmp_path):
+    cache_path = str(tmp_path / "drive_resolve_cache.json")
+    GoogleDriveResolver(cache_path=cache_path)._remember(FILE_ID, DOWNLOAD_URL)
+
+    assert GoogleDriveResolver(cache_path=cache_path)._cached(FILE_ID) == DOWNLOAD_URL
+
+
+def test_resolve_failure_is_retried_with_backoff(tmp_path):
+    resolver = GoogleDriveResolver(session=FakeSession([FakeResponse(200, b"DATA")]), partial_dir=str(tmp_path), backoff_seconds=2)
+    resolves = [requests.exceptions.ConnectionError("reset"), DOWNLOAD_URL]
+
+    def resolve(url):
+        result = resolves.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    with patch.object(resolver, "resolve", side_effect=resolve), \
+         patch("engine_core.utils.google_drive.time.sleep") as sleep:
+        path, _ = resolver.download(f"https://drive.google.com/file/d/{FILE_ID}/view")
+
+    with open(path, 'rb') as f:
+        assert f.read() == b"DATA"
+    sleep.assert_called_once_with(2)
@@ -0,0 +1,32 @@
+from unittest.mock import patch
+
+import pytest
+import responses
+
+from engine_core.utils.http_session import create_session, get_request_counts
+
+
+@responses.activate
+def test_requests_are_counted_per_host():
+    responses.add(responses.GET, "https://media.example.com/a.jpg", body=b"x")
+    responses.add(responses.POST, "https://discord.example.com/webhook", status=204)
+    session = create_session()
+    before = get_request_counts()
+
+    session.get("https://media.example.com/a.jpg")
+    session.get("https://media.example.com/a.jpg")
+    session.post("https://discord.example.com/webhook", json={})
+
+    after = get_request_counts()
+    assert after["media.example.com"] - before.get("media.example.com", 0) == 2
+    assert after["discord.example.com"] - before.get("discord.example.com", 0) == 1
+
+
+def test_default_timeout_is_applied():
+    session = create_session(timeout=(1, 2))
+
+    with patch("requests.adapters.HTTPAdapter.send", side_effect=RuntimeError("stop")) as mock_send:
+        with pytest.raises(RuntimeError):
+            session.get("https://example.com")
+
+    assert mock_send.call_args.kwargs["timeout"] == (1, 2)
@@ -0,0 +1,49 @@
+import os
+
+from PIL import Image
+
+from engine_core.utils.image_processor import ImageNormalizer
+
+
+def _save_image(path, size, fmt, exif=None):
+    image = Image.new('RGB', size, color=(200, 50, 50))
+    kwargs = {'exif': exif} if exif is not None else {}
+    image.save(path, format=fmt, **kwargs)
+
+
+def test_large_image_is_downscaled_and_cached(tmp_path):
+    source = tmp_path / 'large.jpg'
+    _save_image(source, (3000, 1500), 'JPEG')
+    normalizer = ImageNormalizer(cache_dir=str(tmp_path / 'cache'), max_edge=1000)
+
+    output = normalizer.normalize(str(source))
+
+    assert output != str(source)
+    with Image.open(output) as image:
+        assert max(image.size) == 1000
+    # 同じ元画像・同じパラメータであればキャッシュが返る
+    mtime = os.path.getmtime(output)
+    assert normalizer.normalize(str(source)) == output
+    assert len(os.listdir(tmp_path / 'cache')) == 1
+    assert os.path.getmtime(output) >= mtime
+
+
+def test_exif_is_stripped(tmp_path):
+    source = tmp_path / 'photo.jpg'
+    exif = Image.Exif()
+    exif[0x010F] = 'CameraMaker'
+    _save_image(source, (100, 100), 'JPEG', exif=exif.tobytes())
+    normalizer = ImageNormalizer(cache_dir=str(tmp_path / 'cache'))
+
+    output = normalizer.normalize(str(source))
+
+    with Image.open(output) as image:
+        assert not image.info.get('exif')
+
+
+def test_small_image_is_used_as_is(tmp_path):
+    source = tmp_path / 'small.png'
+    _save_image(source, (64, 64), 'PNG')
+    normalizer = ImageNormalizer(cache_dir=str(tmp_path / 'cache'))
+
+    assert normalizer.normalize(str(source)) == str(source)
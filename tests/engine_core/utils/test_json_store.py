@@ -0,0 +1,36 @@
+import json
+
+from engine_core.utils.json_store import read_json_file, write_json_file_atomic
+
+
+def test_missing_and_empty_files_read_as_empty(tmp_path):
+    assert read_json_file(str(tmp_path / "missing.json"), "テスト") == {}
+    empty = tmp_path / "empty.json"
+    empty.write_text("", encoding="utf-8")
+    assert read_json_file(str(empty), "テスト") == {}
+
+
+def test_broken_file_reads_as_none(tmp_path):
+    broken = tmp_path / "broken.json"
+    broken.write_text("{broken", encoding="utf-8")
+    assert read_json_file(str(broken), "テスト") is None
+
+
+def test_atomic_write_replaces_file_without_leftovers(tmp_path):
+    path = tmp_path / "store.json"
+    path.write_text('{"old": 1}', encoding="utf-8")
+
+    assert write_json_file_atomic(str(path), {"new": "値"}, "テスト") is True
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"new": "値"}
+    assert [p.name for p in tmp_path.iterdir()] == ["store.json"]
+
+
+def test_unserializable_data_keeps_previous_file(tmp_path):
+    path = tmp_path / "store.json"
+    path.write_text('{"old": 1}', encoding="utf-8")
+
+    assert write_json_file_atomic(str(path), {"bad": object()}, "テスト") is False
+
+    assert path.read_text(encoding="utf-8") == '{"old": 1}'
+    assert [p.name for p in tmp_path.iterdir()] == ["store.json"]
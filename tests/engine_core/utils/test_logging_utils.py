@@ -0,0 +1,71 @@
+import json
+import logging
+
+from engine_core.utils import logging_utils
+from engine_core.utils.logging_utils import JsonLinesFormatter, RepeatedMessageFilter, setup_logging, shutdown_logging
+
+SETTINGS = {
+    "file_name": "app.log", "rotation": "size", "max_bytes": 1024 * 1024, "when": "midnight", "backup_count": 2,
+    "format": "json", "module_levels": {"noisy.module": "WARNING"}, "rate_limit": {"window_seconds": 60, "max_repeats": 2},
+}
+
+
+def _record(msg, args=(), lineno=1):
+    return logging.LogRecord("engine", logging.WARNING, __file__, lineno, msg, args, None)
+
+
+def test_repeated_messages_are_rate_limited_per_call_site():
+    log_filter = RepeatedMessageFilter(window_seconds=60, max_repeats=2)
+
+    # f-string で組み立てた本文が毎回違っても、同じ行からのログは抑える
+    results = [log_filter.filter(_record(f"再試行します ({i}/5)")) for i in range(5)]
+
+    assert results == [True, True, False, False, False]
+    assert log_filter.filter(_record("再試行します (1/5)", lineno=2)) is True
+
+
+def test_expired_call_sites_are_pruned(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logging_utils.time, "monotonic", lambda: now[0])
+    log_filter = RepeatedMessageFilter(window_seconds=60, max_repeats=1)
+    for lineno in range(10):
+        log_filter.filter(_record("一度だけのログ", lineno=lineno))
+    log_filter.filter(_record("抑制されるログ", lineno=100))
+    assert log_filter.filter(_record("抑制されるログ", lineno=100)) is False
+
+    now[0] += 61
+    record = _record("別のログ", lineno=200)
+    log_filter.filter(record)
+
+    # 抑制した件数を付記する前の箇所だけが残る
+    assert set(key[3] for key in log_filter._counters) == {100, 200}
+    suppressed_record = _record("抑制されるログ", lineno=100)
+    assert log_filter.filter(suppressed_record) is True
+    assert "1 件抑制しました" in suppressed_record.msg
+
+
+def test_json_lines_formatter():
+    entry = json.loads(JsonLinesFormatter().format(_record("値: %s", ("テスト",))))
+    assert entry["message"] == "値: テスト"
+    assert entry["level"] == "WARNING" and entry["logger"] == "engine"
+
+
+def test_setup_logging_writes_through_background_listener(tmp_path):
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    try:
+        setup_logging(logging.INFO, str(tmp_path), SETTINGS)
+        assert logging_utils.get_logger("engine_core.sample").handlers == []
+        for _ in range(4):
+            logging.getLogger("engine_core.sample").info("同じログ")
+        logging.getLogger("noisy.module").info("出力されない")
+        shutdown_logging()
+
+        lines = [json.loads(line) for line in (tmp_path / "app.log").read_text(encoding="utf-8").splitlines()]
+        assert [line["message"] for line in lines] == ["同じログ", "同じログ"]
+    finally:
+        shutdown_logging()
+        logging.getLogger("noisy.module").setLevel(logging.NOTSET)
+        for handler in saved_handlers:
+            root.addHandler(handler)
+        root.setLevel(saved_level)
@@ -0,0 +1,74 @@
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from engine_core.utils.media_sniffer import classify_media, sniff_media_type, looks_like_html
+
+
+def _gif_bytes(frames):
+    images = [Image.new('RGB', (4, 4), color=(i * 80, 0, 0)) for i in range(frames)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format='GIF', save_all=True, append_images=images[1:], duration=100)
+    return buffer.getvalue()
+
+
+def _ftyp(brand):
+    return struct.pack('>I4s', 16, b'ftyp') + brand + b'\x00\x00\x02\x00' + b'\x00' * 32
+
+
+def test_images_are_identified_from_magic_bytes():
+    assert sniff_media_type(b'\xff\xd8\xff\xe0' + b'\x00' * 20).mime_type == 'image/jpeg'
+    assert sniff_media_type(b'\x89PNG\r\n\x1a\n' + b'\x00' * 20).mime_type == 'image/png'
+    assert sniff_media_type(b'RIFF\x00\x00\x00\x00WEBPVP8 ').mime_type == 'image/webp'
+
+
+def test_animated_gif_is_tweet_gif_and_static_gif_is_image():
+    animated = sniff_media_type(_gif_bytes(3))
+    static = sniff_media_type(_gif_bytes(1))
+
+    assert animated.frame_count == 3
+    assert animated.media_category == 'tweet_gif'
+    assert static.frame_count == 1
+    assert static.media_category == 'tweet_image'
+
+
+def test_mp4_and_mov_are_videos():
+    mp4 = sniff_media_type(_ftyp(b'isom'))
+    mov = sniff_media_type(_ftyp(b'qt  '))
+
+    assert (mp4.mime_type, mp4.is_video) == ('video/mp4', True)
+    assert (mov.mime_type, mov.extension) == ('video/quicktime', '.mov')
+
+
+def test_octet_stream_video_is_not_misclassified_as_image():
+    media_type = classify_media(_ftyp(b'mp42'), 'application/octet-stream', 'https://drive.google.com/uc?id=abc')
+
+    assert media_type.media_category == 'tweet_video'
+    assert media_type.is_video is True
+
+
+@pytest.mark.parametrize("brand, mime_type", [(b'3gp4', 'video/3gpp'), (b'3gp5', 'video/3gpp'), (b'3g2a', 'video/3gpp2')])
+def test_3gpp_ftyp_brands_are_videos(brand, mime_type):
+    media_type = sniff_media_type(_ftyp(brand))
+    assert (media_type.mime_type, media_type.media_category, media_type.is_video) == (mime_type, 'tweet_video', True)
+
+
+@pytest.mark.parametrize("brand", [b'heic', b'mif1', b'avif', b'msf1'])
+def test_still_image_ftyp_brands_are_not_videos(brand):
+    assert sniff_media_type(_ftyp(brand)) is None
+
+    media_type = classify_media(_ftyp(brand), 'image/heic', 'https://example.com/photo.heic')
+    assert (media_type.media_category, media_type.is_video) == ('tweet_image', False)
+
+
+def test_unknown_data_falls_back_to_headers():
+    media_type = classify_media(b'\x00' * 32, 'application/octet-stream', 'https://example.com/movie.mp4')
+
+    assert media_type.media_category == 'tweet_video'
+
+
+def test_html_is_detected():
+    assert looks_like_html(b'\n<!DOCTYPE html><html>')
+    assert not looks_like_html(b'\xff\xd8\xff')
@@ -0,0 +1,99 @@
+import struct
+
+import pytest
+
+from engine_core.utils.mp4_metadata import (
+    set_comment,
+    read_comment,
+    UnsupportedContainerError,
+)
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def _moov(chunk_offset: int) -> bytes:
+    stco = _box(b'stco', struct.pack('>III', 0, 1, chunk_offset))
+    stbl = _box(b'stbl', stco)
+    trak = _box(b'trak', _box(b'mdia', _box(b'minf', stbl)))
+    return _box(b'moov', _box(b'mvhd', b'\x00' * 100) + trak)
+
+
+def _chunk_offset(data: bytes) -> int:
+    index = data.index(b'stco')
+    return struct.unpack_from('>I', data, index + 12)[0]
+
+
+def _write_faststart(path, brand=b'isom', free_size=0):
+    """ftyp + moov (+ free) + mdat の順のファイルを作る。stcoはmdatのペイロード先頭を指す。"""
+    ftyp = _box(b'ftyp', brand + b'\x00\x00\x02\x00')
+    free = _box(b'free', b'\x00' * (free_size - 8)) if free_size else b''
+    media = b'MEDIA-PAYLOAD'
+    moov_len = len(_moov(0))
+    mdat_payload_offset = len(ftyp) + moov_len + len(free) + 8
+    data = ftyp + _moov(mdat_payload_offset) + free + _box(b'mdat', media)
+    path.write_bytes(data)
+    return media
+
+
+def test_faststart_file_is_rewritten_with_shifted_offsets(tmp_path):
+    path = tmp_path / 'video.mp4'
+    media = _write_faststart(path)
+
+    assert set_comment(str(path), 'mod_abc') == 'rewrite'
+
+    data = path.read_bytes()
+    assert read_comment(str(path)) == 'mod_abc'
+    offset = _chunk_offset(data)
+    assert data[offset:offset + len(media)] == media
+
+
+def test_free_atom_absorbs_growth_in_place(tmp_path):
+    path = tmp_path / 'video.mp4'
+    media = _write_faststart(path, free_size=512)
+    original_size = path.stat().st_size
+
+    assert set_comment(str(path), 'mod_abc') == 'in_place'
+
+    data = path.read_bytes()
+    assert len(data) == original_size
+    assert read_comment(str(path)) == 'mod_abc'
+    offset = _chunk_offset(data)
+    assert data[offset:offset + len(media)] == media
+
+
+def test_moov_at_end_is_appended_and_comment_replaced(tmp_path):
+    path = tmp_path / 'video.mp4'
+    ftyp = _box(b'ftyp', b'isom\x00\x00\x02\x00')
+    media = b'MEDIA-PAYLOAD'
+    mdat = _box(b'mdat', media)
+    path.write_bytes(ftyp + mdat + _moov(len(ftyp) + 8))
+
+    assert set_comment(str(path), 'first') == 'append'
+    assert set_comment(str(path), 'second') == 'append'
+
+    data = path.read_bytes()
+    assert read_comment(str(path)) == 'second'
+    assert data.count(b'\xa9cmt') == 1
+    offset = _chunk_offset(data)
+    assert data[offset:offset + len(media)] == media
+
+
+def test_quicktime_brand_uses_udta_string(tmp_path):
+    path = tmp_path / 'video.mov'
+    _write_faststart(path, brand=b'qt  ')
+
+    set_comment(str(path), 'mod_qt')
+
+    data = path.read_bytes()
+    assert b'ilst' not in data
+    assert read_comment(str(path)) == 'mod_qt'
+
+
+def test_non_mp4_is_unsupported(tmp_path):
+    path = tmp_path / 'video.webm'
+    path.write_bytes(b'\x1a\x45\xdf\xa3' + b'\x00' * 64)
+
+    with pytest.raises(UnsupportedContainerError):
+        set_comment(str(path), 'mod')
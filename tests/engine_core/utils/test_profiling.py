@@ -0,0 +1,26 @@
+import os
+import pstats
+import time
+
+from engine_core.utils.profiling import profiling_session
+
+
+def _busy_loop(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        sum(range(1000))
+
+
+def test_profiling_session_writes_pstats_and_collapsed_stacks(tmp_path):
+    with profiling_session(str(tmp_path), "worker acc/1", interval_seconds=0.001):
+        _busy_loop(0.2)
+
+    files = sorted(os.listdir(tmp_path / "profiles"))
+    assert len(files) == 2
+    assert files[0].endswith("_worker_acc_1_%d.collapsed.txt" % os.getpid())
+    assert files[1].endswith(".pstats")
+
+    stats = pstats.Stats(str(tmp_path / "profiles" / files[1]))
+    assert any(func[2] == "_busy_loop" for func in stats.stats)
+    lines = (tmp_path / "profiles" / files[0]).read_text(encoding="utf-8").splitlines()
+    assert any(line.startswith("MainThread;") and "_busy_loop" in line for line in lines)
@@ -0,0 +1,36 @@
+from engine_core.utils.status_table import display_width, render_table_lines, render_table_pages, diff_rows
+
+
+def test_columns_are_aligned_by_display_width():
+    lines = render_table_lines(["アカウント", "状態"], [["acc1", "⏳ 待機中"], ["`long_account`", None]])
+
+    # 全角の見出しと半角のIDで2列目の開始位置が揃う
+    assert lines[0] == "アカウント    状態"
+    assert lines[2] == "acc1          ⏳ 待機中"
+    assert display_width(lines[0][:lines[0].index("状態")]) == display_width(lines[2][:lines[2].index("⏳")])
+    assert lines[3] == "long_account  ─"
+
+
+def test_pages_repeat_header_and_fit_size_limit():
+    rows = [[f"account_{i:03d}", "⏳ 待機中"] for i in range(300)]
+
+    pages = render_table_pages(["アカウント", "状態"], rows, max_page_chars=1000)
+
+    assert len(pages) > 1
+    assert all(len(page) <= 1000 for page in pages)
+    assert all(page.startswith("```\nアカウント") and page.endswith("\n```") for page in pages)
+    body = [line for page in pages for line in page.split("\n")[3:-1]]
+    assert len(body) == 300 and body[-1].startswith("account_299")
+
+
+def test_empty_table_has_header_only_page():
+    assert render_table_pages(["a"], []) == ["```\na\n-\n```"]
+
+
+def test_diff_rows_reports_changed_new_and_removed_rows():
+    previous = {"acc1": ["acc1", "待機"], "acc2": ["acc2", "待機"], "acc3": ["acc3", "待機"]}
+    current = {"acc1": ["acc1", "待機"], "acc2": ["acc2", "投稿"], "acc4": ["acc4", "初回"]}
+
+    assert diff_rows(previous, current) == {
+        "acc2": ["acc2", "投稿"], "acc4": ["acc4", "初回"], "acc3": ["acc3", "削除"],
+    }
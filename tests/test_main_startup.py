@@ -0,0 +1,23 @@
+import os
+import re
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("gspread", "tweepy", "requests", "google.auth", "PIL", "engine_core.workflow_manager")
+# 現状は約20ms (WorkflowManager を読み込むと約250ms)。遅い環境でも誤検知しないよう余裕を持たせる
+MAX_MAIN_IMPORT_MICROSECONDS = 150_000
+
+
+def test_main_does_not_import_heavy_modules():
+    code = f"import sys, main; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+def test_main_import_time_benchmark():
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| main$", result.stderr, re.MULTILINE)
+    assert match, result.stderr[-2000:]
+    assert int(match.group(1)) < MAX_MAIN_IMPORT_MICROSECONDS